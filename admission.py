@@ -0,0 +1,218 @@
+# admission.py
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from starlette.requests import Request
+
+from metrics import ADMISSION_SHED
+from rate_limit import MemoryBackend, client_ip, parse_rule
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "100"))
+# Slots of the global cap only light requests may use
+ADMISSION_LIGHT_RESERVE = int(os.getenv("ADMISSION_LIGHT_RESERVE", "10"))
+ADMISSION_MAX_HEAVY = int(os.getenv("ADMISSION_MAX_HEAVY", "20"))
+ADMISSION_USER_MAX_CONCURRENT = int(os.getenv("ADMISSION_USER_MAX_CONCURRENT", "8"))
+ADMISSION_USER_MAX_HEAVY = int(os.getenv("ADMISSION_USER_MAX_HEAVY", "2"))
+ADMISSION_USER_RATE = os.getenv("ADMISSION_USER_RATE", "300/60")
+# Requests without a verified user share their IP's quota (a campus NAT is many students)
+ADMISSION_IP_MAX_CONCURRENT = int(os.getenv("ADMISSION_IP_MAX_CONCURRENT", "64"))
+ADMISSION_IP_MAX_HEAVY = int(os.getenv("ADMISSION_IP_MAX_HEAVY", "16"))
+ADMISSION_IP_RATE = os.getenv("ADMISSION_IP_RATE", "3000/60")
+
+# Never shed: the load balancer and Prometheus must always get through
+CRITICAL_PREFIXES = ("/health", "/metrics")
+# Long-lived streams hold a slot for minutes; they are bounded by the event bus instead
+EXEMPT_PREFIXES = ("/realtime/",)
+LIGHT_ROUTES = (
+    ("GET", "/notifications/unread"),
+    ("GET", "/sync/status"),
+    ("GET", "/auth/profile"),
+    ("GET", "/profile/me"),
+)
+HEAVY_PREFIXES = ("/sync/pull", "/sync/push", "/calendar/import", "/calendar/feed/")
+# Calendar apps fetch feeds from a few shared IPs and send no bearer token
+FEED_PREFIX = "/calendar/feed/"
+HEAVY_SUFFIXES = ("/batch", "/generate-summary")
+
+SHED_DETAIL = "El servidor está ocupado. Intenta de nuevo en unos segundos."
+USER_DETAIL = "Demasiadas solicitudes simultáneas. Intenta de nuevo en unos segundos."
+
+
+def classify(method: str, path: str) -> str:
+    """critical | exempt | light | heavy | normal"""
+    if path == "/" or path.startswith(CRITICAL_PREFIXES):
+        return "critical"
+    if path.startswith(EXEMPT_PREFIXES):
+        return "exempt"
+    for light_method, prefix in LIGHT_ROUTES:
+        if method == light_method and path.startswith(prefix):
+            return "light"
+    if path.startswith(HEAVY_PREFIXES) or path.rstrip("/").endswith(HEAVY_SUFFIXES):
+        return "heavy"
+    return "normal"
+
+
+class AdmissionController:
+    """
+    In-flight accounting for one worker.
+
+    Everything runs on the event loop, so plain counters suffice. Per-user
+    counters are dropped when they reach zero, so memory follows the number
+    of requests in flight; request-rate buckets are capped by MemoryBackend.
+    Identities that are a client IP get the (higher) `ip_*` limits.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+        light_reserve: int = ADMISSION_LIGHT_RESERVE,
+        max_heavy: int = ADMISSION_MAX_HEAVY,
+        user_max_concurrent: int = ADMISSION_USER_MAX_CONCURRENT,
+        user_max_heavy: int = ADMISSION_USER_MAX_HEAVY,
+        user_rate: str = ADMISSION_USER_RATE,
+        ip_max_concurrent: int = ADMISSION_IP_MAX_CONCURRENT,
+        ip_max_heavy: int = ADMISSION_IP_MAX_HEAVY,
+        ip_rate: str = ADMISSION_IP_RATE,
+    ):
+        self.max_in_flight = max_in_flight
+        self.light_reserve = light_reserve
+        self.max_heavy = max_heavy
+        self.user_max_concurrent = user_max_concurrent
+        self.user_max_heavy = user_max_heavy
+        self.user_rate = parse_rule(user_rate)
+        self.ip_max_concurrent = ip_max_concurrent
+        self.ip_max_heavy = ip_max_heavy
+        self.ip_rate = parse_rule(ip_rate)
+        self.in_flight = 0
+        self.heavy_in_flight = 0
+        self._user_in_flight: Dict[str, int] = {}
+        self._user_heavy: Dict[str, int] = {}
+        self._rates = MemoryBackend()
+
+    def admit(self, kind: str, identity: str) -> Optional[Tuple[int, int, str]]:
+        """None when admitted (call `release` afterwards), else (status, retry_after, reason)"""
+        limit = self.max_in_flight if kind == "light" else self.max_in_flight - self.light_reserve
+        if self.in_flight >= limit:
+            return 503, 1, "global"
+        if kind == "heavy" and self.heavy_in_flight >= self.max_heavy:
+            return 503, 2, "heavy"
+        if identity.startswith("ip:"):
+            max_concurrent, max_heavy, rate = self.ip_max_concurrent, self.ip_max_heavy, self.ip_rate
+        else:
+            max_concurrent, max_heavy, rate = self.user_max_concurrent, self.user_max_heavy, self.user_rate
+        if self._user_in_flight.get(identity, 0) >= max_concurrent:
+            return 429, 1, "user_concurrency"
+        if kind == "heavy" and self._user_heavy.get(identity, 0) >= max_heavy:
+            return 429, 2, "user_heavy"
+        retry_after = self._rates.take(identity, *rate)
+        if retry_after:
+            return 429, max(1, int(retry_after + 0.999)), "user_rate"
+
+        self.in_flight += 1
+        self._user_in_flight[identity] = self._user_in_flight.get(identity, 0) + 1
+        if kind == "heavy":
+            self.heavy_in_flight += 1
+            self._user_heavy[identity] = self._user_heavy.get(identity, 0) + 1
+        return None
+
+    def release(self, kind: str, identity: str) -> None:
+        self.in_flight -= 1
+        _decrement(self._user_in_flight, identity)
+        if kind == "heavy":
+            self.heavy_in_flight -= 1
+            _decrement(self._user_heavy, identity)
+
+
+def _decrement(counters: Dict[str, int], key: str) -> None:
+    remaining = counters.get(key, 0) - 1
+    if remaining > 0:
+        counters[key] = remaining
+    else:
+        counters.pop(key, None)
+
+
+def identity_of(scope) -> str:
+    """
+    The user id from the bearer token, falling back to the client IP.
+
+    The token signature is checked locally against SUPABASE_JWT_SECRET (an
+    HMAC, no network). Without the secret, or for tokens signed with the
+    project's asymmetric keys, the `sub` claim could be forged to spread one
+    client over many quotas, so requests are keyed by IP. Feed requests
+    (`/calendar/feed/{token}.ics`) are keyed by their feed token.
+    """
+    request = Request(scope)
+    if scope["path"].startswith(FEED_PREFIX) and scope["path"] != FEED_PREFIX + "token":
+        token = scope["path"][len(FEED_PREFIX):]
+        return f"feed:{hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]}"
+    authorization = request.headers.get("authorization", "")
+    secret = os.getenv("SUPABASE_JWT_SECRET")
+    if secret and authorization.startswith("Bearer "):
+        import jwt
+
+        try:
+            claims = jwt.decode(authorization[7:], secret, algorithms=["HS256"], audience="authenticated")
+            if claims.get("sub"):
+                return f"user:{claims['sub']}"
+        except jwt.PyJWTError:
+            pass
+    return f"ip:{client_ip(request)}"
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware enforcing a global in-flight cap (with headroom kept for
+    light reads and a separate cap for heavy endpoints), per-user concurrency
+    and a per-user request rate. Rejections are immediate: 503 when the
+    worker is full, 429 when one user is over their share, both with
+    Retry-After.
+    """
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or AdmissionController()
+        if ADMISSION_ENABLED and not os.getenv("SUPABASE_JWT_SECRET"):
+            logger.warning("SUPABASE_JWT_SECRET is not set: admission quotas are per client IP (ADMISSION_IP_*), not per user")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        kind = classify(scope["method"], scope["path"])
+        if kind in ("critical", "exempt"):
+            await self.app(scope, receive, send)
+            return
+
+        identity = identity_of(scope)
+        rejection = self.controller.admit(kind, identity)
+        if rejection is not None:
+            status_code, retry_after, reason = rejection
+            ADMISSION_SHED.inc(kind, reason)
+            logger.debug("Shed %s %s (%s, %s)", scope["method"], scope["path"], reason, identity)
+            await _reject(send, status_code, retry_after, SHED_DETAIL if status_code == 503 else USER_DETAIL)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(kind, identity)
+
+
+async def _reject(send, status_code: int, retry_after: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
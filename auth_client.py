@@ -0,0 +1,235 @@
+# auth_client.py
+import asyncio
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from metrics import AUTH_LATENCY, AUTH_REQUESTS, DEPENDENCY_LATENCY
+from tracing import KIND_CLIENT, span
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+AUTH_TIMEOUT_SECONDS = float(os.getenv("AUTH_TIMEOUT_SECONDS", "5"))
+AUTH_MAX_CONNECTIONS = int(os.getenv("AUTH_MAX_CONNECTIONS", "100"))
+AUTH_BREAKER_FAILURES = int(os.getenv("AUTH_BREAKER_FAILURES", "5"))
+AUTH_BREAKER_RESET_SECONDS = float(os.getenv("AUTH_BREAKER_RESET_SECONDS", "30"))
+
+
+class AuthServiceError(Exception):
+    """GoTrue answered with an error; `str()` keeps its error code so callers can match on it"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AuthUnavailableError(AuthServiceError):
+    """GoTrue is unreachable, too slow, or the circuit breaker is open"""
+
+    def __init__(self, message: str):
+        super().__init__(503, message)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls
+    fail immediately for `reset_timeout` seconds. Then a single trial call is
+    let through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = AUTH_BREAKER_FAILURES, reset_timeout: float = AUTH_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """The trial ended without a verdict (cancelled by its caller): let another one through"""
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Auth circuit breaker opened after %d failures", self.failures)
+            self.opened_at = time.monotonic()
+
+
+class GoTrueClient:
+    """
+    Minimal async client for the GoTrue REST API used by the auth router.
+
+    All calls share one pooled `httpx.AsyncClient`, carry a per-call deadline
+    and go through a circuit breaker, so a degraded auth provider costs
+    callers at most `timeout` seconds and then fails fast, without ever
+    blocking the event loop.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        timeout: float = AUTH_TIMEOUT_SECONDS,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.url = (url or os.getenv("SUPABASE_URL", "")).rstrip("/") + "/auth/v1"
+        self.api_key = api_key or os.getenv("SUPABASE_ANON_KEY", "")
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    def _http(self) -> "httpx.AsyncClient":
+        # httpx (with httpcore and its backends) is imported with the first client, not at startup
+        import httpx
+
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.url,
+                headers={"apikey": self.api_key},
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=AUTH_MAX_CONNECTIONS, max_keepalive_connections=AUTH_MAX_CONNECTIONS // 2),
+            )
+        return self._client
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Connections in use and requests waiting for one in the shared pool"""
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        requests = list(getattr(pool, "_requests", []))
+        queued = sum(1 for request in requests if request.is_queued())
+        return {"active": len(requests) - queued, "queued": queued, "max": AUTH_MAX_CONNECTIONS}
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, str]] = None,
+        token: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        if not self.breaker.allow():
+            AUTH_REQUESTS.inc(path, "circuit_open")
+            raise AuthUnavailableError("auth_unavailable: authentication service temporarily unavailable")
+
+        import httpx
+
+        headers = {"Authorization": f"Bearer {token or self.api_key}"}
+        started = time.perf_counter()
+        try:
+            # The overall deadline also bounds connection-pool waits and slow bodies
+            with span(f"gotrue {method} {path}", "gotrue", KIND_CLIENT, **{"http.request.method": method}):
+                response = await asyncio.wait_for(
+                    self._http().request(method, path, json=json, params=params, headers=headers),
+                    timeout=self.timeout,
+                )
+        except (httpx.TransportError, asyncio.TimeoutError) as exc:
+            self.breaker.record_failure()
+            AUTH_REQUESTS.inc(path, "timeout" if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException)) else "unreachable")
+            raise AuthUnavailableError(f"auth_unavailable: {type(exc).__name__}") from exc
+        except BaseException:
+            # Cancellation (e.g. a health probe's shorter deadline) or an unexpected error:
+            # never leave a half-open trial marked in flight, or the circuit stays shut for good
+            self.breaker.release_trial()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            AUTH_LATENCY.observe(elapsed, path)
+            DEPENDENCY_LATENCY["auth"].observe(elapsed)
+
+        AUTH_REQUESTS.inc(path, str(response.status_code))
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            raise AuthUnavailableError(f"auth_unavailable: GoTrue returned {response.status_code}")
+        self.breaker.record_success()
+
+        data = response.json() if response.content else {}
+        if response.status_code >= 400:
+            code = data.get("error_code") or data.get("error") or "auth_error"
+            message = data.get("msg") or data.get("error_description") or data.get("message") or response.text
+            raise AuthServiceError(response.status_code, f"{code}: {message}")
+        return data
+
+    # --- GoTrue endpoints ---
+
+    async def sign_up(self, email: str, password: str, data: Dict[str, Any], redirect_to: str) -> Dict[str, Any]:
+        return await self._request("POST", "/signup", {"email": email, "password": password, "data": data}, {"redirect_to": redirect_to})
+
+    async def sign_in_with_password(self, email: str, password: str) -> Dict[str, Any]:
+        return await self._request("POST", "/token", {"email": email, "password": password}, {"grant_type": "password"})
+
+    async def sign_out(self, token: str) -> None:
+        await self._request("POST", "/logout", token=token)
+
+    async def recover(self, email: str, redirect_to: str) -> None:
+        await self._request("POST", "/recover", {"email": email}, {"redirect_to": redirect_to})
+
+    async def resend(self, email: str, type: str, redirect_to: str) -> None:
+        await self._request("POST", "/resend", {"email": email, "type": type}, {"redirect_to": redirect_to})
+
+    async def update_user(self, token: str, attributes: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request("PUT", "/user", attributes, token=token)
+
+    async def get_user(self, token: str) -> Dict[str, Any]:
+        return await self._request("GET", "/user", token=token)
+
+    async def health(self) -> Dict[str, Any]:
+        return await self._request("GET", "/health")
+
+
+def split_session(data: Dict[str, Any]):
+    """GoTrue returns either a session (with `user`) or a bare user; return (user, session)"""
+    if "access_token" in data:
+        return data.get("user"), data
+    return (data if data.get("id") else None), None
+
+
+_client: Optional[GoTrueClient] = None
+
+
+def get_auth_client() -> GoTrueClient:
+    """Process-wide client, created on first use (after .env is loaded)"""
+    global _client
+    if _client is None:
+        _client = GoTrueClient()
+    return _client
+
+
+async def close_auth_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
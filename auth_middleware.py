@@ -1,44 +1,62 @@
 #auth_middleware.py
 from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from database import get_supabase_service
+from auth_client import get_auth_client
 from typing import Dict, Any, Optional
+import logging
 import os
+import time
+
+from metrics import AUTH_VERIFY_LATENCY
+from tracing import span
+
+logger = logging.getLogger(__name__)
 
 security = HTTPBearer()
 
-async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
+async def verify_token(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
     """Verify JWT token and return user info"""
+    auth_data = await authenticate_token(credentials.credentials)
+    # Read by ChangePublisherMiddleware (events.py) to route change events
+    request.state.user_id = str(auth_data["user_id"])
+    return auth_data
+
+async def authenticate_token(token: str) -> Dict[str, Any]:
+    """Validate a raw access token (also used by the realtime endpoints)"""
+    started = time.perf_counter()
+    result = "rejected"
+    try:
+        with span("auth.verify", "auth"):
+            auth_data = await _authenticate_token(token)
+        result = "jwt_fallback" if "decoded_token" in auth_data else "ok"
+        return auth_data
+    finally:
+        AUTH_VERIFY_LATENCY.observe(time.perf_counter() - started, result)
+
+async def _authenticate_token(token: str) -> Dict[str, Any]:
     try:
-        token = credentials.credentials
-        print(f"🔑 Received token: {token[:50]}...")
-        
-        # Use service role client to verify user tokens
-        supabase = get_supabase_service()
-        
         try:
-            # Verificar el token con Supabase usando service role
-            user_response = supabase.auth.get_user(token)
-            print(f"📋 Supabase user response: {user_response}")
+            # Verificar el token con GoTrue (cliente async con pool compartido y circuit breaker)
+            user = await get_auth_client().get_user(token)
             
-            if not user_response.user:
-                print("❌ No user found in token response")
+            if not user.get("id"):
+                logger.debug("No user found in token response")
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid authentication token"
                 )
             
-            print(f"✅ User authenticated: {user_response.user.email}")
+            logger.debug("User authenticated: %s", user["id"])
             return {
-                "user_id": user_response.user.id,
-                "email": user_response.user.email,
+                "user_id": user["id"],
+                "email": user.get("email"),
                 "token": token,
-                "user": user_response.user
+                "user": user,
+                "user_metadata": user.get("user_metadata") or {}
             }
             
         except Exception as auth_error:
-            print(f"❌ Supabase auth error: {auth_error}")
-            print(f"❌ Error type: {type(auth_error)}")
+            logger.info("Supabase auth error (%s), falling back to local JWT check: %s", type(auth_error).__name__, auth_error)
             
             # Si Supabase falla, intenta verificar el JWT manualmente
             try:
@@ -47,7 +65,7 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
                 # Usar el JWT secret de Supabase
                 jwt_secret = os.getenv("SUPABASE_JWT_SECRET")
                 if not jwt_secret:
-                    print("❌ SUPABASE_JWT_SECRET not found in environment")
+                    logger.error("SUPABASE_JWT_SECRET not found in environment")
                     raise HTTPException(
                         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                         detail="Server configuration error"
@@ -61,7 +79,7 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
                     audience="authenticated"
                 )
                 
-                print(f"🔍 Token decoded successfully: {decoded.get('email')}")
+                logger.debug("Token decoded locally: %s", decoded.get("sub"))
                 
                 return {
                     "user_id": decoded['sub'],
@@ -71,19 +89,19 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
                 }
                 
             except ExpiredSignatureError:
-                print("❌ Token has expired")
+                logger.debug("Token has expired")
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Token has expired"
                 )
             except InvalidTokenError as jwt_error:
-                print(f"❌ Invalid token: {jwt_error}")
+                logger.debug("Invalid token: %s", jwt_error)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid token"
                 )
             except Exception as jwt_error:
-                print(f"❌ JWT decode error: {jwt_error}")
+                logger.warning("JWT decode error: %s", jwt_error)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Could not validate token"
@@ -92,7 +110,7 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ General authentication error: {e}")
+        logger.warning("General authentication error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
@@ -111,32 +129,26 @@ async def get_optional_current_user(request: Request) -> Optional[Dict[str, Any]
     
     try:
         token = auth_header.split(" ")[1]
-        print(f"🔑 Optional auth - Received token: {token[:50]}...")
-        
-        # Use service role client to verify user tokens
-        supabase = get_supabase_service()
-        
         try:
-            # Verificar el token con Supabase usando service role
-            user_response = supabase.auth.get_user(token)
-            print(f"📋 Optional auth - Supabase user response: {user_response}")
+            user = await get_auth_client().get_user(token)
             
-            if not user_response.user:
-                print("❌ Optional auth - No user found in token response")
+            if not user.get("id"):
+                logger.debug("Optional auth - No user found in token response")
                 return None
             
-            print(f"✅ Optional auth - User authenticated: {user_response.user.email}")
+            logger.debug("Optional auth - User authenticated: %s", user["id"])
             return {
-                "user_id": user_response.user.id,
-                "email": user_response.user.email,
+                "user_id": user["id"],
+                "email": user.get("email"),
                 "token": token,
-                "user": user_response.user
+                "user": user,
+                "user_metadata": user.get("user_metadata") or {}
             }
             
         except Exception as auth_error:
-            print(f"❌ Optional auth - Supabase auth error: {auth_error}")
+            logger.debug("Optional auth - Supabase auth error: %s", auth_error)
             return None
         
     except Exception as e:
-        print(f"❌ Optional auth - General error: {e}")
+        logger.debug("Optional auth - General error: %s", e)
         return None
\ No newline at end of file
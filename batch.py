@@ -0,0 +1,134 @@
+# batch.py
+import os
+from typing import Any, Dict, List
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+
+def _result(op: str, index: int, status: str, row_id: Any = None, data: Any = None, error: str = None) -> Dict[str, Any]:
+    return {"op": op, "index": index, "id": row_id, "status": status, "data": data, "error": error}
+
+
+def _run_creates(supabase, table: str, user_id: str, creates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    rows = [{**row, "user_id": user_id} for row in creates]
+    try:
+        # One multi-row INSERT; keys missing from a row fall back to column defaults
+        response = supabase.table(table).insert(rows, default_to_null=False).execute()
+        return [
+            _result("create", index, "created", created["id"], created)
+            for index, created in enumerate(response.data or [])
+        ]
+    except Exception:
+        pass
+
+    # Isolate the failing rows so the caller still gets a per-item report
+    results = []
+    for index, row in enumerate(rows):
+        try:
+            created = supabase.table(table).insert(row).execute().data[0]
+            results.append(_result("create", index, "created", created["id"], created))
+        except Exception as exc:
+            results.append(_result("create", index, "failed", error=str(exc)))
+    return results
+
+
+def _run_updates(supabase, table: str, patches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    try:
+        # One UPDATE ... FROM jsonb_array_elements (see migrations/batch_operations.sql)
+        response = supabase.rpc("batch_patch", {"p_table": table, "p_rows": patches}).execute()
+        updated = {row["id"]: row for row in response.data or []}
+        return [
+            _result("update", index, "updated", patch["id"], updated[patch["id"]])
+            if patch["id"] in updated else
+            _result("update", index, "not_found", patch["id"], error=f"{table} row not found")
+            for index, patch in enumerate(patches)
+        ]
+    except Exception:
+        pass
+
+    results = []
+    for index, patch in enumerate(patches):
+        try:
+            rows = supabase.rpc("batch_patch", {"p_table": table, "p_rows": [patch]}).execute().data or []
+            if rows:
+                results.append(_result("update", index, "updated", patch["id"], rows[0]))
+            else:
+                results.append(_result("update", index, "not_found", patch["id"], error=f"{table} row not found"))
+        except Exception as exc:
+            results.append(_result("update", index, "failed", patch["id"], error=str(exc)))
+    return results
+
+
+def _run_deletes(supabase, table: str, user_id: str, deletes: List[str]) -> List[Dict[str, Any]]:
+    try:
+        response = supabase.table(table).delete().eq("user_id", user_id).in_("id", deletes).execute()
+        deleted = {row["id"] for row in response.data or []}
+        return [
+            _result("delete", index, "deleted", row_id)
+            if row_id in deleted else
+            _result("delete", index, "not_found", row_id, error=f"{table} row not found")
+            for index, row_id in enumerate(deletes)
+        ]
+    except Exception:
+        pass
+
+    # One blocked row (e.g. still referenced by a foreign key) must not fail the rest
+    results = []
+    for index, row_id in enumerate(deletes):
+        try:
+            rows = supabase.table(table).delete().eq("user_id", user_id).eq("id", row_id).execute().data or []
+            if rows:
+                results.append(_result("delete", index, "deleted", row_id))
+            else:
+                results.append(_result("delete", index, "not_found", row_id, error=f"{table} row not found"))
+        except Exception as exc:
+            results.append(_result("delete", index, "failed", row_id, error=str(exc)))
+    return results
+
+
+def run_batch(
+    supabase,
+    table: str,
+    user_id: str,
+    creates: List[Dict[str, Any]],
+    patches: List[Dict[str, Any]],
+    deletes: List[str],
+    atomic: bool = False
+) -> Dict[str, Any]:
+    """
+    Apply creates, patches and deletes with one statement per operation type.
+
+    In atomic mode everything runs inside the `batch_apply` RPC (a single
+    transaction) and any error rolls back the whole batch. Otherwise each
+    operation type is applied independently and a failing statement is
+    retried item by item so that only the bad items are reported as failed.
+    """
+    if atomic:
+        response = supabase.rpc("batch_apply", {
+            "p_table": table,
+            "p_creates": creates,
+            "p_patches": patches,
+            "p_deletes": deletes,
+        }).execute()
+        applied = response.data or {}
+        updated = {row["id"]: row for row in applied.get("updated", [])}
+        results = (
+            [_result("create", index, "created", row["id"], row) for index, row in enumerate(applied.get("created", []))]
+            + [_result("update", index, "updated", patch["id"], updated.get(patch["id"])) for index, patch in enumerate(patches)]
+            + [_result("delete", index, "deleted", row_id) for index, row_id in enumerate(deletes)]
+        )
+    else:
+        results = []
+        if creates:
+            results += _run_creates(supabase, table, user_id, creates)
+        if patches:
+            results += _run_updates(supabase, table, patches)
+        if deletes:
+            results += _run_deletes(supabase, table, user_id, deletes)
+
+    summary = {"created": 0, "updated": 0, "deleted": 0}
+    for result in results:
+        if result["status"] in summary:
+            summary[result["status"]] += 1
+    failed = len(results) - sum(summary.values())
+    return {"atomic": atomic, **summary, "failed": failed, "results": results}
@@ -0,0 +1,87 @@
+# benchmarks/auth_load.py
+"""
+Load test for the auth router against a local fake GoTrue.
+
+Starts benchmarks.fake_supabase on a free port, points the API at it and
+fires concurrent /auth/signin requests through the ASGI app while a probe
+keeps hitting /health. The probe latency shows whether the event loop stays
+responsive while GoTrue is slow, hanging or failing.
+
+    python -m benchmarks.auth_load --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import FakeSupabase, configure_api_env, percentile
+
+
+async def run_scenario(app, fake_url: str, name: str, mode: str, delay: float, requests: int, concurrency: int):
+    async with httpx.AsyncClient(base_url=fake_url) as control:
+        await control.post("/__control", json={"mode": mode, "delay": delay})
+
+    latencies, statuses, probes = [], {}, []
+    done = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=60) as client:
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/health")
+                probes.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        slots = asyncio.Semaphore(concurrency)
+
+        async def signin(index: int):
+            async with slots:
+                started = time.perf_counter()
+                response = await client.post("/auth/signin", json={"email": f"user{index}@test.dev", "password": "Password123"})
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(signin(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    print(f"\n[{name}] mode={mode} delay={delay}s requests={requests} concurrency={concurrency}")
+    print(f"  throughput     {requests / elapsed:8.1f} req/s  ({elapsed:.2f}s)")
+    print(f"  signin latency p50={percentile(latencies, .5) * 1000:7.1f}ms  p95={percentile(latencies, .95) * 1000:7.1f}ms  max={max(latencies) * 1000:7.1f}ms")
+    print(f"  statuses       {dict(sorted(statuses.items()))}")
+    if probes:
+        print(f"  /health probe  p50={statistics.median(probes) * 1000:7.1f}ms  max={max(probes) * 1000:7.1f}ms  (event loop responsiveness)")
+    return {"statuses": statuses, "probe_max": max(probes) if probes else 0.0}
+
+
+async def main(args) -> int:
+    with FakeSupabase(["--users", "0"]) as fake:
+        configure_api_env(fake, AUTH_TIMEOUT_SECONDS=str(args.timeout))
+        return await _run(args, fake.url)
+
+
+async def _run(args, fake_url: str) -> int:
+    from main import app
+    from auth_client import get_auth_client
+
+    await run_scenario(app, fake_url, "healthy", "ok", args.delay, args.requests, args.concurrency)
+    await run_scenario(app, fake_url, "hanging", "hang", 0, args.requests, args.concurrency)
+    await run_scenario(app, fake_url, "failing", "error", 0, args.requests, args.concurrency)
+    print(f"\n  circuit breaker: {get_auth_client().breaker.state}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Auth router load test against a fake GoTrue")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.05, help="GoTrue latency in the healthy scenario")
+    parser.add_argument("--timeout", type=float, default=5.0, help="AUTH_TIMEOUT_SECONDS for the run")
+    sys.exit(asyncio.run(main(parser.parse_args())))
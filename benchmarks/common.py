@@ -0,0 +1,142 @@
+# benchmarks/common.py
+"""Helpers shared by the benchmark scripts: the fake Supabase server, API environment and percentiles"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class FakeSupabase:
+    """
+    benchmarks.fake_supabase served on a loopback port.
+
+    supabase-py offers no way to inject a transport, so the fake is always
+    reached over HTTP. By default it runs in a child process, keeping its
+    CPU time and allocations out of the API's measurements; `in_thread`
+    serves it from this process instead.
+    """
+
+    def __init__(self, argv: List[str], in_thread: bool = False):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.argv = argv
+        self.in_thread = in_thread
+        self._process: Optional[subprocess.Popen] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "FakeSupabase":
+        if self.in_thread:
+            import argparse
+
+            import uvicorn
+
+            from benchmarks import fake_supabase
+
+            parser = argparse.ArgumentParser()
+            fake_supabase.add_arguments(parser)
+            fake_supabase.configure(parser.parse_args(self.argv))
+            self._server = uvicorn.Server(uvicorn.Config(fake_supabase.app, host="127.0.0.1", port=self.port, log_level="warning"))
+            self._thread = threading.Thread(target=self._server.run, name="fake-supabase", daemon=True)
+            self._thread.start()
+        else:
+            self._process = subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.fake_supabase", "--port", str(self.port), *self.argv],
+                cwd=ROOT,
+            )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                httpx.post(f"{self.url}/__control", json={}, timeout=0.5)
+                return self
+            except httpx.TransportError:
+                time.sleep(0.05)
+        self.stop()
+        raise RuntimeError("fake Supabase did not start")
+
+    def stop(self) -> None:
+        if self._process is not None:
+            # kill, not terminate: "hang" mode leaves connections the server would wait for
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+            self._server = None
+
+    async def control(self, **changes: Any) -> Dict[str, Any]:
+        """Change latency / failure mode; returns the settings and request counters"""
+        async with httpx.AsyncClient(base_url=self.url) as client:
+            response = await client.post("/__control", json=changes)
+            return response.json()
+
+    def __enter__(self) -> "FakeSupabase":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def api_env(fake: FakeSupabase, **overrides: str) -> Dict[str, str]:
+    """Environment pointing the API at the fake, with background jobs and throttling off"""
+    from benchmarks.fake_supabase import FAKE_JWT_SECRET, service_key
+
+    env = {
+        "SUPABASE_URL": fake.url,
+        "SUPABASE_ANON_KEY": service_key("anon"),
+        "SUPABASE_SERVICE_ROLE_KEY": service_key("service_role"),
+        "SUPABASE_JWT_SECRET": FAKE_JWT_SECRET,
+        # Every simulated client shares one IP; benchmarks measure handlers, not throttling
+        "RATE_LIMIT_ENABLED": "false",
+        "ADMISSION_ENABLED": "false",
+        "NOTIFICATION_DISPATCHER_ENABLED": "false",
+        "REMINDERS_ENABLED": "false",
+        "NOTIFICATION_RETENTION_ENABLED": "false",
+        "DEVICE_SWEEPER_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+    }
+    env.update(overrides)
+    return env
+
+
+def configure_api_env(fake: FakeSupabase, **overrides: str) -> None:
+    """
+    Point the API in this process at the fake. Must run before `main` is
+    imported: settings are read at import time, and values set here win
+    over .env.
+    """
+    os.environ.update(api_env(fake, **overrides))
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+
+async def sign_in(client: httpx.AsyncClient, emails: Sequence[str], password: str = "Password123") -> List[str]:
+    """Access tokens for `emails`, obtained through the API's own /auth/signin"""
+    async def one(email: str) -> str:
+        response = await client.post("/auth/signin", json={"email": email, "password": password})
+        response.raise_for_status()
+        return response.json()["session"]["access_token"]
+
+    return list(await asyncio.gather(*(one(email) for email in emails)))
@@ -0,0 +1,660 @@
+# benchmarks/fake_supabase.py
+"""
+Local stand-in for Supabase (PostgREST + GoTrue), for benchmarks.
+
+Serves the subset of PostgREST the routers use (filters, or=, order,
+limit/offset, count=exact, single objects, insert/upsert/update/delete,
+the profile RPCs and the grade views) over an in-memory store seeded with
+deterministic per-user data. Row level security is emulated from the
+bearer token: `authenticated` tokens only see their own rows. GoTrue
+issues real HS256 access tokens signed with FAKE_JWT_SECRET, so the API's
+local JWT checks accept them.
+
+Seeded users are student<N>@studyvault.app with password Password123;
+any other email signs in (and is created) with the same password.
+
+Behaviour is controlled at runtime through POST /__control:
+    {"delay": 0.01, "auth_delay": 0.05, "jitter": 0.002, "mode": "ok" | "error" | "hang"}
+
+Run standalone with:
+    python -m benchmarks.fake_supabase --port 9999 --users 50 --delay 0.01
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import jwt
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+FAKE_JWT_SECRET = "fake-supabase-jwt-secret-for-benchmarks-only"
+PASSWORD = "Password123"
+
+settings: Dict[str, Any] = {"delay": 0.0, "auth_delay": None, "jitter": 0.0, "mode": "ok"}
+stats = {"requests": 0, "rest": 0, "auth": 0}
+
+PRIMARY_KEYS = {
+    "user_devices": ("user_id", "device_id"),
+    "device_sync_cursors": ("user_id", "device_id", "table_name"),
+}
+# Rows owned by the user in `id` rather than `user_id`
+OWNER_COLUMNS = {"user_profiles": "id"}
+
+_DATETIME = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+def service_key(role: str) -> str:
+    """JWT-shaped API key (supabase-py rejects anything else) for the anon or service_role key"""
+    return jwt.encode({"role": role, "iss": "fake-supabase"}, FAKE_JWT_SECRET, algorithm="HS256")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# --- store ---
+
+class Store:
+    """Tables as lists of dicts behind one lock; unknown tables read as empty"""
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def rows(self, table: str) -> List[Dict[str, Any]]:
+        if table in VIEWS:
+            return VIEWS[table](self)
+        return self.tables.setdefault(table, [])
+
+    def user(self, email: str) -> Dict[str, Any]:
+        user = self.users.get(email)
+        if user is None:
+            user = self.users[email] = {
+                "id": str(uuid.uuid5(uuid.NAMESPACE_URL, email)),
+                "email": email,
+                "email_confirmed_at": "2024-01-01T00:00:00+00:00",
+                "created_at": _now(),
+                "user_metadata": {"full_name": email.split("@")[0]},
+            }
+        return user
+
+
+store = Store()
+
+
+def seed(
+    users: int = 50,
+    classes: int = 6,
+    events: int = 60,
+    notes: int = 40,
+    grades: int = 30,
+    notifications: int = 80,
+    tasks: int = 25,
+    rng_seed: int = 42,
+) -> None:
+    """Fill the store with `users` students, each with the given number of rows per table"""
+    rng = random.Random(rng_seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def uid() -> str:
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    def stamp(days_back: int) -> str:
+        return (now - timedelta(days=rng.randint(0, days_back), minutes=rng.randint(0, 1440))).isoformat()
+
+    with store.lock:
+        store.tables.clear()
+        store.users.clear()
+        tables = store.tables
+        for index in range(users):
+            user = store.user(f"student{index}@studyvault.app")
+            user_id = user["id"]
+            tables.setdefault("user_profiles", []).append({
+                "id": user_id, "email": user["email"], "full_name": f"Student {index}",
+                "avatar_url": None, "timezone": "America/Panama", "subscription_tier": "free",
+                "preferences": {"theme": "dark"}, "created_at": stamp(300), "updated_at": stamp(30),
+            })
+            class_ids = []
+            for number in range(classes):
+                class_id = uid()
+                class_ids.append(class_id)
+                tables.setdefault("classes", []).append({
+                    "id": class_id, "user_id": user_id, "name": f"Course {number}", "code": f"C{number:03d}",
+                    "instructor": f"Prof. {rng.choice('ABCDEFGH')}", "color": "#3B82F6", "credits": rng.randint(2, 5),
+                    "semester": "2026-2", "description": "Seeded course " * 4, "syllabus_url": None,
+                    "is_active": True, "created_at": stamp(120), "updated_at": stamp(30),
+                })
+                category_ids = []
+                for name, percentage in (("Exams", 50.0), ("Homework", 30.0), ("Projects", 20.0)):
+                    category_ids.append(uid())
+                    tables.setdefault("categories_grades", []).append({
+                        "id": category_ids[-1], "user_id": user_id, "class_id": class_id, "name": name,
+                        "percentage": percentage, "created_at": stamp(120), "updated_at": stamp(30),
+                    })
+                for _ in range(max(1, grades // classes)):
+                    tables.setdefault("grades", []).append({
+                        "id": uid(), "user_id": user_id, "class_id": class_id, "category_id": rng.choice(category_ids),
+                        "title": f"Assessment {rng.randint(1, 20)}", "description": "Seeded grade",
+                        "score": round(rng.uniform(50, 100), 1), "max_score": 100.0, "calendar_event_id": None,
+                        "event_type": "exam", "graded_at": stamp(60), "value": 1,
+                        "created_at": stamp(60), "updated_at": stamp(30),
+                    })
+            for _ in range(events):
+                start = now + timedelta(days=rng.randint(-30, 30), hours=rng.randint(7, 20))
+                tables.setdefault("calendar_events", []).append({
+                    "id": uid(), "user_id": user_id, "class_id": rng.choice(class_ids),
+                    "title": f"Lecture {rng.randint(1, 40)}", "description": "Seeded event",
+                    "start_datetime": start.isoformat(), "end_datetime": (start + timedelta(minutes=90)).isoformat(),
+                    "event_type": rng.choice(["class", "exam", "study"]), "is_recurring": False,
+                    "recurrence_pattern": {}, "location": f"Room {rng.randint(100, 400)}", "reminder_minutes": 15,
+                    "google_calendar_id": None, "external_calendar_sync": {},
+                    "created_at": stamp(90), "updated_at": stamp(30),
+                })
+            for _ in range(notes):
+                tables.setdefault("notes", []).append({
+                    "id": uid(), "user_id": user_id, "class_id": rng.choice(class_ids),
+                    "title": f"Notes {rng.randint(1, 40)}", "content": "Lorem ipsum dolor sit amet. " * rng.randint(10, 80),
+                    "ai_summary": None, "lesson_date": (now.date() - timedelta(days=rng.randint(0, 90))).isoformat(),
+                    "tags": rng.sample(["exam", "lab", "review", "reading", "project"], 2),
+                    "local_files_path": "StudyFiles", "attachments": [], "is_favorite": rng.random() < 0.2,
+                    "last_edited": stamp(30), "created_at": stamp(90), "updated_at": stamp(30),
+                })
+            for _ in range(tasks):
+                tables.setdefault("tasks", []).append({
+                    "id": uid(), "user_id": user_id, "class_id": rng.choice(class_ids),
+                    "title": f"Task {rng.randint(1, 99)}", "description": "Seeded task",
+                    "due_date": (now + timedelta(days=rng.randint(-5, 20))).isoformat(),
+                    "priority": rng.randint(1, 3), "status": rng.choice(["pending", "in_progress", "completed"]),
+                    "estimated_minutes": rng.choice([30, 60, 90]),
+                    "created_at": stamp(60), "updated_at": stamp(30),
+                })
+            for _ in range(notifications):
+                tables.setdefault("notifications", []).append({
+                    "id": uid(), "user_id": user_id, "title": "Reminder", "message": "Seeded notification",
+                    "action_url": None, "type": "reminder", "scheduled_for": stamp(14),
+                    "is_read": rng.random() < 0.7, "sent_at": None, "source_type": None, "source_id": None,
+                    "occurrence_at": None, "created_at": stamp(30),
+                })
+            tables.setdefault("user_devices", []).append({
+                "user_id": user_id, "device_id": f"device-{index}", "device_name": "Phone", "device_type": "ios",
+                "is_active": True, "last_sync": stamp(2), "created_at": stamp(100),
+            })
+
+
+def _grades_by_category(db: Store) -> List[Dict[str, Any]]:
+    categories = {row["id"]: row for row in db.tables.get("categories_grades", [])}
+    return [{
+        "grade_id": g["id"], "user_id": g["user_id"], "class_id": g["class_id"], "category_id": g["category_id"],
+        "category_name": categories.get(g["category_id"], {}).get("name"),
+        "category_percentage": categories.get(g["category_id"], {}).get("percentage"),
+        "grade_title": g.get("title"), "grade_description": g.get("description"), "score": g.get("score"),
+        "max_score": g.get("max_score"), "graded_at": g.get("graded_at"),
+        "calendar_event_id": g.get("calendar_event_id"), "grade_value": g.get("value"),
+    } for g in db.tables.get("grades", []) if g.get("value") == 1]
+
+
+def _grades_by_course(db: Store) -> List[Dict[str, Any]]:
+    classes = {row["id"]: row for row in db.tables.get("classes", [])}
+    return [{
+        "grade_id": g["id"], "user_id": g["user_id"], "class_id": g["class_id"],
+        "class_name": classes.get(g["class_id"], {}).get("name"),
+        "grade_title": g.get("title"), "grade_description": g.get("description"), "score": g.get("score"),
+        "max_score": g.get("max_score"), "graded_at": g.get("graded_at"), "category_id": g.get("category_id"),
+        "calendar_event_id": g.get("calendar_event_id"), "grade_value": g.get("value"),
+    } for g in db.tables.get("grades", []) if g.get("value") == 1]
+
+
+# Read-only views (see migrations/vistas.sql), computed on every read
+VIEWS: Dict[str, Callable[[Store], List[Dict[str, Any]]]] = {
+    "vw_grades_by_category": _grades_by_category,
+    "vw_grades_by_course": _grades_by_course,
+}
+
+
+# --- PostgREST query semantics ---
+
+def _parse_datetime(value: str) -> datetime:
+    # A "+" in a query string decodes to a space
+    value = value.replace("Z", "+00:00")
+    if "T" in value and " " in value:
+        value = value.replace(" ", "+")
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _coerce(value: Any, raw: str) -> Tuple[Any, Any]:
+    """The row value and the filter literal as comparable Python values"""
+    if isinstance(value, bool):
+        return value, raw == "true"
+    if isinstance(value, (int, float)):
+        try:
+            return value, float(raw)
+        except ValueError:
+            return str(value), raw
+    if isinstance(value, str) and _DATETIME.match(value) and _DATETIME.match(raw):
+        try:
+            return _parse_datetime(value), _parse_datetime(raw)
+        except ValueError:
+            pass
+    return str(value), raw
+
+
+def _list_literal(raw: str) -> List[str]:
+    """(a,"b") or {a,"b"} -> ["a", "b"]"""
+    return [item.strip().strip('"') for item in raw[1:-1].split(",") if item.strip()]
+
+
+def _matches(row: Dict[str, Any], column: str, expression: str) -> bool:
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    operator, _, raw = expression.partition(".")
+    value = row.get(column)
+    if operator == "is":
+        result = value is None if raw == "null" else value is (raw == "true")
+    elif operator == "in":
+        result = value is not None and str(value) in _list_literal(raw)
+    elif operator == "cs":
+        result = isinstance(value, list) and set(_list_literal(raw)) <= set(map(str, value))
+    elif value is None:
+        result = False
+    elif operator in ("like", "ilike"):
+        pattern = re.escape(raw).replace(r"\*", ".*").replace("%", ".*")
+        result = re.fullmatch(pattern, str(value), re.IGNORECASE if operator == "ilike" else 0) is not None
+    else:
+        left, right = _coerce(value, raw)
+        try:
+            result = {
+                "eq": left == right, "neq": left != right, "gt": left > right,
+                "gte": left >= right, "lt": left < right, "lte": left <= right,
+            }[operator]
+        except TypeError:
+            result = False
+        except KeyError:
+            raise ValueError(f"unsupported operator {operator}")
+    return not result if negate else result
+
+
+def _split_top_level(value: str) -> List[str]:
+    parts, depth, current = [], 0, ""
+    for char in value:
+        if char in "({":
+            depth += 1
+        elif char in ")}":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _matches_or(row: Dict[str, Any], expression: str) -> bool:
+    for condition in _split_top_level(expression.strip("()")):
+        column, _, rest = condition.partition(".")
+        if _matches(row, column, rest):
+            return True
+    return False
+
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+def _filter(rows: List[Dict[str, Any]], params: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    for key, expression in params:
+        if key in RESERVED_PARAMS:
+            continue
+        if key == "or":
+            rows = [row for row in rows if _matches_or(row, expression)]
+        else:
+            rows = [row for row in rows if _matches(row, key, expression)]
+    return rows
+
+
+def _order(rows: List[Dict[str, Any]], order: str) -> List[Dict[str, Any]]:
+    # Stable sorts applied from the last key to the first; nulls last
+    for term in reversed(order.split(",")):
+        column, *modifiers = term.split(".")
+        descending = "desc" in modifiers
+        present = [row for row in rows if row.get(column) is not None]
+        missing = [row for row in rows if row.get(column) is None]
+        present.sort(key=lambda row: _coerce(row[column], str(row[column]))[0], reverse=descending)
+        rows = present + missing
+    return rows
+
+
+def _project(rows: List[Dict[str, Any]], select: str) -> List[Dict[str, Any]]:
+    if not select or select == "*":
+        return [dict(row) for row in rows]
+    columns = [column.strip() for column in select.split(",")]
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+
+def _prefer(request: Request) -> Dict[str, str]:
+    values = {}
+    for item in request.headers.get("prefer", "").split(","):
+        key, _, value = item.strip().partition("=")
+        if key:
+            values[key] = value
+    return values
+
+
+def _claims(request: Request) -> Dict[str, Any]:
+    authorization = request.headers.get("authorization", "")
+    token = authorization[7:] if authorization.startswith("Bearer ") else request.headers.get("apikey", "")
+    try:
+        return jwt.decode(token, FAKE_JWT_SECRET, algorithms=["HS256"], options={"verify_aud": False})
+    except jwt.PyJWTError:
+        return {}
+
+
+def _owner(table: str) -> str:
+    return OWNER_COLUMNS.get(table, "user_id")
+
+
+def _visible(table: str, rows: List[Dict[str, Any]], claims: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Row level security: authenticated callers only see their own rows"""
+    if claims.get("role") != "authenticated":
+        return rows
+    owner = _owner(table)
+    return [row for row in rows if row.get(owner) == claims.get("sub")]
+
+
+def _key(table: str, row: Dict[str, Any], columns: Optional[Tuple[str, ...]] = None) -> Tuple:
+    return tuple(str(row.get(column)) for column in (columns or PRIMARY_KEYS.get(table, ("id",))))
+
+
+def _with_defaults(table: str, row: Dict[str, Any], claims: Dict[str, Any]) -> Dict[str, Any]:
+    row = {key: (_now() if value == "now()" else value) for key, value in row.items()}
+    if PRIMARY_KEYS.get(table, ("id",)) == ("id",):
+        row.setdefault("id", claims.get("sub") if table == "user_profiles" else str(uuid.uuid4()))
+    if claims.get("role") == "authenticated" and table != "user_profiles":
+        row.setdefault("user_id", claims.get("sub"))
+    row.setdefault("created_at", _now())
+    row.setdefault("updated_at", _now())
+    return row
+
+
+def _response(request: Request, rows: List[Dict[str, Any]], status_code: int = 200, total: Optional[int] = None) -> Response:
+    prefer = _prefer(request)
+    headers = {}
+    if total is not None or prefer.get("count"):
+        count = total if total is not None else len(rows)
+        headers["content-range"] = f"0-{max(0, len(rows) - 1)}/{count}" if rows else f"*/{count}"
+    if request.method == "HEAD" or prefer.get("return") == "minimal":
+        return Response(status_code=204 if request.method != "HEAD" else 200, headers=headers)
+    if "application/vnd.pgrst.object+json" in request.headers.get("accept", ""):
+        if len(rows) != 1:
+            return JSONResponse({
+                "code": "PGRST116", "details": f"The result contains {len(rows)} rows",
+                "hint": None, "message": "JSON object requested, multiple (or no) rows returned",
+            }, status_code=406)
+        return JSONResponse(rows[0], status_code=status_code, headers=headers)
+    return JSONResponse(rows, status_code=status_code, headers=headers)
+
+
+async def _simulate(auth: bool = False) -> Optional[Response]:
+    stats["requests"] += 1
+    stats["auth" if auth else "rest"] += 1
+    if settings["mode"] == "hang":
+        await asyncio.sleep(3600)
+    delay = settings["auth_delay"] if auth and settings["auth_delay"] is not None else settings["delay"]
+    if settings["jitter"]:
+        delay += random.uniform(0, settings["jitter"])
+    if delay > 0:
+        await asyncio.sleep(delay)
+    if settings["mode"] == "error":
+        return JSONResponse({"msg": "upstream failure"}, status_code=503)
+    return None
+
+
+async def rest(request: Request) -> Response:
+    failure = await _simulate()
+    if failure:
+        return failure
+    table = request.path_params["table"]
+    params = list(request.query_params.multi_items())
+    query = dict(params)
+    claims = _claims(request)
+    prefer = _prefer(request)
+
+    try:
+        with store.lock:
+            if request.method in ("GET", "HEAD"):
+                rows = _filter(_visible(table, store.rows(table), claims), params)
+                total = len(rows) if prefer.get("count") else None
+                if "order" in query:
+                    rows = _order(rows, query["order"])
+                offset = int(query.get("offset", 0))
+                rows = rows[offset:offset + int(query["limit"])] if "limit" in query else rows[offset:]
+                return _response(request, _project(rows, query.get("select", "*")), total=total)
+
+            if table in VIEWS:
+                return JSONResponse({"code": "42809", "message": f'cannot change view "{table}"'}, status_code=400)
+
+            if request.method == "POST":
+                body = await _json_body(request)
+                incoming = body if isinstance(body, list) else [body]
+                table_rows = store.rows(table)
+                written = []
+                resolution = prefer.get("resolution")
+                conflict = tuple(query["on_conflict"].split(",")) if "on_conflict" in query else None
+                index = {_key(table, row, conflict): row for row in table_rows} if resolution else {}
+                for item in incoming:
+                    row = _with_defaults(table, item, claims)
+                    existing = index.get(_key(table, row, conflict))
+                    if existing is not None:
+                        if resolution == "merge-duplicates":
+                            existing.update({key: value for key, value in item.items()})
+                            existing["updated_at"] = item.get("updated_at", _now())
+                            written.append(existing)
+                        continue
+                    table_rows.append(row)
+                    if resolution:
+                        index[_key(table, row, conflict)] = row
+                    written.append(row)
+                return _response(request, _project(written, query.get("select", "*")), status_code=201)
+
+            matching = _filter(_visible(table, store.rows(table), claims), params)
+            if request.method == "PATCH":
+                patch = await _json_body(request)
+                for row in matching:
+                    row.update(patch)
+                return _response(request, _project(matching, query.get("select", "*")), total=len(matching) if prefer.get("count") else None)
+
+            if request.method == "DELETE":
+                removed = {id(row) for row in matching}
+                store.tables[table] = [row for row in store.rows(table) if id(row) not in removed]
+                return _response(request, _project(matching, query.get("select", "*")), total=len(matching) if prefer.get("count") else None)
+    except ValueError as exc:
+        return JSONResponse({"code": "PGRST100", "message": str(exc)}, status_code=400)
+    return JSONResponse({"message": "method not allowed"}, status_code=405)
+
+
+async def _json_body(request: Request) -> Any:
+    return json.loads(await request.body() or b"null")
+
+
+# --- RPCs ---
+
+def _rpc_get_or_create_profile(claims: Dict[str, Any], args: Dict[str, Any]) -> Any:
+    for row in store.rows("user_profiles"):
+        if row["id"] == claims.get("sub"):
+            return row
+    row = _with_defaults("user_profiles", {
+        "email": claims.get("email", ""), "full_name": args.get("p_full_name") or "",
+        "avatar_url": None, "timezone": args.get("p_timezone") or "America/Panama",
+        "subscription_tier": "free", "preferences": {},
+    }, claims)
+    store.rows("user_profiles").append(row)
+    return row
+
+
+def _rpc_upsert_profile(claims: Dict[str, Any], args: Dict[str, Any]) -> Any:
+    row = _rpc_get_or_create_profile(claims, {
+        "p_full_name": (args.get("p_defaults") or {}).get("full_name"),
+        "p_timezone": (args.get("p_defaults") or {}).get("timezone"),
+    })
+    row.update(args.get("p_patch") or {})
+    row["updated_at"] = _now()
+    return row
+
+
+RPCS: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Any]] = {
+    "get_or_create_profile": _rpc_get_or_create_profile,
+    "upsert_profile": _rpc_upsert_profile,
+}
+
+
+async def rpc(request: Request) -> Response:
+    failure = await _simulate()
+    if failure:
+        return failure
+    function = RPCS.get(request.path_params["function"])
+    if function is None:
+        return JSONResponse({
+            "code": "PGRST202", "message": f"Could not find the function public.{request.path_params['function']}",
+        }, status_code=404)
+    args = await _json_body(request) if request.method == "POST" else dict(request.query_params)
+    with store.lock:
+        result = function(_claims(request), args or {})
+    return JSONResponse(result)
+
+
+# --- GoTrue ---
+
+def _issue_session(user: Dict[str, Any]) -> Dict[str, Any]:
+    expires_at = int(time.time()) + 3600
+    access_token = jwt.encode({
+        "sub": user["id"], "email": user["email"], "aud": "authenticated", "role": "authenticated",
+        "exp": expires_at, "iat": int(time.time()), "session_id": uuid.uuid4().hex,
+    }, FAKE_JWT_SECRET, algorithm="HS256")
+    return {
+        "access_token": access_token, "token_type": "bearer", "expires_in": 3600,
+        "expires_at": expires_at, "refresh_token": uuid.uuid4().hex, "user": user,
+    }
+
+
+def _auth_error(status_code: int, code: str, message: str) -> JSONResponse:
+    return JSONResponse({"error_code": code, "msg": message}, status_code=status_code)
+
+
+async def token(request: Request) -> Response:
+    failure = await _simulate(auth=True)
+    if failure:
+        return failure
+    body = await _json_body(request)
+    if body.get("password") != PASSWORD:
+        return _auth_error(400, "invalid_credentials", "Invalid login credentials")
+    with store.lock:
+        user = store.user(body["email"])
+    return JSONResponse(_issue_session(user))
+
+
+async def signup(request: Request) -> Response:
+    failure = await _simulate(auth=True)
+    if failure:
+        return failure
+    body = await _json_body(request)
+    with store.lock:
+        user = store.user(body["email"])
+    return JSONResponse({**user, "email_confirmed_at": None})
+
+
+async def user(request: Request) -> Response:
+    failure = await _simulate(auth=True)
+    if failure:
+        return failure
+    claims = _claims(request)
+    if claims.get("role") != "authenticated":
+        return _auth_error(401, "bad_jwt", "invalid JWT")
+    with store.lock:
+        current = store.user(claims["email"])
+        if request.method == "PUT":
+            body = await _json_body(request)
+            current["user_metadata"].update(body.get("data") or {})
+    return JSONResponse(current)
+
+
+async def auth_health(request: Request) -> Response:
+    failure = await _simulate(auth=True)
+    return failure or JSONResponse({"version": "fake", "name": "GoTrue", "description": "Fake GoTrue for benchmarks"})
+
+
+async def no_content(request: Request) -> Response:
+    failure = await _simulate(auth=True)
+    return failure or JSONResponse({})
+
+
+async def control(request: Request) -> Response:
+    settings.update(await _json_body(request) or {})
+    return JSONResponse({**settings, **stats})
+
+
+app = Starlette(routes=[
+    Route("/__control", control, methods=["POST"]),
+    Route("/rest/v1/rpc/{function}", rpc, methods=["GET", "POST"]),
+    Route("/rest/v1/{table}", rest, methods=["GET", "HEAD", "POST", "PATCH", "DELETE"]),
+    Route("/auth/v1/token", token, methods=["POST"]),
+    Route("/auth/v1/signup", signup, methods=["POST"]),
+    Route("/auth/v1/user", user, methods=["GET", "PUT"]),
+    Route("/auth/v1/health", auth_health, methods=["GET"]),
+    Route("/auth/v1/recover", no_content, methods=["POST"]),
+    Route("/auth/v1/resend", no_content, methods=["POST"]),
+    Route("/auth/v1/logout", no_content, methods=["POST"]),
+])
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Seed and latency options shared by the standalone server and the benchmark runners"""
+    parser.add_argument("--users", type=int, default=50, help="seeded students")
+    parser.add_argument("--classes", type=int, default=6, help="classes per student")
+    parser.add_argument("--events", type=int, default=60, help="calendar events per student")
+    parser.add_argument("--notes", type=int, default=40, help="notes per student")
+    parser.add_argument("--grades", type=int, default=30, help="grades per student")
+    parser.add_argument("--notifications", type=int, default=80, help="notifications per student")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--delay", type=float, default=0.005, help="injected latency per PostgREST call (s)")
+    parser.add_argument("--auth-delay", type=float, default=None, help="injected latency per GoTrue call (s); defaults to --delay")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform random latency (s)")
+
+
+def seed_arguments(args) -> List[str]:
+    """Command line reproducing `args` for a fake started in a child process"""
+    argv = [
+        "--users", str(args.users), "--classes", str(args.classes), "--events", str(args.events),
+        "--notes", str(args.notes), "--grades", str(args.grades), "--notifications", str(args.notifications),
+        "--seed", str(args.seed), "--delay", str(args.delay), "--jitter", str(args.jitter),
+    ]
+    if args.auth_delay is not None:
+        argv += ["--auth-delay", str(args.auth_delay)]
+    return argv
+
+
+def configure(args) -> None:
+    seed(args.users, args.classes, args.events, args.notes, args.grades, args.notifications, rng_seed=args.seed)
+    settings.update(delay=args.delay, auth_delay=args.auth_delay, jitter=args.jitter, mode="ok")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=9999)
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,236 @@
+# benchmarks/run.py
+"""
+End-to-end benchmark of each router's hot endpoints against a fake Supabase.
+
+Starts benchmarks.fake_supabase with seeded data and injected latency,
+runs the API in this process (startup included) and drives it through
+httpx's ASGI transport. For every endpoint it reports throughput,
+p50/p95/p99 latency, PostgREST calls per request and the memory
+allocated per request (tracemalloc peak, measured in a separate
+sequential pass so tracing does not skew the timings).
+
+Baselines are JSON files in benchmarks/baselines/; --compare exits with
+status 1 when an endpoint regressed by more than --threshold.
+
+    python -m benchmarks.run --requests 200 --concurrency 10 --delay 0.005
+    python -m benchmarks.run --save-baseline main
+    python -m benchmarks.run --compare main --endpoints notes,calendar
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks import fake_supabase
+from benchmarks.common import FakeSupabase, configure_api_env, percentile, sign_in
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# name -> (method, path ("{i}" is the user's index), JSON body factory taking the index)
+ENDPOINTS: Dict[str, Tuple[str, str, Optional[Callable[[int], Any]]]] = {
+    "auth.signin": ("POST", "/auth/signin", lambda i: {"email": f"student{i}@studyvault.app", "password": fake_supabase.PASSWORD}),
+    "auth.profile": ("GET", "/auth/profile", None),
+    "profile.me": ("GET", "/profile/me", None),
+    "classes.list": ("GET", "/classes/", None),
+    "calendar.list": ("GET", "/calendar/", None),
+    "notes.list": ("GET", "/notes/", None),
+    "grades.list": ("GET", "/grades/", None),
+    "categories.list": ("GET", "/categories/", None),
+    "tasks.grades_by_course": ("GET", "/tasks/vw/grades-by-course", None),
+    "notifications.list": ("GET", "/notifications/", None),
+    "notifications.unread_count": ("GET", "/notifications/unread-count", None),
+    "devices.list": ("GET", "/devices/", None),
+    "sync.pull": ("POST", "/sync/pull", lambda i: {"device_id": f"device-{i}", "tables": []}),
+    "sync.status": ("GET", "/sync/status?device_id=device-{i}", None),
+}
+
+# Settings that make runs comparable; a baseline taken with others is flagged
+COMPARABLE_SETTINGS = ("users", "classes", "events", "notes", "grades", "notifications", "delay", "auth_delay", "jitter", "concurrency", "fake")
+
+
+class Runner:
+    def __init__(self, client: httpx.AsyncClient, fake: FakeSupabase, tokens: List[str]):
+        self.client = client
+        self.fake = fake
+        self.tokens = tokens
+
+    async def call(self, name: str, index: int) -> httpx.Response:
+        method, path, body = ENDPOINTS[name]
+        user = index % len(self.tokens)
+        headers = {"Authorization": f"Bearer {self.tokens[user]}"}
+        return await self.client.request(method, path.replace("{i}", str(user)), json=body(user) if body else None, headers=headers)
+
+    async def measure(self, name: str, requests: int, concurrency: int, warmup: int, alloc_samples: int) -> Dict[str, Any]:
+        for index in range(warmup):
+            await self.call(name, index)
+
+        latencies: List[float] = []
+        statuses: Dict[int, int] = {}
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one(index: int) -> None:
+            async with slots:
+                started = time.perf_counter()
+                response = await self.call(name, index)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        before = (await self.fake.control())["rest"]
+        started = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(requests)))
+        elapsed = time.perf_counter() - started
+        db_calls = ((await self.fake.control())["rest"] - before) / requests
+
+        peaks, retained = await self.allocations(name, alloc_samples)
+        return {
+            "requests": requests,
+            "throughput_rps": round(requests / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2),
+            "errors": sum(count for status, count in statuses.items() if status >= 400),
+            "statuses": {str(status): count for status, count in sorted(statuses.items())},
+            "db_calls": round(db_calls, 2),
+            "alloc_kib": round(percentile(peaks, 0.5) / 1024, 1),
+            "retained_kib": round(percentile(retained, 0.5) / 1024, 1),
+        }
+
+    async def allocations(self, name: str, samples: int) -> Tuple[List[int], List[int]]:
+        """Peak and retained traced memory per request, one request at a time"""
+        peaks, retained = [], []
+        if samples <= 0:
+            return peaks, retained
+        tracemalloc.start()
+        try:
+            for index in range(samples):
+                baseline = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                await self.call(name, index)
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - baseline)
+                retained.append(current - baseline)
+        finally:
+            tracemalloc.stop()
+        return peaks, retained
+
+
+def print_results(results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"\n{'endpoint':30} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'db/req':>7} {'KiB/req':>8} {'errors':>7}")
+    for name, result in results.items():
+        print(
+            f"{name:30} {result['throughput_rps']:8.1f} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} "
+            f"{result['p99_ms']:8.2f} {result['db_calls']:7.2f} {result['alloc_kib']:8.1f} {result['errors']:7d}"
+        )
+
+
+def baseline_path(name: str) -> str:
+    return name if name.endswith(".json") else os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(name: str, settings: Dict[str, Any], results: Dict[str, Dict[str, Any]]) -> str:
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump({
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": settings,
+            "results": results,
+        }, output, indent=2)
+    return path
+
+
+def compare(name: str, settings: Dict[str, Any], results: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """Print the change against a saved baseline; returns the regressions"""
+    with open(baseline_path(name), encoding="utf-8") as source:
+        baseline = json.load(source)
+    changed = [key for key in COMPARABLE_SETTINGS if baseline["settings"].get(key) != settings.get(key)]
+    if changed:
+        print(f"\n  warning: settings differ from the baseline ({', '.join(changed)}); numbers are not comparable")
+
+    regressions = []
+    print(f"\nvs baseline {name} ({baseline['created_at']})")
+    print(f"{'endpoint':30} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'KiB/req':>9}")
+    for endpoint, result in results.items():
+        before = baseline["results"].get(endpoint)
+        if before is None:
+            print(f"{endpoint:30} (new)")
+            continue
+        deltas = {}
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "alloc_kib"):
+            deltas[key] = (result[key] - before[key]) / before[key] if before[key] else 0.0
+        print(f"{endpoint:30} " + " ".join(f"{delta:+8.1%}" for delta in deltas.values()))
+        worse = [key for key in ("p50_ms", "p95_ms", "alloc_kib") if deltas[key] > threshold]
+        if deltas["throughput_rps"] < -threshold:
+            worse.append("throughput_rps")
+        if result["errors"] > before["errors"]:
+            worse.append("errors")
+        regressions += [f"{endpoint}: {key}" for key in worse]
+    return regressions
+
+
+async def run(args, fake: FakeSupabase) -> int:
+    from main import app
+
+    names = [name for name in ENDPOINTS if not args.endpoints or any(part in name for part in args.endpoints.split(","))]
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=60) as client:
+            bench_users = min(args.bench_users, args.users)
+            tokens = await sign_in(client, [f"student{i}@studyvault.app" for i in range(bench_users)])
+            runner = Runner(client, fake, tokens)
+            results = {}
+            for name in names:
+                results[name] = await runner.measure(name, args.requests, args.concurrency, args.warmup, args.alloc_samples)
+                print(f"  {name:30} done", file=sys.stderr)
+
+    print(f"\nfake={'thread' if args.in_thread else 'process'} users={args.users} delay={args.delay}s "
+          f"requests={args.requests} concurrency={args.concurrency}")
+    print_results(results)
+
+    settings = {key: getattr(args, key) for key in COMPARABLE_SETTINGS if hasattr(args, key)}
+    settings["fake"] = "thread" if args.in_thread else "process"
+    status = 0
+    if args.compare:
+        regressions = compare(args.compare, settings, results, args.threshold)
+        if regressions:
+            print(f"\nREGRESSIONS (> {args.threshold:.0%}): " + ", ".join(regressions))
+            status = 1
+    if args.save_baseline:
+        print(f"\nbaseline saved to {save_baseline(args.save_baseline, settings, results)}")
+    return status
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the hot endpoints against a fake Supabase")
+    fake_supabase.add_arguments(parser)
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--alloc-samples", type=int, default=30, help="requests traced for allocations (0 disables)")
+    parser.add_argument("--bench-users", type=int, default=20, help="seeded users the requests rotate through")
+    parser.add_argument("--endpoints", default="", help="comma-separated substrings of endpoint names to run")
+    parser.add_argument("--in-thread", action="store_true", help="serve the fake from this process (its work then shows up in the numbers)")
+    parser.add_argument("--save-baseline", metavar="NAME", help="write results to benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare with a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    with FakeSupabase(fake_supabase.seed_arguments(args), in_thread=args.in_thread) as fake:
+        configure_api_env(fake)
+        return asyncio.run(run(args, fake))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+# benchmarks/scenarios.py
+"""
+Multi-user load scenarios modelled on the mobile client's traffic.
+
+Each virtual user is one seeded student running the scenario's session in
+a loop (closed model) with exponentially distributed think time between
+requests. Users ramp through --stages; every stage runs for --duration
+seconds and reports throughput and per-step tail latency, and the run
+ends with the saturation point: the first stage where adding users no
+longer adds throughput, errors appear or p95 breaks the --slo-ms target.
+
+Scenarios:
+    app-open       sign in, profile, classes, calendar, notifications, unread badge, sync pull
+    offline-flush  push queued task / calendar edits in batches, then a resumed pull
+    exam-week      grades, categories, grade views and upcoming exams, checked repeatedly
+
+    python -m benchmarks.scenarios app-open --stages 5,10,20,40 --duration 20 --think-time 0.5
+    python -m benchmarks.scenarios all --delay 0.01 --json /tmp/scenarios.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks import fake_supabase
+from benchmarks.common import FakeSupabase, configure_api_env, percentile, sign_in
+
+# Throughput gain (relative) below which more users count as saturating the API
+SATURATION_GAIN = 0.10
+MAX_ERROR_RATE = 0.01
+
+
+class Recorder:
+    """Latencies and failures of one stage, per step"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.sessions: List[float] = []
+
+    def record(self, step: str, seconds: float, ok: bool) -> None:
+        self.latencies.setdefault(step, []).append(seconds)
+        if not ok:
+            self.errors[step] = self.errors.get(step, 0) + 1
+
+    def summary(self, users: int, elapsed: float) -> Dict[str, Any]:
+        every = [value for values in self.latencies.values() for value in values]
+        requests = len(every)
+        errors = sum(self.errors.values())
+        return {
+            "users": users,
+            "requests": requests,
+            "sessions": len(self.sessions),
+            "throughput_rps": round(requests / elapsed, 1),
+            "error_rate": round(errors / requests, 4) if requests else 0.0,
+            "p50_ms": round(percentile(every, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(every, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(every, 0.99) * 1000, 1),
+            "session_p95_ms": round(percentile(self.sessions, 0.95) * 1000, 1),
+            "steps": {
+                step: {
+                    "count": len(values),
+                    "errors": self.errors.get(step, 0),
+                    "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+                    "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+                    "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+                }
+                for step, values in self.latencies.items()
+            },
+        }
+
+
+class VirtualUser:
+    def __init__(self, index: int, client: httpx.AsyncClient, token: str, recorder: Recorder, think_time: float, rng: random.Random):
+        self.index = index
+        self.email = f"student{index}@studyvault.app"
+        self.device_id = f"device-{index}"
+        self.client = client
+        self.token = token
+        self.recorder = recorder
+        self.think_time = think_time
+        self.rng = rng
+        self.last_sync: Optional[str] = None
+        # Cursors of the last resumed pull, acknowledged on the next one
+        self.cursors: Dict[str, str] = {}
+
+    async def request(self, step: str, method: str, path: str, **kwargs) -> Optional[httpx.Response]:
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(step, time.perf_counter() - started, False)
+            return None
+        self.recorder.record(step, time.perf_counter() - started, response.status_code < 400)
+        return response
+
+    async def think(self) -> None:
+        if self.think_time > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+
+
+# --- scenarios ---
+
+async def app_open(user: VirtualUser) -> None:
+    """Cold open of the app: everything the home screen needs, in the client's order"""
+    response = await user.request("signin", "POST", "/auth/signin", json={"email": user.email, "password": fake_supabase.PASSWORD})
+    if response is not None and response.status_code == 200:
+        user.token = response.json()["session"]["access_token"]
+    await user.think()
+    await user.request("profile", "GET", "/auth/profile")
+    await user.request("classes", "GET", "/classes/")
+    await user.request("calendar", "GET", "/calendar/")
+    await user.think()
+    await user.request("notifications", "GET", "/notifications/")
+    await user.request("unread-count", "GET", "/notifications/unread-count")
+    await user.think()
+    response = await user.request("sync-pull", "POST", "/sync/pull", json={"device_id": user.device_id, "tables": []})
+    if response is not None and response.status_code == 200:
+        user.last_sync = response.json()["last_sync"]
+    await user.think()
+
+
+def _queued_task(user: VirtualUser) -> Dict[str, Any]:
+    return {
+        "id": str(uuid.UUID(int=user.rng.getrandbits(128), version=4)),
+        "title": f"Offline task {user.rng.randint(1, 999)}",
+        "description": "Edited while offline",
+        "due_date": (datetime.now(timezone.utc) + timedelta(days=user.rng.randint(1, 14))).isoformat(),
+        "priority": user.rng.randint(1, 3),
+        "status": "pending",
+    }
+
+
+def _queued_event(user: VirtualUser) -> Dict[str, Any]:
+    start = datetime.now(timezone.utc) + timedelta(days=user.rng.randint(0, 14), hours=user.rng.randint(8, 18))
+    return {
+        "id": str(uuid.UUID(int=user.rng.getrandbits(128), version=4)),
+        "title": "Study session",
+        "start_datetime": start.isoformat(),
+        "end_datetime": (start + timedelta(hours=1)).isoformat(),
+        "event_type": "study",
+    }
+
+
+async def offline_flush(user: VirtualUser) -> None:
+    """Reconnect after working offline: flush the queued edits, then catch up"""
+    for _ in range(user.rng.randint(1, 3)):
+        records = [_queued_task(user) for _ in range(user.rng.randint(5, 20))]
+        await user.request("push-tasks", "POST", "/sync/push", params={"table_name": "tasks", "device_id": user.device_id}, json=records)
+    records = [_queued_event(user) for _ in range(user.rng.randint(1, 5))]
+    await user.request("push-events", "POST", "/sync/push", params={"table_name": "calendar_events", "device_id": user.device_id}, json=records)
+    response = await user.request("sync-pull", "POST", "/sync/pull", json={"device_id": user.device_id, "resume": True, "ack": user.cursors})
+    if response is not None and response.status_code == 200:
+        user.last_sync = response.json()["last_sync"]
+        user.cursors = response.json()["cursors"]
+    await user.think()
+
+
+async def exam_week(user: VirtualUser) -> None:
+    """Anxious grade checking: the grade screens, refreshed again and again"""
+    await user.request("grades", "GET", "/grades/")
+    await user.request("categories", "GET", "/categories/")
+    await user.think()
+    await user.request("grades-by-course", "GET", "/tasks/vw/grades-by-course")
+    await user.request("grades-by-category", "GET", "/tasks/vw/grades-by-category")
+    await user.think()
+    await user.request("exams", "GET", "/calendar/", params={"event_type": "exam"})
+    await user.request("unread-count", "GET", "/notifications/unread-count")
+    await user.think()
+
+
+SCENARIOS: Dict[str, Callable[[VirtualUser], Any]] = {
+    "app-open": app_open,
+    "offline-flush": offline_flush,
+    "exam-week": exam_week,
+}
+
+
+# --- runner ---
+
+async def run_stage(client: httpx.AsyncClient, scenario: str, tokens: List[str], users: int, duration: float, think_time: float, seed: int) -> Dict[str, Any]:
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    session = SCENARIOS[scenario]
+
+    async def loop(index: int) -> None:
+        user = VirtualUser(index, client, tokens[index], recorder, think_time, random.Random(seed * 100003 + index))
+        # Spread the first sessions over one think time so users do not start in lockstep
+        await asyncio.sleep(user.rng.uniform(0, think_time))
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            await session(user)
+            recorder.sessions.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop(index) for index in range(users)))
+    return recorder.summary(users, time.perf_counter() - started)
+
+
+def saturation(stages: List[Dict[str, Any]], slo_ms: float) -> Dict[str, Any]:
+    """First stage where more users stopped paying off, and the best stage before it"""
+    peak = stages[0]
+    for previous, stage in zip([None] + stages[:-1], stages):
+        reasons = []
+        if stage["error_rate"] > MAX_ERROR_RATE:
+            reasons.append(f"error rate {stage['error_rate']:.1%}")
+        if stage["p95_ms"] > slo_ms:
+            reasons.append(f"p95 {stage['p95_ms']:.0f}ms over the {slo_ms:.0f}ms SLO")
+        if previous is not None and stage["throughput_rps"] < previous["throughput_rps"] * (1 + SATURATION_GAIN):
+            reasons.append(f"throughput {previous['throughput_rps']} -> {stage['throughput_rps']} req/s")
+        if reasons:
+            return {"saturated_at_users": stage["users"], "reasons": reasons, "peak": peak}
+        peak = stage
+    return {"saturated_at_users": None, "reasons": [], "peak": peak}
+
+
+def print_scenario(name: str, stages: List[Dict[str, Any]], verdict: Dict[str, Any]) -> None:
+    print(f"\n== {name}")
+    print(f"{'users':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'sessions':>9} {'session p95':>12}")
+    for stage in stages:
+        print(
+            f"{stage['users']:6d} {stage['throughput_rps']:8.1f} {stage['p50_ms']:8.1f} {stage['p95_ms']:8.1f} "
+            f"{stage['p99_ms']:8.1f} {stage['error_rate']:7.1%} {stage['sessions']:9d} {stage['session_p95_ms']:12.1f}"
+        )
+    steps = list(stages[-1]["steps"])
+    print(f"\n  p95 ms per step  " + " ".join(f"{stage['users']:>7}u" for stage in stages))
+    for step in steps:
+        print(f"  {step:18}" + " ".join(f"{stage['steps'].get(step, {}).get('p95_ms', 0):8.1f}" for stage in stages))
+    peak = verdict["peak"]
+    if verdict["saturated_at_users"] is None:
+        print(f"\n  no saturation up to {stages[-1]['users']} users (peak {peak['throughput_rps']} req/s)")
+    else:
+        print(f"\n  saturates at {verdict['saturated_at_users']} users: {'; '.join(verdict['reasons'])}")
+        print(f"  best stage: {peak['users']} users, {peak['throughput_rps']} req/s, p95 {peak['p95_ms']}ms")
+
+
+async def run(args, fake: FakeSupabase) -> int:
+    from main import app
+
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    stages = sorted({int(value) for value in args.stages.split(",")})
+    report: Dict[str, Any] = {"settings": {key: value for key, value in vars(args).items() if key != "json"}, "scenarios": {}}
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=args.timeout) as client:
+            tokens = await sign_in(client, [f"student{i}@studyvault.app" for i in range(stages[-1])])
+            for scenario in scenarios:
+                results = []
+                for users in stages:
+                    print(f"  {scenario}: {users} users for {args.duration:g}s", file=sys.stderr)
+                    results.append(await run_stage(client, scenario, tokens, users, args.duration, args.think_time, args.seed))
+                verdict = saturation(results, args.slo_ms)
+                print_scenario(scenario, results, verdict)
+                report["scenarios"][scenario] = {"stages": results, "saturation": verdict}
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+        print(f"\nresults written to {args.json}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Multi-user load scenarios against a fake Supabase")
+    parser.add_argument("scenario", choices=[*SCENARIOS, "all"])
+    fake_supabase.add_arguments(parser)
+    parser.add_argument("--stages", default="5,10,20,40", help="comma-separated concurrent user counts to ramp through")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per stage")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean think time between requests (s, exponential)")
+    parser.add_argument("--slo-ms", type=float, default=1000.0, help="p95 target; a stage above it counts as saturated")
+    parser.add_argument("--timeout", type=float, default=30.0, help="client timeout per request (s)")
+    parser.add_argument("--in-thread", action="store_true", help="serve the fake from this process")
+    parser.add_argument("--json", metavar="PATH", help="also write the full results as JSON")
+    args = parser.parse_args()
+    # Every virtual user is a distinct seeded student
+    args.users = max(args.users, max(int(value) for value in args.stages.split(",")))
+
+    with FakeSupabase(fake_supabase.seed_arguments(args), in_thread=args.in_thread) as fake:
+        configure_api_env(fake)
+        return asyncio.run(run(args, fake))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+# benchmarks/startup.py
+"""
+Cold start profile: import-time breakdown and time to first response.
+
+For each of --runs fresh interpreters:
+  1. `python -X importtime -c "import main"`: time to import the app, split
+     into third-party packages and this project's modules;
+  2. uvicorn serving main:app against the fake Supabase: time from spawn to
+     the first /health/live answer (listening), to /health/ready passing
+     (dependencies reachable) and to the first authenticated request
+     (sign in + GET /classes/).
+
+Medians are compared with the budgets; the exit status is 1 when one is
+exceeded, so CI can run this as the startup budget check.
+
+    python -m benchmarks.startup --runs 3 --import-budget-ms 1500 --ready-budget-ms 4000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks import fake_supabase
+from benchmarks.common import ROOT, FakeSupabase, api_env, free_port
+
+
+def _project_modules() -> set:
+    names = {name[:-3] for name in os.listdir(ROOT) if name.endswith(".py")}
+    return names | {"routers"}
+
+
+def parse_importtime(output: str) -> Tuple[float, Dict[str, float], Dict[str, float]]:
+    """(total ms for `main`, self ms per third-party package, cumulative ms per project module)"""
+    project = _project_modules()
+    packages: Dict[str, float] = {}
+    modules: Dict[str, float] = {}
+    total = 0.0
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        top = name.split(".")[0]
+        if name == "main":
+            total = int(cumulative_us) / 1000
+        elif top in project:
+            # Project modules are reported with what they pull in, to show where to defer
+            modules[name] = max(modules.get(name, 0.0), int(cumulative_us) / 1000)
+        else:
+            packages[top] = packages.get(top, 0.0) + int(self_us) / 1000
+    return total, packages, modules
+
+
+def measure_import(env: Dict[str, str]) -> Tuple[float, Dict[str, float], Dict[str, float]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def _wait_for(url: str, deadline: float, expect_ok: bool = True) -> float:
+    while time.monotonic() < deadline:
+        try:
+            response = httpx.get(url, timeout=1)
+            if response.status_code == 200 or not expect_ok:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not become available")
+
+
+def measure_boot(env: Dict[str, str], timeout: float) -> Dict[str, float]:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        live = _wait_for(f"{url}/health/live", deadline)
+        ready = _wait_for(f"{url}/health/ready", deadline)
+        with httpx.Client(base_url=url, timeout=timeout) as client:
+            session = client.post("/auth/signin", json={"email": "student0@studyvault.app", "password": fake_supabase.PASSWORD})
+            session.raise_for_status()
+            token = session.json()["session"]["access_token"]
+            client.get("/classes/", headers={"Authorization": f"Bearer {token}"}).raise_for_status()
+        first = time.perf_counter()
+    finally:
+        process.kill()
+        process.wait()
+    return {
+        "live_ms": (live - started) * 1000,
+        "ready_ms": (ready - started) * 1000,
+        "first_request_ms": (first - started) * 1000,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cold start profile with an import-time breakdown and startup budgets")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=12, help="rows per breakdown table")
+    parser.add_argument("--import-budget-ms", type=float, default=1500.0, help="median time to import main")
+    parser.add_argument("--ready-budget-ms", type=float, default=4000.0, help="median time from spawn to /health/ready")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    imports: List[float] = []
+    boots: List[Dict[str, float]] = []
+    packages: Dict[str, List[float]] = {}
+    modules: Dict[str, List[float]] = {}
+    with FakeSupabase(["--users", "5", "--delay", "0"]) as fake:
+        env = {**os.environ, **api_env(fake)}
+        for run in range(args.runs):
+            total, run_packages, run_modules = measure_import(env)
+            imports.append(total)
+            for name, value in run_packages.items():
+                packages.setdefault(name, []).append(value)
+            for name, value in run_modules.items():
+                modules.setdefault(name, []).append(value)
+            boots.append(measure_boot(env, args.timeout))
+            print(f"  run {run + 1}: import {total:.0f}ms, ready {boots[-1]['ready_ms']:.0f}ms", file=sys.stderr)
+
+    import_ms = statistics.median(imports)
+    print(f"\nimport main: {import_ms:.0f}ms (median of {args.runs}; budget {args.import_budget_ms:.0f}ms)")
+    print(f"\n{'third-party package (self time)':40} {'ms':>8}")
+    for name, values in sorted(packages.items(), key=lambda item: -statistics.median(item[1]))[:args.top]:
+        print(f"{name:40} {statistics.median(values):8.1f}")
+    print(f"\n{'project module (cumulative)':40} {'ms':>8}")
+    for name, values in sorted(modules.items(), key=lambda item: -statistics.median(item[1]))[:args.top]:
+        print(f"{name:40} {statistics.median(values):8.1f}")
+
+    print(f"\n{'boot (from spawn)':40} {'median ms':>10} {'max ms':>8}")
+    for key in ("live_ms", "ready_ms", "first_request_ms"):
+        values = [boot[key] for boot in boots]
+        print(f"{key[:-3]:40} {statistics.median(values):10.0f} {max(values):8.0f}")
+
+    failures = []
+    if import_ms > args.import_budget_ms:
+        failures.append(f"import {import_ms:.0f}ms > {args.import_budget_ms:.0f}ms")
+    ready_ms = statistics.median(boot["ready_ms"] for boot in boots)
+    if ready_ms > args.ready_budget_ms:
+        failures.append(f"ready {ready_ms:.0f}ms > {args.ready_budget_ms:.0f}ms")
+    if failures:
+        print("\nSTARTUP BUDGET EXCEEDED: " + ", ".join(failures))
+        return 1
+    print("\nstartup within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+# benchmarks/workers.py
+"""
+Throughput scaling with the number of gunicorn workers.
+
+For each worker count the production server (gunicorn.conf.py) is started
+against the fake Supabase and driven over real HTTP by a closed loop of
+--concurrency clients cycling through the hot read endpoints for
+--duration seconds. Reports req/s, latency percentiles and the speed-up
+and efficiency relative to the first worker count.
+
+--restart sends SIGHUP halfway through each run: gunicorn replaces every
+worker while in-flight requests finish. A connection whose request has not
+been read yet when its worker stops is closed without a response; like the
+mobile HTTP stacks, the client retries such requests once (the "retried"
+column). Errors in a restart run mean requests were really lost.
+
+    python -m benchmarks.workers --workers 1,2,4 --duration 15 --delay 0.02
+
+The load generator is a single Python process on the same machine; once it
+saturates a core, more workers cannot show more throughput. Compare with
+--workers sized to the CPUs left for the server.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks import fake_supabase
+from benchmarks.common import ROOT, FakeSupabase, api_env, free_port, percentile, sign_in
+from benchmarks.run import ENDPOINTS
+
+DEFAULT_ENDPOINTS = "classes.list,calendar.list,notes.list,notifications.unread_count,profile.me"
+
+
+class Server:
+    """gunicorn with gunicorn.conf.py in a child process"""
+
+    def __init__(self, env: Dict[str, str], workers: int):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = {**env, "PORT": str(self.port), "WEB_CONCURRENCY": str(workers)}
+        self.process: subprocess.Popen = None
+
+    def start(self, timeout: float) -> "Server":
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{self.port}"],
+            cwd=ROOT, env=self.env,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self.process.poll() is None:
+            try:
+                if httpx.get(f"{self.url}/health/ready", timeout=1).status_code == 200:
+                    return self
+            except httpx.TransportError:
+                pass
+            time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("gunicorn did not become ready")
+
+    def stop(self, timeout: float = 30) -> None:
+        if self.process is None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+
+async def drive(server: Server, names: List[str], args) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=server.url, timeout=60, limits=limits) as client:
+        tokens = await sign_in(client, [f"student{i}@studyvault.app" for i in range(min(args.bench_users, args.users))])
+        for index in range(args.warmup):
+            await request(client, tokens, names, index)
+
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+        retried = 0
+        deadline = time.monotonic() + args.duration
+
+        async def loop(worker: int) -> None:
+            nonlocal retried
+            index = worker
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    try:
+                        response = await request(client, tokens, names, index)
+                    except (httpx.ReadError, httpx.RemoteProtocolError):
+                        retried += 1
+                        response = await request(client, tokens, names, index)
+                    status = str(response.status_code)
+                except httpx.TransportError as exc:
+                    status = type(exc).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+                index += args.concurrency
+
+        async def restart() -> None:
+            await asyncio.sleep(args.duration / 2)
+            os.kill(server.process.pid, signal.SIGHUP)
+
+        started = time.perf_counter()
+        tasks = [loop(worker) for worker in range(args.concurrency)]
+        if args.restart:
+            tasks.append(restart())
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400)
+    return {
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": errors,
+        "retried": retried,
+        "statuses": statuses,
+    }
+
+
+async def request(client: httpx.AsyncClient, tokens: List[str], names: List[str], index: int) -> httpx.Response:
+    method, path, body = ENDPOINTS[names[index % len(names)]]
+    user = index % len(tokens)
+    headers = {"Authorization": f"Bearer {tokens[user]}"}
+    return await client.request(method, path.replace("{i}", str(user)), json=body(user) if body else None, headers=headers)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Throughput scaling with the number of gunicorn workers")
+    fake_supabase.add_arguments(parser)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds of load per worker count")
+    parser.add_argument("--concurrency", type=int, default=32, help="closed-loop clients")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--bench-users", type=int, default=20)
+    parser.add_argument("--endpoints", default=DEFAULT_ENDPOINTS, help="comma-separated endpoint names from benchmarks.run")
+    parser.add_argument("--restart", action="store_true", help="SIGHUP the server halfway through each run")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for the server to become ready")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+
+    results: Dict[int, Dict[str, Any]] = {}
+    with FakeSupabase(fake_supabase.seed_arguments(args)) as fake:
+        env = {**os.environ, **api_env(fake)}
+        for workers in (int(value) for value in args.workers.split(",")):
+            server = Server(env, workers).start(args.timeout)
+            try:
+                results[workers] = asyncio.run(drive(server, names, args))
+            finally:
+                server.stop()
+            print(f"  {workers} workers: {results[workers]['throughput_rps']:.1f} req/s", file=sys.stderr)
+
+    print(f"\ncpus={len(os.sched_getaffinity(0))} delay={args.delay}s concurrency={args.concurrency} "
+          f"duration={args.duration}s restart={args.restart}")
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'speed-up':>9} {'efficiency':>10} {'retried':>7} {'errors':>7}")
+    base_workers, base = next(iter(results.items()))
+    for workers, result in results.items():
+        speedup = result["throughput_rps"] / base["throughput_rps"] if base["throughput_rps"] else 0.0
+        efficiency = speedup / (workers / base_workers)
+        print(
+            f"{workers:7d} {result['throughput_rps']:8.1f} {result['p50_ms']:8.1f} {result['p95_ms']:8.1f} "
+            f"{result['p99_ms']:8.1f} {speedup:8.2f}x {efficiency:10.0%} {result['retried']:7d} {result['errors']:7d}"
+        )
+        if result["errors"]:
+            print(f"{'':7} statuses: {result['statuses']}")
+    return 1 if args.restart and any(result["errors"] for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
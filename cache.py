@@ -0,0 +1,110 @@
+# cache.py
+import mmap
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_MISSING = object()
+
+CACHE_INVALIDATION_SLOTS = int(os.getenv("CACHE_INVALIDATION_SLOTS", "65536"))
+
+
+class SharedVersions:
+    """
+    Per-key version counters in anonymous shared memory.
+
+    The mapping is created at import, so under gunicorn with `preload_app`
+    every forked worker inherits the same counters: bumping a key in one
+    worker changes the version that copies cached by the others were
+    stamped with. Keys hash into a fixed number of slots; a collision (or
+    two workers bumping the same slot at once) only costs an extra miss.
+    """
+
+    def __init__(self, slots: int = CACHE_INVALIDATION_SLOTS):
+        self.slots = slots
+        self._memory = mmap.mmap(-1, slots * 8)  # MAP_SHARED: survives fork
+        self._counters = memoryview(self._memory).cast("Q")
+
+    def slot(self, namespace: str, key: Hashable) -> int:
+        return zlib.crc32(f"{namespace}:{key!r}".encode("utf-8")) % self.slots
+
+    def version(self, slot: int) -> int:
+        return self._counters[slot]
+
+    def bump(self, slot: int) -> int:
+        self._counters[slot] = (self._counters[slot] + 1) % (1 << 64)
+        return self._counters[slot]
+
+
+versions = SharedVersions()
+
+
+class TTLCache:
+    """
+    Small in-process LRU cache with per-entry expiry.
+
+    Memory is bounded by `maxsize` entries; the least recently used entry is
+    evicted first. Safe to share between the event loop and threadpool workers.
+
+    With a `name`, invalidations reach every worker process: `pop` and
+    `replace` bump the key's shared version (see SharedVersions), and other
+    workers treat their older copies as misses. `set` is for filling the
+    cache after a read and does not disturb the other workers' copies.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, name: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _slot(self, key: Hashable) -> Optional[int]:
+        return versions.slot(self.name, key) if self.name else None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, version, value = entry
+            slot = self._slot(key)
+            if expires_at < time.monotonic() or (slot is not None and versions.version(slot) != version):
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        slot = self._slot(key)
+        self._store(key, value, ttl, versions.version(slot) if slot is not None else 0)
+
+    def replace(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Cache a value just written, dropping the copies other workers hold"""
+        slot = self._slot(key)
+        self._store(key, value, ttl, versions.bump(slot) if slot is not None else 0)
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float], version: int) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        slot = self._slot(key)
+        if slot is not None:
+            versions.bump(slot)
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
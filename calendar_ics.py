@@ -0,0 +1,185 @@
+# calendar_ics.py
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from calendar_utils import parse_datetime
+
+PRODID = "-//StudyVault//StudyVault API//ES"
+
+_WEEKDAY_CODES = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+
+def escape_text(value: Optional[str]) -> str:
+    """Escape a TEXT value (RFC 5545 section 3.3.11)"""
+    if not value:
+        return ""
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def unescape_text(value: str) -> str:
+    """Reverse escape_text"""
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == "\\":
+            nxt = next(chars, "")
+            result.append("\n" if nxt in ("n", "N") else nxt)
+        else:
+            result.append(char)
+    return "".join(result)
+
+
+def unfold_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Join folded content lines from any line iterator (file objects included)"""
+    pending: Optional[str] = None
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending
+        pending = line
+    if pending:
+        yield pending
+
+
+def parse_content_line(line: str):
+    """Split `NAME;PARAM=VALUE:value` into (name, params, value)"""
+    head, _, value = line.partition(":")
+    name, *raw_params = head.split(";")
+    params = {}
+    for raw in raw_params:
+        key, _, param_value = raw.partition("=")
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+
+def fold_line(line: str) -> str:
+    """Fold a content line at 75 octets and terminate it with CRLF"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte UTF-8 sequence
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def format_utc(value: Any) -> str:
+    return parse_datetime(value).strftime("%Y%m%dT%H%M%SZ")
+
+
+def pattern_to_rrule(pattern: Dict[str, Any]) -> Optional[str]:
+    """Convert a `recurrence_pattern` into an RRULE value (see calendar_utils.build_rrule)"""
+    if not pattern:
+        return None
+    if pattern.get("rrule"):
+        rule = str(pattern["rrule"]).strip()
+        return rule[len("RRULE:"):] if rule.upper().startswith("RRULE:") else rule
+
+    freq = str(pattern.get("frequency") or pattern.get("freq") or "").upper()
+    if freq not in ("DAILY", "WEEKLY", "MONTHLY", "YEARLY"):
+        return None
+
+    parts = [f"FREQ={freq}"]
+    if pattern.get("interval") and int(pattern["interval"]) > 1:
+        parts.append(f"INTERVAL={int(pattern['interval'])}")
+    days = pattern.get("days_of_week") or pattern.get("byweekday")
+    if days:
+        codes = [
+            _WEEKDAY_CODES[day % 7] if isinstance(day, int) else str(day).strip().upper()[:2]
+            for day in days
+        ]
+        parts.append("BYDAY=" + ",".join(codes))
+    if pattern.get("until"):
+        parts.append(f"UNTIL={format_utc(pattern['until'])}")
+    elif pattern.get("count"):
+        parts.append(f"COUNT={int(pattern['count'])}")
+    return ";".join(parts)
+
+
+def calendar_header(name: str = "StudyVault") -> str:
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(name)}",
+    ]
+    return "".join(fold_line(line) for line in lines)
+
+
+def calendar_footer() -> str:
+    return fold_line("END:VCALENDAR")
+
+
+def render_event(event: Dict[str, Any], grades: Iterable[Dict[str, Any]] = ()) -> str:
+    """Render one calendar_events row (plus its linked grades) as a VEVENT"""
+    description = event.get("description") or ""
+    for grade in grades:
+        label = grade.get("grade_title") or "Calificación"
+        description += f"\n{label}: {grade.get('score')}/{grade.get('max_score')}"
+
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{event['id']}@studyvault",
+        f"DTSTAMP:{format_utc(event.get('updated_at') or event['start_datetime'])}",
+        f"DTSTART:{format_utc(event['start_datetime'])}",
+        f"DTEND:{format_utc(event['end_datetime'])}",
+        f"SUMMARY:{escape_text(event.get('title'))}",
+    ]
+    if description.strip():
+        lines.append(f"DESCRIPTION:{escape_text(description.strip())}")
+    if event.get("location"):
+        lines.append(f"LOCATION:{escape_text(event['location'])}")
+    if event.get("event_type"):
+        lines.append(f"CATEGORIES:{escape_text(event['event_type'])}")
+    if event.get("is_recurring"):
+        rule = pattern_to_rrule(event.get("recurrence_pattern") or {})
+        if rule:
+            lines.append(f"RRULE:{rule}")
+    if event.get("reminder_minutes"):
+        lines += [
+            "BEGIN:VALARM",
+            "ACTION:DISPLAY",
+            f"DESCRIPTION:{escape_text(event.get('title'))}",
+            f"TRIGGER:-PT{int(event['reminder_minutes'])}M",
+            "END:VALARM",
+        ]
+    lines.append("END:VEVENT")
+    return "".join(fold_line(line) for line in lines)
+
+
+def render_rows(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Render rows of `vw_calendar_with_grades` (one row per event/grade pair).
+
+    Rows must be ordered by event id so that an event's grades are contiguous.
+    """
+    current: Optional[Dict[str, Any]] = None
+    grades: List[Dict[str, Any]] = []
+    for row in rows:
+        if current is None or row["id"] != current["id"]:
+            if current is not None:
+                yield render_event(current, grades)
+            current = row
+            grades = []
+        if row.get("grade_id"):
+            grades.append(row)
+    if current is not None:
+        yield render_event(current, grades)
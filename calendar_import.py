@@ -0,0 +1,357 @@
+# calendar_import.py
+import csv
+import io
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+
+from calendar_ics import parse_content_line, unescape_text, unfold_lines
+from calendar_utils import parse_datetime
+from models import CalendarEventCreate
+
+IMPORT_BATCH_SIZE = int(os.getenv("CALENDAR_IMPORT_BATCH_SIZE", "200"))
+IMPORT_MAX_ROWS = int(os.getenv("CALENDAR_IMPORT_MAX_ROWS", "5000"))
+IMPORT_MAX_BYTES = int(os.getenv("CALENDAR_IMPORT_MAX_BYTES", str(5 * 1024 * 1024)))
+IMPORT_PATH = "/calendar/import"
+# Multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+_DURATION_RE = re.compile(
+    r"^(?P<sign>[+-])?P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?"
+    r"(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$"
+)
+
+# One parsed entry: (row number, uid, raw fields or parse error)
+Entry = Tuple[int, Optional[str], Dict[str, Any]]
+
+
+def parse_ics_duration(value: str) -> Optional[timedelta]:
+    match = _DURATION_RE.match(value.strip().upper())
+    if not match:
+        return None
+    parts = {k: int(v) for k, v in match.groupdict().items() if v and k != "sign"}
+    delta = timedelta(
+        weeks=parts.get("weeks", 0),
+        days=parts.get("days", 0),
+        hours=parts.get("hours", 0),
+        minutes=parts.get("minutes", 0),
+        seconds=parts.get("seconds", 0),
+    )
+    return -delta if match.group("sign") == "-" else delta
+
+
+def parse_ics_datetime(value: str, params: Dict[str, str]) -> datetime:
+    """Parse DATE / DATE-TIME values (UTC, floating or with TZID)"""
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        day = datetime.strptime(value, "%Y%m%d")
+        return day.replace(tzinfo=timezone.utc)
+    if value.endswith("Z"):
+        return datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+
+    parsed = datetime.strptime(value, "%Y%m%dT%H%M%S")
+    try:
+        tz = ZoneInfo(params["TZID"]) if params.get("TZID") else timezone.utc
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = timezone.utc
+    return parsed.replace(tzinfo=tz).astimezone(timezone.utc)
+
+
+def iter_ics_entries(lines: Iterable[str]) -> Iterator[Entry]:
+    """
+    Stream VEVENTs out of an ICS document one at a time.
+
+    Only the current event is held in memory; VTIMEZONE and other components
+    are skipped. Row numbers count VEVENTs starting at 1.
+    """
+    row = 0
+    event: Optional[Dict[str, Any]] = None
+    nested = 0
+    for line in unfold_lines(lines):
+        if not line:
+            continue
+        name, params, value = parse_content_line(line)
+
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            row += 1
+            event, nested = {}, 0
+            continue
+        if event is None:
+            continue
+        if name == "BEGIN":
+            nested += 1
+            continue
+        if name == "END" and value.upper() == "VEVENT":
+            yield row, event.get("uid"), event
+            event = None
+            continue
+        if name == "END":
+            nested -= 1
+            continue
+
+        try:
+            if nested:
+                # Only the first alarm is mapped to reminder_minutes
+                if name == "TRIGGER" and "reminder_minutes" not in event:
+                    delta = parse_ics_duration(value)
+                    if delta is not None and delta <= timedelta(0):
+                        event["reminder_minutes"] = int(-delta.total_seconds() // 60)
+            elif name == "UID":
+                event["uid"] = value.strip()
+            elif name == "SUMMARY":
+                event["title"] = unescape_text(value)
+            elif name == "DESCRIPTION":
+                event["description"] = unescape_text(value)
+            elif name == "LOCATION":
+                event["location"] = unescape_text(value)
+            elif name == "CATEGORIES":
+                event["event_type"] = unescape_text(value.split(",")[0]).strip().lower()
+            elif name == "DTSTART":
+                event["start_datetime"] = parse_ics_datetime(value, params)
+                event["_all_day"] = len(value.strip()) == 8
+            elif name == "DTEND":
+                event["end_datetime"] = parse_ics_datetime(value, params)
+            elif name == "DURATION":
+                event["_duration"] = parse_ics_duration(value)
+            elif name == "RRULE":
+                event["is_recurring"] = True
+                event["recurrence_pattern"] = {"rrule": value.strip()}
+        except ValueError as exc:
+            event.setdefault("_errors", []).append(f"{name}: {exc}")
+
+
+def iter_csv_entries(lines: Iterable[str]) -> Iterator[Entry]:
+    """
+    Stream rows of a CSV whose header uses CalendarEventCreate field names.
+
+    An optional `uid` column is used for de-duplication. Row numbers count
+    data rows starting at 1.
+    """
+    reader = csv.DictReader(lines)
+    for row, record in enumerate(reader, start=1):
+        fields = {
+            (key or "").strip().lower(): value.strip()
+            for key, value in record.items()
+            if isinstance(value, str) and value.strip()
+        }
+        yield row, fields.pop("uid", None), fields
+
+
+def to_event_create(fields: Dict[str, Any], class_id: Optional[str] = None) -> CalendarEventCreate:
+    """Validate raw parsed fields as a CalendarEventCreate"""
+    if fields.get("_errors"):
+        raise ValueError("; ".join(fields["_errors"]))
+
+    data = {key: value for key, value in fields.items() if not key.startswith("_")}
+    data.pop("uid", None)
+    if "start_datetime" in data and "end_datetime" not in data:
+        start = parse_datetime(data["start_datetime"])
+        duration = fields.get("_duration") or (timedelta(days=1) if fields.get("_all_day") else timedelta(0))
+        data["end_datetime"] = start + duration
+    if class_id and not data.get("class_id"):
+        data["class_id"] = class_id
+    return CalendarEventCreate(**data)
+
+
+def _dedupe_key(title: str, start: Any) -> Tuple[str, datetime]:
+    return title.strip().lower(), parse_datetime(start)
+
+
+def _existing_keys(supabase, user_id: str, uids: List[str], starts: List[str]):
+    """Fetch UIDs and (title, start) pairs already stored for this chunk, in at most two queries"""
+    existing_uids = set()
+    existing_keys = set()
+    if uids:
+        response = (
+            supabase.table("calendar_events")
+            .select("external_calendar_sync")
+            .eq("user_id", user_id)
+            .in_("external_calendar_sync->>uid", uids)
+            .execute()
+        )
+        existing_uids = {(r.get("external_calendar_sync") or {}).get("uid") for r in response.data or []}
+    if starts:
+        response = (
+            supabase.table("calendar_events")
+            .select("title,start_datetime")
+            .eq("user_id", user_id)
+            .in_("start_datetime", starts)
+            .execute()
+        )
+        existing_keys = {_dedupe_key(r["title"], r["start_datetime"]) for r in response.data or []}
+    return existing_uids, existing_keys
+
+
+def _insert_chunk(supabase, chunk: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> None:
+    """Insert a chunk in one statement; on failure retry row by row to isolate bad rows"""
+    payload = [insert_data for _, insert_data in chunk]
+    try:
+        response = supabase.table("calendar_events").insert(payload).execute()
+        for (report, _), created in zip(chunk, response.data or []):
+            report.update(status="created", event_id=created["id"])
+        return
+    except Exception:
+        pass
+
+    for report, insert_data in chunk:
+        try:
+            response = supabase.table("calendar_events").insert(insert_data).execute()
+            report.update(status="created", event_id=response.data[0]["id"])
+        except Exception as exc:
+            report.update(status="failed", error=str(exc))
+
+
+def import_events(
+    supabase,
+    user_id: str,
+    entries: Iterable[Entry],
+    source: str,
+    class_id: Optional[str] = None,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    max_rows: int = IMPORT_MAX_ROWS
+) -> Dict[str, Any]:
+    """
+    Validate, de-duplicate and insert parsed entries in batches.
+
+    Duplicates are detected by UID (stored in `external_calendar_sync.uid`)
+    or by title + start time, both within the file and against stored events.
+    Each chunk costs at most two lookups and one multi-row insert.
+    """
+    rows: List[Dict[str, Any]] = []
+    seen_uids = set()
+    seen_keys = set()
+    pending: List[Tuple[Dict[str, Any], Dict[str, Any], Optional[str], Tuple[str, datetime]]] = []
+
+    def flush():
+        if not pending:
+            return
+        uids = [uid for _, _, uid, _ in pending if uid]
+        starts = sorted({insert_data["start_datetime"] for _, insert_data, _, _ in pending})
+        existing_uids, existing_keys = _existing_keys(supabase, user_id, uids, starts)
+
+        to_insert = []
+        for report, insert_data, uid, key in pending:
+            if (uid and uid in existing_uids) or key in existing_keys:
+                report["status"] = "duplicate"
+            else:
+                to_insert.append((report, insert_data))
+        if to_insert:
+            _insert_chunk(supabase, to_insert)
+        pending.clear()
+
+    for row, uid, fields in entries:
+        if len(rows) >= max_rows:
+            rows.append({"row": row, "status": "skipped", "uid": uid, "error": f"Import limited to {max_rows} rows"})
+            break
+
+        report: Dict[str, Any] = {"row": row, "status": "pending", "uid": uid}
+        rows.append(report)
+        try:
+            event = to_event_create(fields, class_id)
+        except (ValidationError, ValueError, TypeError) as exc:
+            report.update(status="invalid", error=str(exc))
+            continue
+
+        key = _dedupe_key(event.title, event.start_datetime)
+        if (uid and uid in seen_uids) or key in seen_keys:
+            report["status"] = "duplicate"
+            continue
+        if uid:
+            seen_uids.add(uid)
+        seen_keys.add(key)
+
+        insert_data = event.model_dump(mode="json")
+        insert_data["user_id"] = user_id
+        insert_data["external_calendar_sync"] = {"source": source, "uid": uid} if uid else {"source": source}
+        pending.append((report, insert_data, uid, key))
+        if len(pending) >= batch_size:
+            flush()
+    flush()
+
+    summary = {status: 0 for status in ("created", "duplicate", "invalid", "failed", "skipped")}
+    for report in rows:
+        summary[report["status"]] = summary.get(report["status"], 0) + 1
+    return {**summary, "rows": rows}
+
+
+class ImportTooLarge(ValueError):
+    """The uploaded file is larger than IMPORT_MAX_BYTES"""
+
+
+class _LimitedReader(io.RawIOBase):
+    """Binary file wrapper that fails once more than `limit` bytes are read"""
+
+    def __init__(self, binary_file, limit: int):
+        self.binary_file = binary_file
+        self.limit = limit
+        self.consumed = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.binary_file.read(len(buffer))
+        self.consumed += len(data)
+        if self.consumed > self.limit:
+            raise ImportTooLarge(f"File exceeds {self.limit} bytes")
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def open_text_stream(binary_file, limit: int = IMPORT_MAX_BYTES) -> io.TextIOWrapper:
+    """Decode an uploaded file lazily (handles a UTF-8 BOM and any newline style), at most `limit` bytes"""
+    reader = io.BufferedReader(_LimitedReader(binary_file, limit))
+    return io.TextIOWrapper(reader, encoding="utf-8-sig", errors="replace", newline="")
+
+
+class ImportSizeLimitMiddleware:
+    """
+    Rejects oversized uploads to /calendar/import before the multipart body
+    is spooled: by Content-Length when the client sends it, otherwise as
+    soon as the received bytes pass the limit.
+    """
+
+    def __init__(self, app, max_bytes: int = IMPORT_MAX_BYTES + MULTIPART_OVERHEAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"].rstrip("/") != IMPORT_PATH:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"File exceeds {IMPORT_MAX_BYTES} bytes"
+        headers = dict(scope["headers"])
+        try:
+            declared = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            declared = 0
+        if declared > self.max_bytes:
+            body = json.dumps({"detail": detail}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while the form is parsed, so the app answers 413
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,353 @@
+# calendar_utils.py
+import heapq
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from zoneinfo import ZoneInfo
+
+from dateutil import rrule
+
+# Hard caps that keep free/busy and slot searches bounded for large calendars;
+# MAX_OCCURRENCES bounds one event's expansion and all busy intervals of a window
+MAX_WINDOW_DAYS = 62
+MAX_OCCURRENCES = 2000
+MAX_CONFLICT_EVENTS = 5000
+
+Interval = Tuple[datetime, datetime]
+
+_FREQUENCIES = {
+    "daily": rrule.DAILY,
+    "weekly": rrule.WEEKLY,
+    "monthly": rrule.MONTHLY,
+    "yearly": rrule.YEARLY,
+}
+_WEEKDAYS = {
+    "mo": rrule.MO, "tu": rrule.TU, "we": rrule.WE, "th": rrule.TH,
+    "fr": rrule.FR, "sa": rrule.SA, "su": rrule.SU,
+}
+# UNTIL without the UTC "Z" (floating date or date-time)
+_NAIVE_UNTIL = re.compile(r"UNTIL=(\d{8})(T\d{6})?(?![\dTZ])", re.IGNORECASE)
+# Sub-daily series (HOURLY, MINUTELY, SECONDLY) are not supported
+_SUB_DAILY = re.compile(r"FREQ=(HOURLY|MINUTELY|SECONDLY)", re.IGNORECASE)
+
+
+def parse_datetime(value: Union[str, datetime]) -> datetime:
+    """Parse a Supabase timestamp (or datetime) into an aware UTC datetime"""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def day_window(
+    start_date: Optional[date],
+    end_date: Optional[date]
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Turn an inclusive date range into a half-open [start, end) UTC window"""
+    start = datetime.combine(start_date, time.min, tzinfo=timezone.utc) if start_date else None
+    end = datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=timezone.utc) if end_date else None
+    return start, end
+
+
+def range_literal(start: datetime, end: datetime) -> str:
+    """Build a half-open tstzrange literal usable with PostgREST range filters"""
+    return f"[{start.isoformat()},{end.isoformat()})"
+
+
+def apply_overlap_filter(query, start: Optional[datetime], end: Optional[datetime]):
+    """
+    Restrict a calendar_events query to events that overlap [start, end).
+
+    With both bounds the filter uses the indexed `time_range` column
+    (see migrations/calendar_ranges.sql); with a single bound it falls back to
+    the matching column comparison.
+    """
+    if start and end:
+        return query.ov("time_range", range_literal(start, end))
+    if start:
+        return query.gt("end_datetime", start.isoformat())
+    if end:
+        return query.lt("start_datetime", end.isoformat())
+    return query
+
+
+def find_conflicts(
+    events: List[Dict[str, Any]],
+    across_classes: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Find every pair of overlapping events with a sort + sweep line.
+
+    Events are processed by start time. A min-heap of end times expires the
+    ones that stopped running, and the running ones are grouped by class.
+    When `across_classes` is set, the event's own class group is skipped
+    as a whole, so the cost is O(n log n + k) for k reported conflicts.
+    """
+    spans = []
+    for index, event in enumerate(events):
+        start = parse_datetime(event["start_datetime"])
+        end = parse_datetime(event["end_datetime"])
+        spans.append((start, max(start, end), index))
+    spans.sort()
+
+    conflicts = []
+    expiry: List[Tuple[datetime, int]] = []
+    # class_id (None for events without a class) -> {event index: end}
+    active: Dict[Any, Dict[int, datetime]] = {}
+    for start, end, index in spans:
+        while expiry and expiry[0][0] <= start:
+            _, expired = heapq.heappop(expiry)
+            group_key = events[expired].get("class_id")
+            del active[group_key][expired]
+            if not active[group_key]:
+                del active[group_key]
+
+        event = events[index]
+        key = event.get("class_id")
+        for group_key, group in active.items():
+            if across_classes and key is not None and group_key == key:
+                continue
+            for other_index, other_end in group.items():
+                conflicts.append({
+                    "first": events[other_index],
+                    "second": event,
+                    "overlap_start": start,
+                    "overlap_end": min(end, other_end),
+                })
+
+        if end > start:
+            heapq.heappush(expiry, (end, index))
+            active.setdefault(key, {})[index] = end
+
+    return conflicts
+
+
+def _weekday(value: Union[int, str]):
+    """Map 0-6 (Monday=0) or a day name/abbreviation to a dateutil weekday"""
+    if isinstance(value, int):
+        return rrule.weekdays[value % 7]
+    return _WEEKDAYS[str(value).strip().lower()[:2]]
+
+
+def build_rrule(event_start: datetime, pattern: Dict[str, Any]) -> Optional[rrule.rrule]:
+    """
+    Build a dateutil rule from `calendar_events.recurrence_pattern`.
+
+    Accepts either an iCalendar string under `rrule` or a dict with
+    `frequency` (daily/weekly/monthly/yearly), `interval`, `days_of_week`,
+    `until` and `count`. Returns None for patterns we don't understand and
+    for frequencies below daily.
+    """
+    if not pattern:
+        return None
+    if pattern.get("rrule"):
+        if _SUB_DAILY.search(pattern["rrule"]):
+            return None
+        # dateutil rejects a floating UNTIL with an aware dtstart; read it as UTC
+        # like every other naive timestamp (parse_datetime)
+        text = _NAIVE_UNTIL.sub(lambda m: f"UNTIL={m.group(1)}{m.group(2) or 'T235959'}Z", pattern["rrule"])
+        rule = rrule.rrulestr(text, dtstart=event_start)
+        return rule if isinstance(rule, rrule.rrule) else None
+
+    freq = _FREQUENCIES.get(str(pattern.get("frequency") or pattern.get("freq") or "").lower())
+    if freq is None:
+        return None
+
+    kwargs: Dict[str, Any] = {"dtstart": event_start, "interval": max(1, int(pattern.get("interval") or 1))}
+    days = pattern.get("days_of_week") or pattern.get("byweekday")
+    if days:
+        kwargs["byweekday"] = [_weekday(day) for day in days]
+    if pattern.get("until"):
+        kwargs["until"] = parse_datetime(pattern["until"])
+    elif pattern.get("count"):
+        kwargs["count"] = int(pattern["count"])
+    return rrule.rrule(freq, **kwargs)
+
+
+def _rebase(rule: rrule.rrule, after: datetime) -> rrule.rrule:
+    """
+    Move the start of an open-ended (UNTIL or infinite) rule to the last whole
+    period before `after`, so iterating it costs the window and not the age of
+    the series. COUNT rules keep their start (the count runs from it) but are
+    capped at MAX_OCCURRENCES.
+    """
+    # dateutil keeps the rule parameters in private attributes only
+    if rule._count is not None:
+        return rule.replace(count=MAX_OCCURRENCES) if rule._count > MAX_OCCURRENCES else rule
+    start, interval = rule._dtstart, rule._interval
+    if start >= after:
+        return rule
+
+    if rule._freq in (rrule.DAILY, rrule.WEEKLY):
+        step = timedelta(days=interval * (7 if rule._freq == rrule.WEEKLY else 1))
+        periods = (after - start) // step - 1
+        if periods <= 0:
+            return rule
+        return rule.replace(dtstart=start + periods * step)
+
+    months = interval * (12 if rule._freq == rrule.YEARLY else 1)
+    periods = ((after.year - start.year) * 12 + after.month - start.month) // months - 1
+    if periods <= 0:
+        return rule
+    month = start.month - 1 + periods * months
+    # Defaults derived from dtstart (day of month, month) must not follow the new start
+    derived = {
+        name: getattr(rule, f"_{name}")
+        for name in ("bymonth", "bymonthday", "byweekday")
+        if name in rule._original_rule and rule._original_rule[name] is None
+    }
+    return rule.replace(dtstart=start.replace(year=start.year + month // 12, month=month % 12 + 1, day=1), **derived)
+
+
+def expand_occurrences(
+    event: Dict[str, Any],
+    window_start: datetime,
+    window_end: datetime,
+    limit: int = MAX_OCCURRENCES
+) -> List[Interval]:
+    """Return the (start, end) occurrences of an event that overlap the window"""
+    start = parse_datetime(event["start_datetime"])
+    duration = max(parse_datetime(event["end_datetime"]) - start, timedelta(0))
+
+    rule = None
+    if event.get("is_recurring"):
+        rule = build_rrule(start, event.get("recurrence_pattern") or {})
+    if rule is None:
+        if start < window_end and start + duration > window_start:
+            return [(start, start + duration)]
+        return []
+
+    occurrences = []
+    rule = _rebase(rule, window_start - duration)
+    for occurrence in rule.xafter(window_start - duration, inc=True):
+        if occurrence >= window_end or len(occurrences) >= limit:
+            break
+        if occurrence + duration > window_start:
+            occurrences.append((occurrence, occurrence + duration))
+    return occurrences
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Merge overlapping or touching intervals (sort + single sweep)"""
+    merged: List[Interval] = []
+    for start, end in sorted(i for i in intervals if i[1] > i[0]):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_intervals(busy: List[Interval], window_start: datetime, window_end: datetime) -> List[Interval]:
+    """Complement of merged busy intervals inside the window"""
+    free = []
+    cursor = window_start
+    for start, end in busy:
+        if start > cursor:
+            free.append((cursor, min(start, window_end)))
+        cursor = max(cursor, end)
+        if cursor >= window_end:
+            break
+    if cursor < window_end:
+        free.append((cursor, window_end))
+    return [i for i in free if i[1] > i[0]]
+
+
+def clip_to_daily_hours(
+    intervals: List[Interval],
+    day_start_hour: int,
+    day_end_hour: int,
+    tz_name: str = "UTC"
+) -> List[Interval]:
+    """Keep only the parts of each interval between the given local hours"""
+    tz = ZoneInfo(tz_name)
+    clipped = []
+    for start, end in intervals:
+        day = start.astimezone(tz).date()
+        while True:
+            day_open = datetime.combine(day, time(day_start_hour), tzinfo=tz).astimezone(timezone.utc)
+            day_close = datetime.combine(day, time.min, tzinfo=tz) + timedelta(hours=day_end_hour)
+            day_close = day_close.astimezone(timezone.utc)
+            if day_open >= end:
+                break
+            lo, hi = max(start, day_open), min(end, day_close)
+            if hi > lo:
+                clipped.append((lo, hi))
+            day += timedelta(days=1)
+    return clipped
+
+
+def suggest_study_slots(
+    tasks: List[Dict[str, Any]],
+    free: List[Interval],
+    min_slot_minutes: int = 30,
+    max_session_minutes: int = 120,
+    default_duration_minutes: int = 60
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Greedily place pending tasks into free time, earliest deadline first.
+
+    Tasks are ordered by due date and then priority (1 = high). Their remaining
+    effort (`estimated_duration` scaled by `completion_percentage`) is split into
+    sessions of at most `max_session_minutes`, never past the due date.
+    Free time is consumed with a single forward cursor, so the cost is
+    O(t log t + f) for t tasks and f free intervals.
+    """
+    far_future = datetime.max.replace(tzinfo=timezone.utc)
+    ordered = sorted(
+        tasks,
+        key=lambda t: (
+            parse_datetime(t["due_date"]) if t.get("due_date") else far_future,
+            t.get("priority") or 2,
+        )
+    )
+
+    min_slot = timedelta(minutes=min_slot_minutes)
+    max_session = timedelta(minutes=max_session_minutes)
+    slots: List[Dict[str, Any]] = []
+    unscheduled: List[Dict[str, Any]] = []
+    remaining_free = list(free)
+    cursor = 0
+
+    for task in ordered:
+        minutes = task.get("estimated_duration") or default_duration_minutes
+        minutes = minutes * (100 - (task.get("completion_percentage") or 0)) / 100
+        remaining = timedelta(minutes=round(minutes))
+        due = parse_datetime(task["due_date"]) if task.get("due_date") else far_future
+
+        while remaining > timedelta(0) and cursor < len(remaining_free):
+            start, end = remaining_free[cursor]
+            end = min(end, due)
+            if start >= due:
+                break
+            if end - start < min(min_slot, remaining):
+                if remaining_free[cursor][1] > due:
+                    # The rest of this interval is still usable by later tasks
+                    break
+                cursor += 1
+                continue
+            session = min(remaining, max_session, end - start)
+            slots.append({
+                "task_id": task["id"],
+                "title": task.get("title"),
+                "due_date": task.get("due_date"),
+                "priority": task.get("priority"),
+                "start": start,
+                "end": start + session,
+            })
+            remaining -= session
+            remaining_free[cursor] = (start + session, remaining_free[cursor][1])
+
+        if remaining > timedelta(0):
+            unscheduled.append({
+                "task_id": task["id"],
+                "title": task.get("title"),
+                "due_date": task.get("due_date"),
+                "remaining_minutes": int(remaining.total_seconds() // 60),
+            })
+
+    return {"slots": slots, "unscheduled": unscheduled}
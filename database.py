@@ -1,52 +1,90 @@
 # database.py
+import logging
 import os
-from supabase import create_client, Client
+import threading
 from fastapi import HTTPException
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from dotenv import load_dotenv
+from metrics import instrument_supabase
+from tracing import span, trace_supabase
+
+if TYPE_CHECKING:
+    from supabase import Client
 # Cargar variables de entorno al inicio del módulo
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Supabase configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 
-# Global Supabase clients
-supabase_service: Optional[Client] = None
-supabase_anon: Optional[Client] = None
+# Global Supabase clients, built on first use (see warm_up_clients)
+supabase_service: Optional["Client"] = None
+supabase_anon: Optional["Client"] = None
+_clients_lock = threading.Lock()
+
+def _create_client(key: str) -> "Client":
+    # supabase pulls in gotrue, postgrest, realtime and storage3 (~0.3s of imports),
+    # so the import waits until a client is actually needed
+    from supabase import create_client
+    return create_client(SUPABASE_URL, key)
 
 async def init_db():
-    """Initialize Supabase clients"""
-    global supabase_service, supabase_anon
-    
+    """Check the Supabase configuration; clients are created lazily"""
     if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
         raise ValueError("Missing Supabase configuration")
-    
-    # Service role client for admin operations
-    supabase_service = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    
-    # Anonymous client for user operations
-    supabase_anon = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 
-def get_supabase_service() -> Client:
+def warm_up_clients() -> None:
+    """Import supabase and build the shared clients ahead of the first request (blocking)"""
+    get_supabase_service()
+    if SUPABASE_ANON_KEY:
+        get_supabase_anon()
+
+def close_clients() -> None:
+    """Close the HTTP sessions of the shared clients (blocking); per-request clients are not pooled"""
+    global supabase_service, supabase_anon
+    with _clients_lock:
+        clients, supabase_service, supabase_anon = [supabase_service, supabase_anon], None, None
+    for client in filter(None, clients):
+        if client._postgrest is not None:
+            client._postgrest.aclose()  # sync despite the name
+        client.auth._http_client.close()
+
+def _instrument(client: "Client") -> "Client":
+    """Attach metrics and tracing hooks to the client's PostgREST session"""
+    return trace_supabase(instrument_supabase(client))
+
+def get_supabase_service() -> "Client":
     """Get Supabase service role client"""
-    if not supabase_service:
-        raise HTTPException(status_code=500, detail="Database not initialized")
+    global supabase_service
+    if supabase_service is None:
+        if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        with _clients_lock:
+            if supabase_service is None:
+                supabase_service = _instrument(_create_client(SUPABASE_SERVICE_KEY))
     return supabase_service
 
-def get_supabase_anon() -> Client:
+def get_supabase_anon() -> "Client":
     """Get Supabase anonymous client"""
-    if not supabase_anon:
-        raise HTTPException(status_code=500, detail="Database not initialized")
+    global supabase_anon
+    if supabase_anon is None:
+        if not SUPABASE_URL or not SUPABASE_ANON_KEY:
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        with _clients_lock:
+            if supabase_anon is None:
+                supabase_anon = _instrument(_create_client(SUPABASE_ANON_KEY))
     return supabase_anon
 
-def get_user_supabase(access_token: str) -> Client:
+def get_user_supabase(access_token: str) -> "Client":
     """Get Supabase client with user token"""
     if not SUPABASE_URL or not SUPABASE_ANON_KEY:
         raise HTTPException(status_code=500, detail="Database not configured")
     
-    client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    with span("supabase.client", "client"):
+        client = _create_client(SUPABASE_ANON_KEY)
     
     # Set the session properly with access and refresh tokens
     try:
@@ -65,6 +103,6 @@ def get_user_supabase(access_token: str) -> Client:
         })
         
     except Exception as e:
-        print(f"❌ Error setting session: {e}")
+        logger.error("Error setting session: %s", e)
         
-    return client
+    return _instrument(client)
@@ -18,6 +18,7 @@ CREATE TABLE public.calendar_events (
   external_calendar_sync jsonb DEFAULT '{}'::jsonb,
   created_at timestamp with time zone DEFAULT now(),
   updated_at timestamp with time zone DEFAULT now(),
+  time_range tstzrange GENERATED ALWAYS AS (CASE WHEN end_datetime > start_datetime THEN tstzrange(start_datetime, end_datetime, '[)') ELSE tstzrange(start_datetime, start_datetime, '[]') END) STORED,
   CONSTRAINT calendar_events_pkey PRIMARY KEY (id),
   CONSTRAINT calendar_events_class_id_fkey FOREIGN KEY (class_id) REFERENCES public.classes(id),
   CONSTRAINT calendar_events_user_id_fkey FOREIGN KEY (user_id) REFERENCES auth.users(id)
@@ -0,0 +1,232 @@
+# device_registry.py
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from cache import TTLCache
+from database import get_supabase_service
+
+logger = logging.getLogger(__name__)
+
+DEVICE_CACHE_TTL = float(os.getenv("DEVICE_CACHE_TTL", "60"))
+DEVICE_CACHE_SIZE = int(os.getenv("DEVICE_CACHE_SIZE", "10000"))
+DEVICE_TOUCH_FLUSH_SECONDS = float(os.getenv("DEVICE_TOUCH_FLUSH_SECONDS", "30"))
+DEVICE_IDLE_DAYS = int(os.getenv("DEVICE_IDLE_DAYS", "90"))
+DEVICE_SWEEP_INTERVAL_SECONDS = float(os.getenv("DEVICE_SWEEP_INTERVAL_SECONDS", str(6 * 3600)))
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class DeviceRegistry:
+    """
+    Cached view of `user_devices` with coalesced heartbeats.
+
+    The cache holds the full device list of a user, so listing devices or
+    reading one device costs at most one query per user per
+    DEVICE_CACHE_TTL. Heartbeats (`touch`) of known active devices only update
+    memory; the latest `last_sync` per device is written back in one
+    multi-row upsert every DEVICE_TOUCH_FLUSH_SECONDS. Unknown devices are
+    upserted right away so they exist as soon as they first sync, and so are
+    deactivated ones, which a heartbeat reactivates.
+    """
+
+    def __init__(
+        self,
+        supabase_factory=get_supabase_service,
+        ttl: float = DEVICE_CACHE_TTL,
+        maxsize: int = DEVICE_CACHE_SIZE,
+        flush_interval: float = DEVICE_TOUCH_FLUSH_SECONDS,
+    ):
+        self.supabase_factory = supabase_factory
+        self.flush_interval = flush_interval
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name="devices")
+        self._pending: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    # --- cache ---
+
+    def _devices(self, supabase, user_id: str) -> Dict[str, Dict[str, Any]]:
+        devices = self._cache.get(user_id)
+        if devices is None:
+            response = supabase.table("user_devices").select("*").eq("user_id", user_id).execute()
+            devices = {row["device_id"]: row for row in response.data or []}
+            # Heartbeats not flushed yet are newer than what the database has
+            with self._lock:
+                for (pending_user, device_id), last_sync in self._pending.items():
+                    if pending_user == user_id and device_id in devices:
+                        devices[device_id] = {**devices[device_id], "last_sync": last_sync}
+            self._cache.set(user_id, devices)
+        return devices
+
+    def store(self, user_id: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Put a row just written to the database into the cache"""
+        devices = self._cache.get(user_id)
+        if devices is not None:
+            devices[row["device_id"]] = row
+            self._cache.replace(user_id, devices)
+        else:
+            self._cache.pop(user_id)
+        return row
+
+    def invalidate(self, user_id: str) -> None:
+        self._cache.pop(user_id)
+
+    def forget(self, user_id: str, device_id: str) -> None:
+        """Drop a buffered heartbeat so the next flush does not write it back"""
+        with self._lock:
+            self._pending.pop((user_id, device_id), None)
+
+    def list_devices(self, supabase, user_id: str) -> List[Dict[str, Any]]:
+        devices = self._devices(supabase, user_id).values()
+        return sorted(devices, key=lambda row: row.get("last_sync") or "", reverse=True)
+
+    def get_device(self, supabase, user_id: str, device_id: str) -> Optional[Dict[str, Any]]:
+        return self._devices(supabase, user_id).get(device_id)
+
+    # --- writes ---
+
+    def register(self, supabase, user_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create or refresh a device with a single idempotent upsert"""
+        row = {**data, "user_id": user_id, "last_sync": _now(), "is_active": True}
+        response = supabase.table("user_devices").upsert(row, on_conflict="user_id,device_id").execute()
+        with self._lock:
+            self._pending.pop((user_id, data["device_id"]), None)
+        return self.store(user_id, response.data[0])
+
+    def touch(self, supabase, user_id: str, device_id: str) -> str:
+        """Record a heartbeat; only unknown or inactive devices hit the database immediately"""
+        device = self.get_device(supabase, user_id, device_id)
+        if device is None or not device.get("is_active"):
+            # Reactivation is written right away; the flush only moves last_sync
+            return self.register(supabase, user_id, {"device_id": device_id})["last_sync"]
+
+        last_sync = _now()
+        with self._lock:
+            self._pending[(user_id, device_id)] = last_sync
+        device["last_sync"] = last_sync
+        return last_sync
+
+    def _write_pending(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        rows = [
+            {"user_id": user_id, "device_id": device_id, "last_sync": last_sync}
+            for (user_id, device_id), last_sync in pending.items()
+        ]
+        try:
+            self.supabase_factory().table("user_devices").upsert(rows, on_conflict="user_id,device_id").execute()
+        except Exception:
+            # Keep the heartbeats for the next flush unless newer ones arrived meanwhile
+            with self._lock:
+                for key, last_sync in pending.items():
+                    self._pending.setdefault(key, last_sync)
+            raise
+        return len(rows)
+
+    async def flush(self) -> int:
+        return await run_in_threadpool(self._write_pending)
+
+    async def _flusher(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.error("Device heartbeat flush failed: %s", exc)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._flusher())
+
+    async def stop(self) -> int:
+        """Write the coalesced heartbeats; returns how many could not be written"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as exc:
+            logger.error("Final device heartbeat flush failed: %s", exc)
+        return len(self._pending)
+
+
+class StaleDeviceSweeper:
+    """
+    Periodically deactivates devices idle for more than `idle_days` and
+    prunes their sync cursors and logs through the `sweep_stale_devices` RPC,
+    `batch_size` devices per call.
+    """
+
+    def __init__(
+        self,
+        supabase_factory=get_supabase_service,
+        idle_days: int = DEVICE_IDLE_DAYS,
+        batch_size: int = 1000,
+        interval_seconds: float = DEVICE_SWEEP_INTERVAL_SECONDS,
+        pause_seconds: float = 1.0,
+    ):
+        self.supabase_factory = supabase_factory
+        self.idle = timedelta(days=idle_days)
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.pause_seconds = pause_seconds
+        self.last_report: Optional[Dict[str, int]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _sweep_batch(self, idle_before: datetime) -> Dict[str, int]:
+        response = self.supabase_factory().rpc("sweep_stale_devices", {
+            "p_idle_before": idle_before.isoformat(),
+            "p_limit": self.batch_size,
+        }).execute()
+        return response.data or {}
+
+    async def run_once(self) -> Dict[str, int]:
+        idle_before = datetime.now(timezone.utc) - self.idle
+        report = {"devices": 0, "cursors": 0, "logs": 0}
+        while True:
+            result = await run_in_threadpool(self._sweep_batch, idle_before)
+            for key in report:
+                report[key] += int(result.get(key, 0))
+            if int(result.get("devices", 0)) < self.batch_size:
+                break
+            await asyncio.sleep(self.pause_seconds)
+        self.last_report = report
+        if report["devices"]:
+            logger.info(
+                "Deactivated %d idle devices (%d cursors, %d sync logs pruned)",
+                report["devices"], report["cursors"], report["logs"],
+            )
+        return report
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as exc:
+                logger.error("Stale device sweep failed: %s", exc)
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._task is None and os.getenv("DEVICE_SWEEPER_ENABLED", "true").lower() == "true":
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+registry = DeviceRegistry()
+sweeper = StaleDeviceSweeper()
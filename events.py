@@ -0,0 +1,295 @@
+# events.py
+import asyncio
+import itertools
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict, Optional, Set
+
+from rate_limit import WEB_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+REALTIME_QUEUE_SIZE = int(os.getenv("REALTIME_QUEUE_SIZE", "100"))
+REALTIME_MAX_CONNECTIONS_PER_USER = int(os.getenv("REALTIME_MAX_CONNECTIONS_PER_USER", "10"))
+
+REALTIME_DATABASE_URL = os.getenv("REALTIME_DATABASE_URL") or os.getenv("DATABASE_URL", "")
+REALTIME_CHANNEL = os.getenv("REALTIME_CHANNEL", "studyvault_events")
+REALTIME_FANOUT_QUEUE_SIZE = int(os.getenv("REALTIME_FANOUT_QUEUE_SIZE", "1000"))
+# NOTIFY payloads are capped at 8000 bytes
+_NOTIFY_MAX_BYTES = 7900
+
+# Write routes (method, route path) -> (resource, action) announced to the user's
+# other connections. Reads sent as POST (/sync/pull, generate-summary) and routes
+# that change nothing the app caches (feed tokens, sync cursors) are left out.
+CHANGE_ROUTES = {
+    ("POST", "/classes/"): ("classes", "create"),
+    ("POST", "/classes/batch"): ("classes", "create"),
+    ("PUT", "/classes/{class_id}"): ("classes", "update"),
+    ("PATCH", "/classes/{class_id}"): ("classes", "update"),
+    ("DELETE", "/classes/{class_id}"): ("classes", "delete"),
+    ("PATCH", "/tasks/{grade_id}/complete"): ("tasks", "update"),
+    ("POST", "/notes/"): ("notes", "create"),
+    ("PUT", "/notes/{note_id}"): ("notes", "update"),
+    ("PATCH", "/notes/{note_id}"): ("notes", "update"),
+    ("DELETE", "/notes/{note_id}"): ("notes", "delete"),
+    ("POST", "/grades/"): ("grades", "create"),
+    ("POST", "/grades/batch"): ("grades", "create"),
+    ("PUT", "/grades/{grade_id}"): ("grades", "update"),
+    ("PATCH", "/grades/{grade_id}"): ("grades", "update"),
+    ("DELETE", "/grades/{grade_id}"): ("grades", "delete"),
+    ("POST", "/categories/"): ("categories_grades", "create"),
+    ("POST", "/categories/batch"): ("categories_grades", "create"),
+    ("PUT", "/categories/{category_id}"): ("categories_grades", "update"),
+    ("DELETE", "/categories/{category_id}"): ("categories_grades", "delete"),
+    ("POST", "/calendar/"): ("calendar_events", "create"),
+    ("POST", "/calendar/batch"): ("calendar_events", "create"),
+    ("POST", "/calendar/import"): ("calendar_events", "create"),
+    ("PUT", "/calendar/{event_id}"): ("calendar_events", "update"),
+    ("PATCH", "/calendar/{event_id}"): ("calendar_events", "update"),
+    ("DELETE", "/calendar/{event_id}"): ("calendar_events", "delete"),
+    ("POST", "/notifications/"): ("notifications", "create"),
+    ("POST", "/notifications/mark-all-read"): ("notifications", "update"),
+    ("POST", "/notifications/mark-read"): ("notifications", "update"),
+    ("POST", "/notifications/{notification_id}/mark-read"): ("notifications", "update"),
+    ("PUT", "/notifications/{notification_id}"): ("notifications", "update"),
+    ("PATCH", "/notifications/{notification_id}"): ("notifications", "update"),
+    ("DELETE", "/notifications/{notification_id}"): ("notifications", "delete"),
+    ("POST", "/sync/push"): ("sync", "update"),
+}
+_WRITE_METHODS = {method for method, _ in CHANGE_ROUTES}
+
+
+class Subscription:
+    """
+    One connected client. Its queue is bounded: when a slow client falls
+    behind, the backlog is dropped and replaced by a single `resync` event
+    telling it to refetch, so memory per connection stays constant.
+    """
+
+    def __init__(self, user_id: str, maxsize: int = REALTIME_QUEUE_SIZE):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, event: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "id": event.get("id")})
+
+    async def get(self) -> Dict[str, Any]:
+        return await self.queue.get()
+
+
+class TooManyConnections(Exception):
+    pass
+
+
+class EventBus:
+    """Per-user pub/sub for this worker's connections, relayed to the others by `fanout`; publishing never blocks"""
+
+    def __init__(self, max_connections_per_user: int = REALTIME_MAX_CONNECTIONS_PER_USER):
+        self.max_connections_per_user = max_connections_per_user
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._ids = itertools.count(1)
+        self.fanout: Optional["PostgresFanout"] = None
+
+    @property
+    def connections(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subs = self._subscribers.setdefault(user_id, set())
+        if len(subs) >= self.max_connections_per_user:
+            raise TooManyConnections(f"At most {self.max_connections_per_user} realtime connections per user")
+        subscription = Subscription(user_id)
+        subs.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subs = self._subscribers.get(subscription.user_id)
+        if subs is None:
+            return
+        subs.discard(subscription)
+        if not subs:
+            del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: str, event: Dict[str, Any]) -> int:
+        """Deliver to this worker's connections and relay to the other workers"""
+        if self.fanout is not None:
+            self.fanout.send(str(user_id), event)
+        return self.deliver(user_id, event)
+
+    def deliver(self, user_id: str, event: Dict[str, Any]) -> int:
+        """Queue an event for every connection of the user here; returns how many got it"""
+        subs = self._subscribers.get(str(user_id))
+        if not subs:
+            return 0
+        event = {**event, "id": next(self._ids)}
+        for subscription in subs:
+            subscription.put(event)
+        return len(subs)
+
+    @property
+    def available(self) -> bool:
+        """Streams only see every event if there is one worker or events are relayed"""
+        return self.fanout is not None or WEB_CONCURRENCY == 1
+
+
+class PostgresFanout:
+    """
+    Relays published events between workers and instances through Postgres
+    LISTEN/NOTIFY, on one dedicated connection per worker (a session-mode
+    connection string: the transaction pooler drops LISTEN).
+
+    Events reach this worker's connections right away; the copy Postgres
+    echoes back carries this worker's origin id and is skipped. Sends are
+    queued, so publishing never waits on the database; when the queue is
+    full or an event exceeds NOTIFY's payload limit, the other workers get a
+    `resync` instead. A lost connection is re-established in the background.
+    """
+
+    def __init__(self, bus: "EventBus", dsn: str, channel: str = REALTIME_CHANNEL,
+                 maxsize: int = REALTIME_FANOUT_QUEUE_SIZE, connect=None):
+        self.bus = bus
+        self.dsn = dsn
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self.dropped = 0
+        self._connect = connect
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._connection = None
+        self._task: Optional[asyncio.Task] = None
+
+    def send(self, user_id: str, event: Dict[str, Any]) -> None:
+        payload = json.dumps({"origin": self.origin, "user_id": user_id, "event": event}, default=str)
+        if len(payload.encode("utf-8")) > _NOTIFY_MAX_BYTES:
+            payload = json.dumps({"origin": self.origin, "user_id": user_id, "event": {"type": "resync"}})
+        try:
+            self._queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("origin") != self.origin:
+            self.bus.deliver(message["user_id"], message["event"])
+
+    async def _open(self):
+        if self._connect is None:
+            import asyncpg  # only workers that relay events need it
+
+            self._connect = lambda: asyncpg.connect(self.dsn)
+        connection = await self._connect()
+        await connection.add_listener(self.channel, self._on_notify)
+        return connection
+
+    async def _close(self) -> None:
+        connection, self._connection = self._connection, None
+        if connection is not None and not connection.is_closed():
+            await connection.close()
+
+    async def _run(self) -> None:
+        payload: Optional[str] = None
+        while True:
+            try:
+                if self._connection is None or self._connection.is_closed():
+                    self._connection = await self._open()
+                if payload is None:
+                    try:
+                        payload = await asyncio.wait_for(self._queue.get(), timeout=5)
+                    except asyncio.TimeoutError:
+                        continue  # re-checks the connection
+                await self._connection.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+                payload = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Realtime fan-out connection failed: %s", exc)
+                await self._close()
+                await asyncio.sleep(1)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> int:
+        """Send what is queued while the lifecycle deadline allows; returns what was left"""
+        if self._task is not None:
+            try:
+                while not self._queue.empty() and not self._task.done():
+                    await asyncio.sleep(0.01)
+            finally:
+                self._task.cancel()
+                await asyncio.gather(self._task, return_exceptions=True)
+                self._task = None
+        await self._close()
+        return self._queue.qsize()
+
+
+bus = EventBus()
+
+
+def start_fanout() -> Optional[PostgresFanout]:
+    """Relay events between workers when REALTIME_DATABASE_URL (or DATABASE_URL) is set"""
+    if not REALTIME_DATABASE_URL:
+        if WEB_CONCURRENCY > 1:
+            logger.error("Realtime streams are disabled: %d workers and no REALTIME_DATABASE_URL to relay events", WEB_CONCURRENCY)
+        return None
+    bus.fanout = PostgresFanout(bus, REALTIME_DATABASE_URL)
+    bus.fanout.start()
+    return bus.fanout
+
+
+async def stop_fanout() -> int:
+    fanout, bus.fanout = bus.fanout, None
+    return await fanout.stop() if fanout is not None else 0
+
+
+class ChangePublisherMiddleware:
+    """
+    ASGI middleware that publishes a `change` event after every successful
+    write listed in CHANGE_ROUTES. The user id is the one `verify_token`
+    stored on `request.state`, so no extra authentication happens here.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in _WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        status_code: Optional[int] = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+        user_id = scope.get("state", {}).get("user_id")
+        if not user_id or status_code is None or not 200 <= status_code < 300:
+            return
+        # The router stores the matched route in the scope
+        change = CHANGE_ROUTES.get((scope["method"], getattr(scope.get("route"), "path", None)))
+        if change is None:
+            return
+        resource, action = change
+        bus.publish(user_id, {
+            "type": "change",
+            "resource": resource,
+            "action": action,
+            "path": scope["path"],
+        })
@@ -0,0 +1,110 @@
+# gunicorn.conf.py
+"""
+Production server: gunicorn managing uvicorn workers.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+The app is imported once in the master (`preload_app`) and forked into
+WEB_CONCURRENCY workers; each worker runs the lifespan (Supabase warm-up,
+background jobs) on its own. SIGTERM / SIGHUP stop old workers gracefully:
+they stop accepting connections and get GRACEFUL_TIMEOUT seconds to finish
+the requests in flight.
+"""
+import glob
+import logging
+import math
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: affinity mask, capped by a cgroup v2 quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max", encoding="utf-8") as source:
+            quota, period = source.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def default_workers() -> int:
+    # Handlers wait on Supabase most of the time, so a worker per CPU leaves
+    # cores idle; memory (~100 MB per worker) is what caps this
+    return min(2 * available_cpus() + 1, int(os.getenv("WEB_CONCURRENCY_MAX", "8")))
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY") or default_workers())
+# The app reads this at import (rate_limit.py) to pick a shared backend
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# Workers publish their metrics here and any of them answers /metrics with the
+# sum (metrics.Registry); without it each scrape would read a single worker
+if not os.getenv("METRICS_MULTIPROC_DIR"):
+    os.environ["METRICS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="studyvault-metrics-")
+metrics_dir = os.environ["METRICS_MULTIPROC_DIR"]
+
+preload_app = True
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+shutdown_timeout = float(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "8"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+# Recycle workers to bound slow leaks; 0 disables
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "0"))
+# Only these peers may rewrite the client address from X-Forwarded-For. Trusting
+# "*" makes scope["client"] the leftmost (client-controlled) entry, which would
+# let anyone rotate past the per-IP limits; client IPs behind Railway's proxy
+# are resolved by rate_limit.client_ip() through RATE_LIMIT_PROXY_HOPS instead
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+accesslog = None
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server) -> None:
+    # Snapshots of a previous run would be summed into this one
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        os.remove(path)
+
+
+def on_exit(server) -> None:
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def when_ready(server) -> None:
+    logger.info("Serving with %d workers (%d CPUs available)", workers, available_cpus())
+
+
+def post_worker_init(worker) -> None:
+    # uvicorn otherwise waits for open connections (realtime streams) until
+    # gunicorn kills the worker; close them early enough for the lifespan
+    # shutdown (SHUTDOWN_TIMEOUT_SECONDS, lifecycle.py) to run within graceful_timeout
+    worker.config.timeout_graceful_shutdown = max(1, graceful_timeout - shutdown_timeout - 2)
+
+
+def worker_int(worker) -> None:
+    logger.info("Worker %s interrupted", worker.pid)
+
+
+def worker_abort(worker) -> None:
+    logger.warning("Worker %s aborted after %ss without a heartbeat", worker.pid, timeout)
+
+
+def child_exit(server, worker) -> None:
+    logger.info("Worker %s exited", worker.pid)
+    from metrics import registry
+
+    try:
+        registry.archive(worker.pid)
+    except OSError as exc:
+        logger.error("Could not archive the metrics of worker %s: %s", worker.pid, exc)
@@ -0,0 +1,178 @@
+# health.py
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import anyio.to_thread
+from fastapi.concurrency import run_in_threadpool
+
+from auth_client import get_auth_client
+from database import get_supabase_service
+from metrics import DEPENDENCY_LATENCY, HTTP_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_INTERVAL_SECONDS = float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "5"))
+HEALTH_PROBE_TIMEOUT_SECONDS = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "2"))
+# Dependencies whose failure makes the instance not ready; the others only mark it degraded
+HEALTH_REQUIRED = [name.strip() for name in os.getenv("HEALTH_REQUIRED", "db").split(",") if name.strip()]
+HEALTH_MAX_IN_FLIGHT = int(os.getenv("HEALTH_MAX_IN_FLIGHT", "200"))
+HEALTH_MAX_THREADPOOL_WAITING = int(os.getenv("HEALTH_MAX_THREADPOOL_WAITING", "50"))
+HEALTH_MAX_LOOP_LAG_MS = float(os.getenv("HEALTH_MAX_LOOP_LAG_MS", "500"))
+
+
+def _probe_db() -> None:
+    get_supabase_service().table("user_profiles").select("id").limit(1).execute()
+
+
+async def _probe_auth() -> None:
+    await get_auth_client().health()
+
+
+class HealthMonitor:
+    """
+    Liveness and readiness reports for the load balancer.
+
+    Dependency probes (PostgREST and GoTrue) run at most once per
+    `probe_interval`; concurrent readiness checks share the cached result,
+    so probing costs the same however often the balancer polls. Readiness
+    also fails while the instance is overloaded (too many requests in
+    flight, a backed-up threadpool or a lagging event loop), letting the
+    balancer route around it until it catches up.
+    """
+
+    def __init__(
+        self,
+        probe_interval: float = HEALTH_PROBE_INTERVAL_SECONDS,
+        probe_timeout: float = HEALTH_PROBE_TIMEOUT_SECONDS,
+        required: Optional[List[str]] = None,
+        lag_interval: float = 0.5,
+    ):
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.required = HEALTH_REQUIRED if required is None else required
+        self.lag_interval = lag_interval
+        self.probes = {"db": lambda: run_in_threadpool(_probe_db), "auth": _probe_auth}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._lags: deque = deque(maxlen=20)
+        self._task: Optional[asyncio.Task] = None
+        self.started_at = time.time()
+
+    # --- event loop lag ---
+
+    async def _watch_loop(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.lag_interval)
+            self._lags.append(max(0.0, time.monotonic() - started - self.lag_interval))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # --- probes ---
+
+    async def _run_probe(self, name: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        result: Dict[str, Any] = {"ok": True}
+        try:
+            await asyncio.wait_for(self.probes[name](), timeout=self.probe_timeout)
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": f"timeout after {self.probe_timeout}s"}
+        except Exception as exc:
+            result = {"ok": False, "error": str(exc) or type(exc).__name__}
+        # The call itself already fed DEPENDENCY_LATENCY through the client instrumentation
+        elapsed = time.perf_counter() - started
+        result["latency_ms"] = round(elapsed * 1000, 1)
+        result["checked_at"] = datetime.now(timezone.utc).isoformat()
+        if not result["ok"]:
+            logger.warning("Health probe %s failed: %s", name, result["error"])
+        return result
+
+    async def check_dependencies(self) -> Dict[str, Dict[str, Any]]:
+        if time.monotonic() - self._checked_at < self.probe_interval:
+            return self._results
+        async with self._lock:
+            # Whoever waited on the lock reuses the result of the probe that just ran
+            if time.monotonic() - self._checked_at >= self.probe_interval:
+                names = list(self.probes)
+                results = await asyncio.gather(*(self._run_probe(name) for name in names))
+                self._results = dict(zip(names, results))
+                self._checked_at = time.monotonic()
+        return self._results
+
+    # --- load ---
+
+    def load(self) -> Dict[str, Any]:
+        threadpool = anyio.to_thread.current_default_thread_limiter()
+        stats = threadpool.statistics()
+        return {
+            "in_flight": int(HTTP_IN_FLIGHT.value()),
+            "event_loop_lag_ms": round(max(self._lags, default=0.0) * 1000, 1),
+            "threadpool": {
+                "busy": stats.borrowed_tokens,
+                "size": int(threadpool.total_tokens),
+                "waiting": stats.tasks_waiting,
+            },
+            "auth_pool": get_auth_client().pool_stats(),
+        }
+
+    def overload_reasons(self, load: Dict[str, Any]) -> List[str]:
+        reasons = []
+        if load["in_flight"] > HEALTH_MAX_IN_FLIGHT:
+            reasons.append(f"{load['in_flight']} requests in flight (max {HEALTH_MAX_IN_FLIGHT})")
+        if load["threadpool"]["waiting"] > HEALTH_MAX_THREADPOOL_WAITING:
+            reasons.append(f"{load['threadpool']['waiting']} tasks waiting for the threadpool (max {HEALTH_MAX_THREADPOOL_WAITING})")
+        if load["event_loop_lag_ms"] > HEALTH_MAX_LOOP_LAG_MS:
+            reasons.append(f"event loop lag {load['event_loop_lag_ms']}ms (max {HEALTH_MAX_LOOP_LAG_MS:g}ms)")
+        return reasons
+
+    def _latency(self) -> Dict[str, Dict[str, float]]:
+        return {name: window.percentiles() for name, window in DEPENDENCY_LATENCY.items()}
+
+    # --- reports ---
+
+    def liveness(self) -> Dict[str, Any]:
+        """Cheap: no probes, only what this process already knows"""
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "load": self.load(),
+            "dependencies": self._results,
+            "latency": self._latency(),
+        }
+
+    async def readiness(self) -> Tuple[bool, Dict[str, Any]]:
+        dependencies = await self.check_dependencies()
+        load = self.load()
+        reasons = self.overload_reasons(load)
+        failed = [name for name, result in dependencies.items() if not result["ok"]]
+        reasons += [f"{name} unavailable" for name in failed if name in self.required]
+        ready = not reasons
+        if not ready:
+            status = "not_ready"
+        elif failed:
+            status = "degraded"
+        else:
+            status = "ready"
+        return ready, {
+            "status": status,
+            "reasons": reasons,
+            "dependencies": dependencies,
+            "latency": self._latency(),
+            "load": load,
+        }
+
+
+monitor = HealthMonitor()
@@ -0,0 +1,166 @@
+# lifecycle.py
+import asyncio
+import fcntl
+import inspect
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Must fit in gunicorn's GRACEFUL_TIMEOUT after open connections are closed (gunicorn.conf.py)
+SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "8"))
+# Time still given to each component reached after the deadline, so pools get closed
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "1"))
+
+# Workers of one instance agree on who runs the singleton jobs through this file
+BACKGROUND_JOBS_LOCK = os.getenv("BACKGROUND_JOBS_LOCK", os.path.join(tempfile.gettempdir(), "studyvault-background-jobs.lock"))
+BACKGROUND_JOBS_RETRY_SECONDS = float(os.getenv("BACKGROUND_JOBS_RETRY_SECONDS", "15"))
+
+# Plain functions (non-blocking) or coroutine functions
+Hook = Callable[[], Any]
+
+
+async def _call(hook: Hook) -> Any:
+    result = hook()
+    return await result if inspect.isawaitable(result) else result
+
+
+class Lifecycle:
+    """
+    Background components of one worker, started in registration order and
+    stopped in reverse.
+
+    A component's `stop` stops taking new work, drains what it holds and may
+    return how many items it could not drain. All stops share one deadline;
+    a stop still running at its deadline is cancelled. `shutdown` returns
+    (and logs) a report per component, so a deploy that dropped work says so.
+    """
+
+    def __init__(self, timeout: float = SHUTDOWN_TIMEOUT_SECONDS, grace: float = SHUTDOWN_GRACE_SECONDS):
+        self.timeout = timeout
+        self.grace = grace
+        self.report: Dict[str, Dict[str, Any]] = {}
+        self._components: List[Tuple[str, Optional[Hook], Optional[Hook]]] = []
+        self._started: List[Tuple[str, Optional[Hook]]] = []
+
+    def register(self, name: str, start: Optional[Hook] = None, stop: Optional[Hook] = None) -> None:
+        """Register before startup; register pools first so they are closed last"""
+        self._components.append((name, start, stop))
+
+    async def startup(self) -> None:
+        """Start every component; if one fails, the ones already started are stopped"""
+        for name, start, stop in self._components:
+            try:
+                if start is not None:
+                    await _call(start)
+            except Exception:
+                logger.error("Could not start %s", name)
+                await self.shutdown()
+                raise
+            self._started.append((name, stop))
+
+    async def shutdown(self) -> Dict[str, Dict[str, Any]]:
+        self.report = {}
+        deadline = time.monotonic() + self.timeout
+        while self._started:
+            name, stop = self._started.pop()
+            if stop is not None:
+                self.report[name] = await self._stop(stop, max(deadline - time.monotonic(), self.grace))
+        self._log_report()
+        return self.report
+
+    async def _stop(self, stop: Hook, timeout: float) -> Dict[str, Any]:
+        started = time.monotonic()
+        try:
+            undrained = await asyncio.wait_for(_call(stop), timeout=timeout)
+            result: Dict[str, Any] = {"status": "undrained" if undrained else "stopped", "undrained": int(undrained or 0)}
+        except asyncio.TimeoutError:
+            result = {"status": "timeout", "undrained": None}
+        except Exception as exc:
+            result = {"status": "failed", "undrained": None, "error": str(exc) or type(exc).__name__}
+        result["seconds"] = round(time.monotonic() - started, 3)
+        return result
+
+    def _log_report(self) -> None:
+        problems = []
+        for name, result in self.report.items():
+            if result["status"] == "undrained":
+                problems.append(f"{name} ({result['undrained']} items)")
+            elif result["status"] != "stopped":
+                problems.append(f"{name} ({result['status']}{': ' + result['error'] if 'error' in result else ''})")
+        total = sum(result["seconds"] for result in self.report.values())
+        if problems:
+            logger.warning("Shutdown in %.2fs; not drained: %s", total, ", ".join(problems), extra={"shutdown": self.report})
+        else:
+            logger.info("Shutdown in %.2fs; all %d components drained", total, len(self.report), extra={"shutdown": self.report})
+
+
+lifecycle = Lifecycle()
+
+
+class SingletonJobs:
+    """
+    Background jobs that must run once per instance, not once per worker.
+
+    Every worker tries to take an exclusive lock on `path`; the holder starts
+    `jobs` and keeps them until it shuts down. The others retry every
+    `retry_seconds`, so when the holder exits (restart, crash) another worker
+    takes over. The lock is per machine: separate replicas each run the jobs.
+    """
+
+    def __init__(self, jobs: Lifecycle, path: str = BACKGROUND_JOBS_LOCK, retry_seconds: float = BACKGROUND_JOBS_RETRY_SECONDS):
+        self.jobs = jobs
+        self.path = path
+        self.retry_seconds = retry_seconds
+        self.leader = False
+        self._fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _try_lock(self) -> bool:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def _unlock(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    async def _acquire(self) -> None:
+        while not self._try_lock():
+            await asyncio.sleep(self.retry_seconds)
+        try:
+            await self.jobs.startup()
+        except Exception as exc:
+            logger.error("Background jobs failed to start: %s", exc)
+            self._unlock()
+            return
+        self.leader = True
+        logger.info("Worker %d runs the background jobs", os.getpid())
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._acquire())
+
+    async def stop(self) -> int:
+        """Stop the jobs if this worker runs them; returns what they could not drain"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        undrained = 0
+        if self.leader:
+            report = await self.jobs.shutdown()
+            undrained = sum(result["undrained"] or 0 for result in report.values())
+            self.leader = False
+        self._unlock()
+        return undrained
@@ -1,21 +1,113 @@
 #main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
+import asyncio
+import logging
 import os
+from typing import Optional
 from dotenv import load_dotenv
 
-from routers import auth, classes, tasks, calendar, notes, sync, grades, notifications, user_devices, user_profiles, categories_grades
-from database import init_db
+from routers import auth, classes, tasks, calendar, notes, sync, grades, notifications, user_devices, user_profiles, categories_grades, realtime
+from database import close_clients, init_db, warm_up_clients
+from events import ChangePublisherMiddleware, start_fanout, stop_fanout
+from auth_client import close_auth_client
+from notification_dispatcher import start_dispatcher, stop_dispatcher
+from reminders import start_materializer, stop_materializer
+from retention import start_retention, stop_retention
+from device_registry import registry as device_registry, sweeper as device_sweeper
+from logging_config import configure_logging
+from metrics import MetricsMiddleware, metrics_endpoint, start_snapshots, stop_snapshots
+from tracing import TracingMiddleware, trace_endpoints
+from health import monitor as health_monitor
+from admission import AdmissionMiddleware
+from calendar_import import ImportSizeLimitMiddleware
+from lifecycle import Lifecycle, SingletonJobs, lifecycle
+import tracing
 
 load_dotenv()
+configure_logging()
+
+logger = logging.getLogger(__name__)
+
+async def _warm_up() -> None:
+    try:
+        await run_in_threadpool(warm_up_clients)
+    except Exception as e:
+        # Not fatal: the clients are retried on first use and /health/ready reports the failure
+        logger.warning("Supabase client warm-up failed: %s", e)
+
+_warm_up_task: Optional[asyncio.Task] = None
+
+async def _start_warm_up() -> None:
+    # The server accepts connections while supabase is imported and the clients built
+    global _warm_up_task
+    _warm_up_task = asyncio.create_task(_warm_up())
+
+async def _stop_warm_up() -> None:
+    if _warm_up_task is not None:
+        await _warm_up_task
+
+async def _close_clients() -> None:
+    await run_in_threadpool(close_clients)
+
+async def _stop_trace_exporter() -> int:
+    return await run_in_threadpool(tracing.exporter.shutdown) if tracing.exporter else 0
+
+# Started top to bottom, stopped bottom to top: pools and exporters are closed last.
+# The log queue is flushed at exit, after the shutdown report is written; the
+# worker's last metrics snapshot is written after every other component stopped.
+lifecycle.register("metrics_snapshots", start=start_snapshots, stop=stop_snapshots)
+lifecycle.register("trace_exporter", stop=_stop_trace_exporter)
+lifecycle.register("supabase_clients", stop=_close_clients)
+lifecycle.register("auth_client", stop=close_auth_client)
+lifecycle.register("supabase_warm_up", start=_start_warm_up, stop=_stop_warm_up)
+lifecycle.register("realtime_fanout", start=start_fanout, stop=stop_fanout)
+lifecycle.register("device_registry", start=device_registry.start, stop=device_registry.stop)
+lifecycle.register("health_monitor", start=health_monitor.start, stop=health_monitor.stop)
+
+# Run by one worker per instance (gunicorn starts several), not once per worker
+background_jobs = Lifecycle()
+background_jobs.register("notification_dispatcher", start=start_dispatcher, stop=stop_dispatcher)
+background_jobs.register("reminder_materializer", start=start_materializer, stop=stop_materializer)
+background_jobs.register("notification_retention", start=start_retention, stop=stop_retention)
+background_jobs.register("device_sweeper", start=device_sweeper.start, stop=device_sweeper.stop)
+singleton_jobs = SingletonJobs(background_jobs)
+lifecycle.register("background_jobs", start=singleton_jobs.start, stop=singleton_jobs.stop)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the background components; on shutdown drain them within SHUTDOWN_TIMEOUT_SECONDS"""
+    try:
+        await init_db()
+    except Exception as e:
+        logger.error("Database initialization failed: %s", e)
+        raise e
+
+    await lifecycle.startup()
+    logger.info("Startup complete")
+
+    yield
+
+    # The server has stopped accepting connections and finished the requests in flight
+    await lifecycle.shutdown()
 
 app = FastAPI(
     title="StudyVault API",
     description="API backend for StudyVault student productivity app",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Oversized calendar imports are refused before their body is spooled
+app.add_middleware(ImportSizeLimitMiddleware)
+
+# Admission control / load shedding; added before CORS so CORS headers wrap its 429/503 responses
+app.add_middleware(AdmissionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -31,26 +123,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Publish change events to realtime connections after successful writes
+app.add_middleware(ChangePublisherMiddleware)
+
+# Request spans, Server-Timing header and trace export (see tracing.py)
+app.add_middleware(TracingMiddleware)
+
+# Per-route latency / status / PostgREST call counts (outermost, so it times everything)
+app.add_middleware(MetricsMiddleware)
+
 # Security
 security = HTTPBearer()
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database connection on startup"""
-    try:
-        await init_db()
-        print("✅ Database initialized successfully")
-    except Exception as e:
-        print(f"❌ Database initialization failed: {e}")
-        raise e
-
 @app.get("/")
 async def root():
     return {"message": "StudyVault API is running"}
 
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
-    return {"status": "healthy", "service": "StudyVault API"}
+    """Liveness: the process is up and serving; never probes dependencies"""
+    return {"status": "healthy", "service": "StudyVault API", **health_monitor.liveness()}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: dependencies reachable and the instance not overloaded (503 otherwise)"""
+    ready, report = await health_monitor.readiness()
+    return JSONResponse({"service": "StudyVault API", **report}, status_code=200 if ready else 503)
+
+app.add_api_route("/metrics", metrics_endpoint, include_in_schema=False)
 
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
@@ -64,6 +165,10 @@ app.include_router(notifications.router, prefix="/notifications", tags=["Notific
 app.include_router(user_devices.router, prefix="/devices", tags=["User Devices"])
 app.include_router(user_profiles.router, prefix="/profile", tags=["User Profile"])
 app.include_router(categories_grades.router, prefix="/categories", tags=["categories"])
+app.include_router(realtime.router, prefix="/realtime", tags=["Realtime"])
+
+# handler / serialize spans for every route above
+trace_endpoints(app)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,391 @@
+# metrics.py
+import asyncio
+import contextvars
+import fcntl
+import json
+import logging
+import os
+from collections import deque
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Set by gunicorn.conf.py: workers publish snapshots here and /metrics sums them
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_SNAPSHOT_SECONDS = float(os.getenv("METRICS_SNAPSHOT_SECONDS", "5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def snapshot(self) -> List[list]:
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def merge(into: Dict[Tuple[str, ...], Any], rows: List[list]) -> None:
+        for labels, value in rows:
+            into[tuple(labels)] = into.get(tuple(labels), 0) + value
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], Any]] = None) -> List[str]:
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; an observation is a bisect plus three increments"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def snapshot(self) -> List[list]:
+        with self._lock:
+            return [[list(labels), list(counts), total] for labels, (counts, total) in self._values.items()]
+
+    @staticmethod
+    def merge(into: Dict[Tuple[str, ...], Any], rows: List[list]) -> None:
+        for labels, counts, total in rows:
+            entry = into.get(tuple(labels))
+            if entry is None:
+                into[tuple(labels)] = [list(counts), total]
+            else:
+                entry[0] = [mine + theirs for mine, theirs in zip(entry[0], counts)]
+                entry[1] += total
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], Any]] = None) -> List[str]:
+        if values is None:
+            values = {}
+            self.merge(values, self.snapshot())
+        lines = self.header()
+        for labels, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class LatencyWindow:
+    """The last `size` latencies of a dependency, for the percentiles in health reports"""
+
+    def __init__(self, size: int = 512):
+        self._values: deque = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self._values.append(seconds)
+
+    def percentiles(self) -> Dict[str, float]:
+        values = sorted(self._values)
+        if not values:
+            return {"samples": 0}
+        report = {"samples": len(values)}
+        for name, q in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            report[name] = round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 1)
+        return report
+
+
+class Registry:
+    """
+    The process's metrics, rendered in the Prometheus text format.
+
+    With a `directory` (one per server start, shared by the gunicorn
+    workers) each worker writes a snapshot of its values to
+    `worker-<pid>.json` every METRICS_SNAPSHOT_SECONDS and when it stops, and
+    `render` sums every snapshot, so any worker answers a scrape with the
+    totals of the instance. The master folds the snapshot of an exited
+    worker into `archive.json` (`archive`), keeping counters and histograms
+    monotonic across worker restarts; gauges of exited workers are dropped.
+    """
+
+    def __init__(self, directory: str = ""):
+        self.directory = directory
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self) -> Dict[str, List[list]]:
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def render(self) -> str:
+        merged = self._merged() if self.directory else None
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render(merged[metric.name] if merged is not None else None))
+        return "\n".join(lines) + "\n"
+
+    # --- shared across workers ---
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _write(self, name: str, data: Dict[str, List[list]]) -> None:
+        temporary = self._path(f".{name}.tmp")
+        with open(temporary, "w", encoding="utf-8") as target:
+            json.dump(data, target)
+        os.replace(temporary, self._path(name))
+
+    def _read(self, name: str) -> Dict[str, List[list]]:
+        try:
+            with open(self._path(name), encoding="utf-8") as source:
+                return json.load(source)
+        except (OSError, ValueError):
+            return {}
+
+    def _locked(self, operation: int):
+        descriptor = os.open(self._path(".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(descriptor, operation)
+        return descriptor
+
+    def write_snapshot(self) -> None:
+        if self.directory:
+            self._write(f"worker-{os.getpid()}.json", self.snapshot())
+
+    def _merged(self) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        self.write_snapshot()
+        merged: Dict[str, Dict[Tuple[str, ...], Any]] = {metric.name: {} for metric in self._metrics}
+        # Shared lock: `archive` never runs halfway through a read
+        descriptor = self._locked(fcntl.LOCK_SH)
+        try:
+            for name in sorted(os.listdir(self.directory)):
+                if name.endswith(".json"):
+                    data = self._read(name)
+                    for metric in self._metrics:
+                        metric.merge(merged[metric.name], data.get(metric.name, []))
+        finally:
+            os.close(descriptor)
+        return merged
+
+    def archive(self, pid: int) -> None:
+        """Fold an exited worker's counters and histograms into archive.json (gunicorn master)"""
+        name = f"worker-{pid}.json"
+        if not self.directory or not os.path.exists(self._path(name)):
+            return
+        descriptor = self._locked(fcntl.LOCK_EX)
+        try:
+            worker, archived = self._read(name), self._read("archive.json")
+            for metric in self._metrics:
+                if metric.kind == "gauge":
+                    continue
+                values: Dict[Tuple[str, ...], Any] = {}
+                metric.merge(values, archived.get(metric.name, []))
+                metric.merge(values, worker.get(metric.name, []))
+                archived[metric.name] = [
+                    [list(labels), *entry] if metric.kind == "histogram" else [list(labels), entry]
+                    for labels, entry in values.items()
+                ]
+            self._write("archive.json", archived)
+            os.remove(self._path(name))
+        finally:
+            os.close(descriptor)
+
+
+registry = Registry(METRICS_MULTIPROC_DIR)
+
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")))
+HTTP_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"))
+SUPABASE_CALLS_PER_REQUEST = registry.register(Histogram(
+    "http_request_supabase_calls", "PostgREST calls made while serving one request", ("route",), COUNT_BUCKETS))
+SUPABASE_REQUESTS = registry.register(Counter(
+    "supabase_requests_total", "PostgREST calls by table (or rpc/<fn>), method and status", ("table", "method", "status")))
+SUPABASE_LATENCY = registry.register(Histogram(
+    "supabase_request_duration_seconds", "PostgREST call latency by table", ("table", "method")))
+SUPABASE_BYTES = registry.register(Counter(
+    "supabase_response_bytes_total", "PostgREST response body bytes by table", ("table",)))
+ADMISSION_SHED = registry.register(Counter(
+    "admission_shed_total", "Requests rejected by admission control by class and reason", ("class", "reason")))
+AUTH_REQUESTS = registry.register(Counter(
+    "auth_requests_total", "GoTrue calls by endpoint and outcome", ("endpoint", "outcome")))
+AUTH_LATENCY = registry.register(Histogram(
+    "auth_request_duration_seconds", "GoTrue call latency by endpoint", ("endpoint",)))
+AUTH_VERIFY_LATENCY = registry.register(Histogram(
+    "auth_verify_duration_seconds", "Access token verification time by result", ("result",)))
+
+# Recent latencies of real traffic (and health probes) per dependency
+DEPENDENCY_LATENCY = {"db": LatencyWindow(), "auth": LatencyWindow()}
+
+# Mutable per-request counter; threadpool workers run in a copy of the
+# request context, so they share the list rather than the variable
+_request_calls: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("supabase_calls", default=None)
+
+
+def table_of(path: str) -> str:
+    # /rest/v1/<table> or /rest/v1/rpc/<function>
+    parts = path.split("/rest/v1/", 1)[-1].strip("/").split("/")
+    return "/".join(parts[:2]) if parts[0] == "rpc" else parts[0]
+
+
+def _on_request(request) -> None:
+    request.extensions["metrics_started"] = time.perf_counter()
+
+
+def _on_response(response) -> None:
+    # postgrest reads the whole body anyway; reading it here makes the timing and size exact
+    response.read()
+    request = response.request
+    elapsed = time.perf_counter() - request.extensions.get("metrics_started", time.perf_counter())
+    table = table_of(request.url.path)
+    SUPABASE_REQUESTS.inc(table, request.method, str(response.status_code))
+    SUPABASE_LATENCY.observe(elapsed, table, request.method)
+    DEPENDENCY_LATENCY["db"].observe(elapsed)
+    SUPABASE_BYTES.inc(table, amount=len(response.content))
+    calls = _request_calls.get()
+    if calls is not None:
+        calls[0] += 1
+
+
+def instrument_supabase(client):
+    """Count, time and size every PostgREST call made through a supabase client"""
+    if METRICS_ENABLED:
+        hooks = client.postgrest.session.event_hooks
+        hooks["request"].append(_on_request)
+        hooks["response"].append(_on_response)
+    return client
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status and PostgREST call counts"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        calls = [0]
+        token = _request_calls.set(calls)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            _request_calls.reset(token)
+            # Route templates keep label cardinality bounded; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(scope["method"], route, str(status_code))
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], route)
+            SUPABASE_CALLS_PER_REQUEST.observe(calls[0], route)
+
+
+_snapshot_task: Optional[asyncio.Task] = None
+
+
+async def _write_snapshots() -> None:
+    while True:
+        await asyncio.sleep(METRICS_SNAPSHOT_SECONDS)
+        try:
+            registry.write_snapshot()
+        except OSError as exc:
+            logger.error("Could not write the metrics snapshot: %s", exc)
+
+
+def start_snapshots() -> None:
+    """Publish this worker's metrics to METRICS_MULTIPROC_DIR periodically"""
+    global _snapshot_task
+    if registry.directory and METRICS_ENABLED and _snapshot_task is None:
+        _snapshot_task = asyncio.create_task(_write_snapshots())
+
+
+async def stop_snapshots() -> None:
+    global _snapshot_task
+    if _snapshot_task is not None:
+        _snapshot_task.cancel()
+        await asyncio.gather(_snapshot_task, return_exceptions=True)
+        _snapshot_task = None
+        # Counted since the last snapshot; the master archives this file once the worker exits
+        registry.write_snapshot()
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Prometheus text exposition; requires `Bearer $METRICS_TOKEN` when that is set"""
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("authorization") != f"Bearer {token}":
+        return Response(status_code=401)
+    return Response(await run_in_threadpool(registry.render), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,138 @@
+-- Operaciones por lote para clases, categorías, calificaciones y eventos
+-- Todas las funciones son SECURITY INVOKER: se ejecutan con el JWT del usuario,
+-- así que RLS sigue aplicando y user_id siempre se fuerza a auth.uid().
+
+-- Tablas permitidas para operaciones por lote
+CREATE OR REPLACE FUNCTION public._batch_check_table(p_table text)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF p_table NOT IN ('classes', 'categories_grades', 'grades', 'calendar_events') THEN
+        RAISE EXCEPTION 'Table % not allowed for batch operations', p_table;
+    END IF;
+END;
+$$;
+
+-- Inserta todas las filas en una sola sentencia.
+-- Las claves ausentes en el JSON usan el DEFAULT de la columna (igual que
+-- Prefer: missing=default en PostgREST).
+CREATE OR REPLACE FUNCTION public.batch_insert(p_table text, p_rows jsonb)
+RETURNS SETOF jsonb
+LANGUAGE plpgsql
+SECURITY INVOKER
+SET search_path = public
+AS $$
+DECLARE
+    v_columns text;
+    v_values text;
+BEGIN
+    PERFORM public._batch_check_table(p_table);
+
+    SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum),
+           string_agg(
+               format(
+                   'CASE WHEN r.value ? %L THEN (p.x).%I ELSE %s END',
+                   a.attname, a.attname, COALESCE(pg_get_expr(d.adbin, d.adrelid), 'NULL')
+               ),
+               ', ' ORDER BY a.attnum
+           )
+      INTO v_columns, v_values
+      FROM pg_attribute a
+      LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+     WHERE a.attrelid = format('public.%I', p_table)::regclass
+       AND a.attnum > 0
+       AND NOT a.attisdropped
+       AND a.attgenerated = ''
+       AND a.attname <> 'user_id';
+
+    RETURN QUERY EXECUTE format(
+        'INSERT INTO public.%1$I AS t (user_id, %2$s)
+         SELECT auth.uid(), %3$s
+           FROM jsonb_array_elements($1) AS r(value),
+                LATERAL (SELECT jsonb_populate_record(NULL::public.%1$I, r.value) AS x) AS p
+         RETURNING to_jsonb(t.*)',
+        p_table, v_columns, v_values
+    ) USING p_rows;
+END;
+$$;
+
+-- Aplica parches parciales (cada elemento lleva su "id") en una sola sentencia.
+-- Solo se modifican las claves presentes en cada parche.
+CREATE OR REPLACE FUNCTION public.batch_patch(p_table text, p_rows jsonb)
+RETURNS SETOF jsonb
+LANGUAGE plpgsql
+SECURITY INVOKER
+SET search_path = public
+AS $$
+DECLARE
+    v_columns text;
+BEGIN
+    PERFORM public._batch_check_table(p_table);
+
+    SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum)
+      INTO v_columns
+      FROM pg_attribute a
+     WHERE a.attrelid = format('public.%I', p_table)::regclass
+       AND a.attnum > 0
+       AND NOT a.attisdropped
+       AND a.attgenerated = ''
+       AND a.attname NOT IN ('id', 'user_id', 'created_at', 'updated_at');
+
+    RETURN QUERY EXECUTE format(
+        'UPDATE public.%1$I AS t
+            SET (%2$s) = (SELECT %2$s FROM jsonb_populate_record(t, r.patch)),
+                updated_at = now()
+           FROM jsonb_array_elements($1) AS r(patch)
+          WHERE t.id = (r.patch->>''id'')::uuid
+            AND t.user_id = auth.uid()
+         RETURNING to_jsonb(t.*)',
+        p_table, v_columns
+    ) USING p_rows;
+END;
+$$;
+
+-- Modo atómico: inserts, parches y borrados en una única transacción.
+-- Si algún parche o borrado no encuentra su fila, se revierte todo el lote.
+CREATE OR REPLACE FUNCTION public.batch_apply(
+    p_table text,
+    p_creates jsonb DEFAULT '[]'::jsonb,
+    p_patches jsonb DEFAULT '[]'::jsonb,
+    p_deletes uuid[] DEFAULT '{}'::uuid[]
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY INVOKER
+SET search_path = public
+AS $$
+DECLARE
+    v_created jsonb;
+    v_updated jsonb;
+    v_deleted jsonb;
+BEGIN
+    PERFORM public._batch_check_table(p_table);
+
+    SELECT COALESCE(jsonb_agg(x), '[]'::jsonb) INTO v_created FROM public.batch_insert(p_table, p_creates) x;
+    SELECT COALESCE(jsonb_agg(x), '[]'::jsonb) INTO v_updated FROM public.batch_patch(p_table, p_patches) x;
+
+    IF jsonb_array_length(v_updated) <> jsonb_array_length(p_patches) THEN
+        RAISE EXCEPTION 'Batch update: % of % rows not found',
+            jsonb_array_length(p_patches) - jsonb_array_length(v_updated), jsonb_array_length(p_patches);
+    END IF;
+
+    EXECUTE format(
+        'WITH deleted AS (
+             DELETE FROM public.%1$I WHERE id = ANY($1) AND user_id = auth.uid() RETURNING id
+         )
+         SELECT COALESCE(jsonb_agg(id), ''[]''::jsonb) FROM deleted',
+        p_table
+    ) INTO v_deleted USING p_deletes;
+
+    IF jsonb_array_length(v_deleted) <> COALESCE(array_length(p_deletes, 1), 0) THEN
+        RAISE EXCEPTION 'Batch delete: % of % rows not found',
+            COALESCE(array_length(p_deletes, 1), 0) - jsonb_array_length(v_deleted), COALESCE(array_length(p_deletes, 1), 0);
+    END IF;
+
+    RETURN jsonb_build_object('created', v_created, 'updated', v_updated, 'deleted', v_deleted);
+END;
+$$;
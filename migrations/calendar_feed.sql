@@ -0,0 +1,79 @@
+-- Tokens para el feed ICS de cada usuario
+-- Solo se guarda el hash SHA-256 del token; el token en claro se entrega una vez.
+CREATE TABLE IF NOT EXISTS public.calendar_feed_tokens (
+    user_id uuid NOT NULL,
+    token_hash text NOT NULL UNIQUE,
+    calendar_version bigint NOT NULL DEFAULT 0,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    CONSTRAINT calendar_feed_tokens_pkey PRIMARY KEY (user_id),
+    CONSTRAINT calendar_feed_tokens_user_id_fkey FOREIGN KEY (user_id) REFERENCES auth.users(id)
+);
+
+ALTER TABLE public.calendar_feed_tokens ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS calendar_feed_tokens_owner ON public.calendar_feed_tokens;
+CREATE POLICY calendar_feed_tokens_owner ON public.calendar_feed_tokens
+    FOR ALL USING (auth.uid() = user_id) WITH CHECK (auth.uid() = user_id);
+
+-- calendar_version cambia con cualquier escritura sobre eventos o calificaciones
+-- del usuario, y se usa como ETag del feed (sin volver a leer los eventos).
+-- Triggers por sentencia con tablas de transición: un lote de N filas hace un
+-- UPDATE por usuario afectado, no N. Postgres no admite tablas de transición en
+-- triggers de varios eventos, así que hay uno por INSERT, UPDATE y DELETE.
+CREATE OR REPLACE FUNCTION public.bump_calendar_feed_version()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE public.calendar_feed_tokens
+           SET calendar_version = calendar_version + 1
+         WHERE user_id IN (SELECT user_id FROM new_rows);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE public.calendar_feed_tokens
+           SET calendar_version = calendar_version + 1
+         WHERE user_id IN (SELECT user_id FROM new_rows UNION SELECT user_id FROM old_rows);
+    ELSE
+        UPDATE public.calendar_feed_tokens
+           SET calendar_version = calendar_version + 1
+         WHERE user_id IN (SELECT user_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_calendar_events_feed_version ON public.calendar_events;
+DROP TRIGGER IF EXISTS trg_calendar_events_feed_version_insert ON public.calendar_events;
+DROP TRIGGER IF EXISTS trg_calendar_events_feed_version_update ON public.calendar_events;
+DROP TRIGGER IF EXISTS trg_calendar_events_feed_version_delete ON public.calendar_events;
+CREATE TRIGGER trg_calendar_events_feed_version_insert
+    AFTER INSERT ON public.calendar_events
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.bump_calendar_feed_version();
+CREATE TRIGGER trg_calendar_events_feed_version_update
+    AFTER UPDATE ON public.calendar_events
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.bump_calendar_feed_version();
+CREATE TRIGGER trg_calendar_events_feed_version_delete
+    AFTER DELETE ON public.calendar_events
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.bump_calendar_feed_version();
+
+DROP TRIGGER IF EXISTS trg_grades_feed_version ON public.grades;
+DROP TRIGGER IF EXISTS trg_grades_feed_version_insert ON public.grades;
+DROP TRIGGER IF EXISTS trg_grades_feed_version_update ON public.grades;
+DROP TRIGGER IF EXISTS trg_grades_feed_version_delete ON public.grades;
+CREATE TRIGGER trg_grades_feed_version_insert
+    AFTER INSERT ON public.grades
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.bump_calendar_feed_version();
+CREATE TRIGGER trg_grades_feed_version_update
+    AFTER UPDATE ON public.grades
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.bump_calendar_feed_version();
+CREATE TRIGGER trg_grades_feed_version_delete
+    AFTER DELETE ON public.grades
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.bump_calendar_feed_version();
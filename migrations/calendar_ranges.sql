@@ -0,0 +1,22 @@
+-- Rango de tiempo indexado para eventos de calendario
+-- Permite consultas de solapamiento (&&) sobre un único índice GiST en lugar de
+-- dos filtros independientes sobre start_datetime / end_datetime.
+
+-- btree_gist permite combinar user_id (uuid) con el rango en el mismo índice
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Columna generada: siempre coincide con start_datetime / end_datetime.
+-- Eventos de duración cero (o con fin anterior al inicio) se guardan como un
+-- instante cerrado para que sigan solapando con las ventanas que los contienen.
+ALTER TABLE public.calendar_events
+    ADD COLUMN IF NOT EXISTS time_range tstzrange
+    GENERATED ALWAYS AS (
+        CASE
+            WHEN end_datetime > start_datetime
+                THEN tstzrange(start_datetime, end_datetime, '[)')
+            ELSE tstzrange(start_datetime, start_datetime, '[]')
+        END
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_calendar_events_user_time_range
+    ON public.calendar_events USING gist (user_id, time_range);
@@ -0,0 +1,77 @@
+-- Cursores de sincronización por dispositivo y tabla, y limpieza de dispositivos inactivos
+
+CREATE TABLE IF NOT EXISTS public.device_sync_cursors (
+    user_id uuid NOT NULL,
+    device_id text NOT NULL,
+    table_name text NOT NULL,
+    cursor timestamp with time zone NOT NULL,
+    updated_at timestamp with time zone NOT NULL DEFAULT now(),
+    CONSTRAINT device_sync_cursors_pkey PRIMARY KEY (user_id, device_id, table_name),
+    CONSTRAINT device_sync_cursors_device_fkey FOREIGN KEY (user_id, device_id)
+        REFERENCES public.user_devices(user_id, device_id) ON DELETE CASCADE
+);
+
+ALTER TABLE public.device_sync_cursors ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS device_sync_cursors_owner ON public.device_sync_cursors;
+CREATE POLICY device_sync_cursors_owner ON public.device_sync_cursors
+    FOR ALL USING (auth.uid() = user_id) WITH CHECK (auth.uid() = user_id);
+
+-- Búsqueda de dispositivos activos sin sincronizar desde hace tiempo
+CREATE INDEX IF NOT EXISTS idx_user_devices_active_last_sync
+    ON public.user_devices (last_sync)
+    WHERE is_active = true;
+
+-- Desactiva en lote los dispositivos sin actividad desde p_idle_before y borra
+-- sus cursores y registros de sincronización. Devuelve los conteos.
+CREATE OR REPLACE FUNCTION public.sweep_stale_devices(
+    p_idle_before timestamp with time zone,
+    p_limit integer DEFAULT 1000
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_devices integer;
+    v_cursors integer;
+    v_logs integer := 0;
+BEGIN
+    CREATE TEMP TABLE IF NOT EXISTS _swept_devices (user_id uuid, device_id text) ON COMMIT DROP;
+    TRUNCATE _swept_devices;
+
+    WITH stale AS (
+        SELECT user_id, device_id
+          FROM public.user_devices
+         WHERE is_active = true
+           AND last_sync < p_idle_before
+         ORDER BY last_sync
+         LIMIT p_limit
+         FOR UPDATE SKIP LOCKED
+    ), deactivated AS (
+        UPDATE public.user_devices d
+           SET is_active = false
+          FROM stale
+         WHERE d.user_id = stale.user_id AND d.device_id = stale.device_id
+        RETURNING d.user_id, d.device_id
+    )
+    INSERT INTO _swept_devices SELECT user_id, device_id FROM deactivated;
+    GET DIAGNOSTICS v_devices = ROW_COUNT;
+
+    DELETE FROM public.device_sync_cursors c
+     USING _swept_devices s
+     WHERE c.user_id = s.user_id AND c.device_id = s.device_id;
+    GET DIAGNOSTICS v_cursors = ROW_COUNT;
+
+    IF to_regclass('public.sync_logs') IS NOT NULL THEN
+        DELETE FROM public.sync_logs l
+         USING _swept_devices s
+         WHERE l.user_id = s.user_id AND l.device_id = s.device_id;
+        GET DIAGNOSTICS v_logs = ROW_COUNT;
+    END IF;
+
+    RETURN jsonb_build_object('devices', v_devices, 'cursors', v_cursors, 'logs', v_logs);
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.sweep_stale_devices(timestamp with time zone, integer) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.sweep_stale_devices(timestamp with time zone, integer) TO service_role;
@@ -0,0 +1,73 @@
+-- Despacho de notificaciones programadas (notifications.scheduled_for)
+-- Los workers reclaman lotes con FOR UPDATE SKIP LOCKED y un "lease" temporal,
+-- de modo que varias instancias pueden repartirse el trabajo sin duplicar envíos.
+
+ALTER TABLE public.notifications
+    ADD COLUMN IF NOT EXISTS claimed_by text,
+    ADD COLUMN IF NOT EXISTS claimed_until timestamp with time zone,
+    ADD COLUMN IF NOT EXISTS attempts integer NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS last_error text,
+    -- Canales que ya entregaron la notificación: un reintento solo usa los demás
+    ADD COLUMN IF NOT EXISTS delivered_channels text[] NOT NULL DEFAULT '{}';
+
+-- Solo las pendientes de envío: el índice se mantiene pequeño
+CREATE INDEX IF NOT EXISTS idx_notifications_due
+    ON public.notifications (scheduled_for)
+    WHERE sent_at IS NULL AND scheduled_for IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.claim_due_notifications(
+    p_worker text,
+    p_horizon timestamp with time zone,
+    p_limit integer DEFAULT 500,
+    p_lease_seconds integer DEFAULT 300,
+    p_max_attempts integer DEFAULT 5
+)
+RETURNS SETOF public.notifications
+LANGUAGE sql
+AS $$
+    UPDATE public.notifications n
+       SET claimed_by = p_worker,
+           claimed_until = now() + make_interval(secs => p_lease_seconds),
+           attempts = n.attempts + 1
+     WHERE n.id IN (
+         SELECT id
+           FROM public.notifications
+          WHERE sent_at IS NULL
+            AND scheduled_for IS NOT NULL
+            AND scheduled_for <= p_horizon
+            AND attempts < p_max_attempts
+            AND (claimed_until IS NULL OR claimed_until < now())
+          ORDER BY scheduled_for
+          LIMIT p_limit
+          FOR UPDATE SKIP LOCKED
+     )
+    RETURNING n.*;
+$$;
+
+-- Devuelve notificaciones reclamadas que no se llegaron a enviar (apagado del
+-- worker): quedan disponibles de inmediato y sin consumir un intento.
+CREATE OR REPLACE FUNCTION public.release_notifications(
+    p_worker text,
+    p_ids uuid[]
+)
+RETURNS integer
+LANGUAGE sql
+AS $$
+    WITH released AS (
+        UPDATE public.notifications
+           SET claimed_by = NULL,
+               claimed_until = NULL,
+               attempts = GREATEST(attempts - 1, 0)
+         WHERE id = ANY(p_ids)
+           AND claimed_by = p_worker
+           AND sent_at IS NULL
+        RETURNING 1
+    )
+    SELECT count(*)::integer FROM released;
+$$;
+
+-- Solo el backend (service role) puede reclamar y liberar notificaciones
+REVOKE EXECUTE ON FUNCTION public.claim_due_notifications(text, timestamp with time zone, integer, integer, integer) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.claim_due_notifications(text, timestamp with time zone, integer, integer, integer) TO service_role;
+REVOKE EXECUTE ON FUNCTION public.release_notifications(text, uuid[]) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.release_notifications(text, uuid[]) TO service_role;
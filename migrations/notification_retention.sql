@@ -0,0 +1,97 @@
+-- Retención de notificaciones
+-- Las notificaciones leídas más antiguas que el límite configurado se resumen por
+-- usuario/mes/tipo y luego se archivan (o se borran) en lotes acotados.
+
+CREATE TABLE IF NOT EXISTS public.notifications_archive (
+    id uuid NOT NULL,
+    user_id uuid NOT NULL,
+    title text NOT NULL,
+    message text NOT NULL,
+    type text,
+    action_url text,
+    scheduled_for timestamp with time zone,
+    sent_at timestamp with time zone,
+    created_at timestamp with time zone,
+    archived_at timestamp with time zone NOT NULL DEFAULT now(),
+    CONSTRAINT notifications_archive_pkey PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS public.notification_monthly_summaries (
+    user_id uuid NOT NULL,
+    month date NOT NULL,
+    type text NOT NULL,
+    total integer NOT NULL DEFAULT 0,
+    updated_at timestamp with time zone NOT NULL DEFAULT now(),
+    CONSTRAINT notification_monthly_summaries_pkey PRIMARY KEY (user_id, month, type)
+);
+
+ALTER TABLE public.notifications_archive ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.notification_monthly_summaries ENABLE ROW LEVEL SECURITY;
+
+-- Se eliminan antes de crearlas para que la migración pueda ejecutarse de nuevo
+DROP POLICY IF EXISTS "Users can read own archived notifications" ON public.notifications_archive;
+CREATE POLICY "Users can read own archived notifications" ON public.notifications_archive
+    FOR SELECT USING (auth.uid() = user_id);
+DROP POLICY IF EXISTS "Users can read own notification summaries" ON public.notification_monthly_summaries;
+CREATE POLICY "Users can read own notification summaries" ON public.notification_monthly_summaries
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- El listado por usuario ordenado por fecha usa este índice en lugar de ordenar todo el historial
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created
+    ON public.notifications (user_id, created_at DESC);
+
+-- Candidatas a retención: solo las leídas
+CREATE INDEX IF NOT EXISTS idx_notifications_read_created
+    ON public.notifications (created_at)
+    WHERE is_read = true;
+
+-- Procesa un lote: resume, archiva (opcional) y borra en una sola sentencia.
+-- Devuelve filas y bytes (tamaño de las tuplas) liberados.
+CREATE OR REPLACE FUNCTION public.archive_read_notifications(
+    p_older_than timestamp with time zone,
+    p_limit integer DEFAULT 1000,
+    p_archive boolean DEFAULT true
+)
+RETURNS jsonb
+LANGUAGE sql
+AS $$
+    WITH batch AS (
+        SELECT id
+          FROM public.notifications
+         WHERE is_read = true
+           AND created_at < p_older_than
+         ORDER BY created_at
+         LIMIT p_limit
+         FOR UPDATE SKIP LOCKED
+    ),
+    moved AS (
+        DELETE FROM public.notifications n
+         USING batch
+         WHERE n.id = batch.id
+        RETURNING n.*, pg_column_size(n.*) AS row_bytes
+    ),
+    summarized AS (
+        INSERT INTO public.notification_monthly_summaries AS s (user_id, month, type, total)
+        SELECT user_id, date_trunc('month', created_at)::date, COALESCE(type, 'info'), count(*)
+          FROM moved
+         GROUP BY 1, 2, 3
+        ON CONFLICT (user_id, month, type)
+        DO UPDATE SET total = s.total + EXCLUDED.total, updated_at = now()
+    ),
+    archived AS (
+        INSERT INTO public.notifications_archive
+            (id, user_id, title, message, type, action_url, scheduled_for, sent_at, created_at)
+        SELECT id, user_id, title, message, type, action_url, scheduled_for, sent_at, created_at
+          FROM moved
+         WHERE p_archive
+        ON CONFLICT (id) DO NOTHING
+    )
+    SELECT jsonb_build_object(
+        'rows', count(*),
+        'bytes', COALESCE(sum(row_bytes), 0)
+    )
+      FROM moved;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.archive_read_notifications(timestamp with time zone, integer, boolean) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.archive_read_notifications(timestamp with time zone, integer, boolean) TO service_role;
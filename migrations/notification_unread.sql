@@ -0,0 +1,6 @@
+-- Contador de no leídas para el badge (/notifications/unread-count)
+-- Índice parcial: solo contiene las no leídas, así que el COUNT por usuario
+-- recorre pocas entradas aunque el historial de notificaciones crezca.
+CREATE INDEX IF NOT EXISTS idx_notifications_user_unread
+    ON public.notifications (user_id, scheduled_for)
+    WHERE is_read = false;
@@ -0,0 +1,97 @@
+-- Perfil de usuario en un solo viaje: obtener-o-crear y actualizar-o-crear.
+-- SECURITY INVOKER: se ejecutan con el JWT del usuario (RLS aplica) y usan
+-- auth.uid() / el email del token, nunca valores enviados por el cliente.
+
+-- Devuelve el perfil del usuario (por id, o por email para perfiles antiguos);
+-- si no existe, lo crea con los valores por defecto indicados.
+CREATE OR REPLACE FUNCTION public.get_or_create_profile(
+    p_full_name text DEFAULT '',
+    p_timezone text DEFAULT 'America/Panama'
+)
+RETURNS public.user_profiles
+LANGUAGE plpgsql
+SECURITY INVOKER
+SET search_path = public
+AS $$
+DECLARE
+    v_email text := auth.jwt() ->> 'email';
+    v_profile public.user_profiles;
+BEGIN
+    SELECT * INTO v_profile
+      FROM public.user_profiles
+     WHERE id = auth.uid() OR email = v_email
+     ORDER BY (id = auth.uid()) DESC
+     LIMIT 1;
+    IF FOUND THEN
+        RETURN v_profile;
+    END IF;
+
+    INSERT INTO public.user_profiles (id, email, full_name, timezone)
+    VALUES (auth.uid(), v_email, COALESCE(p_full_name, ''), COALESCE(p_timezone, 'America/Panama'))
+    ON CONFLICT DO NOTHING
+    RETURNING * INTO v_profile;
+
+    IF NOT FOUND THEN
+        -- Otra petición lo creó al mismo tiempo
+        SELECT * INTO v_profile FROM public.user_profiles WHERE id = auth.uid() OR email = v_email LIMIT 1;
+    END IF;
+    RETURN v_profile;
+END;
+$$;
+
+-- Aplica un parche parcial al perfil (solo las claves presentes en p_patch);
+-- si el perfil no existe, lo crea con p_defaults + p_patch.
+CREATE OR REPLACE FUNCTION public.upsert_profile(
+    p_patch jsonb,
+    p_defaults jsonb DEFAULT '{}'::jsonb
+)
+RETURNS public.user_profiles
+LANGUAGE plpgsql
+SECURITY INVOKER
+SET search_path = public
+AS $$
+DECLARE
+    v_email text := auth.jwt() ->> 'email';
+    v_profile public.user_profiles;
+    v_row jsonb := p_defaults || p_patch;
+BEGIN
+    UPDATE public.user_profiles p
+       SET full_name = CASE WHEN p_patch ? 'full_name' THEN p_patch ->> 'full_name' ELSE p.full_name END,
+           avatar_url = CASE WHEN p_patch ? 'avatar_url' THEN p_patch ->> 'avatar_url' ELSE p.avatar_url END,
+           timezone = CASE WHEN p_patch ? 'timezone' THEN p_patch ->> 'timezone' ELSE p.timezone END,
+           subscription_tier = CASE WHEN p_patch ? 'subscription_tier' THEN p_patch ->> 'subscription_tier' ELSE p.subscription_tier END,
+           preferences = CASE WHEN p_patch ? 'preferences' THEN NULLIF(p_patch -> 'preferences', 'null'::jsonb) ELSE p.preferences END,
+           updated_at = now()
+     WHERE p.id = (
+         SELECT id FROM public.user_profiles
+          WHERE id = auth.uid() OR email = v_email
+          ORDER BY (id = auth.uid()) DESC
+          LIMIT 1
+     )
+    RETURNING p.* INTO v_profile;
+    IF FOUND THEN
+        RETURN v_profile;
+    END IF;
+
+    INSERT INTO public.user_profiles (id, email, full_name, avatar_url, timezone, subscription_tier, preferences)
+    VALUES (
+        auth.uid(),
+        v_email,
+        COALESCE(v_row ->> 'full_name', ''),
+        v_row ->> 'avatar_url',
+        COALESCE(v_row ->> 'timezone', 'America/Panama'),
+        COALESCE(v_row ->> 'subscription_tier', 'free'),
+        COALESCE(NULLIF(v_row -> 'preferences', 'null'::jsonb), '{}'::jsonb)
+    )
+    -- Otra petición lo creó al mismo tiempo: se aplica el parche sobre esa fila
+    ON CONFLICT (id) DO UPDATE
+       SET full_name = CASE WHEN p_patch ? 'full_name' THEN EXCLUDED.full_name ELSE user_profiles.full_name END,
+           avatar_url = CASE WHEN p_patch ? 'avatar_url' THEN EXCLUDED.avatar_url ELSE user_profiles.avatar_url END,
+           timezone = CASE WHEN p_patch ? 'timezone' THEN EXCLUDED.timezone ELSE user_profiles.timezone END,
+           subscription_tier = CASE WHEN p_patch ? 'subscription_tier' THEN EXCLUDED.subscription_tier ELSE user_profiles.subscription_tier END,
+           preferences = CASE WHEN p_patch ? 'preferences' THEN NULLIF(p_patch -> 'preferences', 'null'::jsonb) ELSE user_profiles.preferences END,
+           updated_at = now()
+    RETURNING * INTO v_profile;
+    RETURN v_profile;
+END;
+$$;
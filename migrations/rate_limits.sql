@@ -0,0 +1,58 @@
+-- Token buckets compartidos entre workers para el limitador de los endpoints de auth
+-- (RATE_LIMIT_BACKEND=supabase). Tabla UNLOGGED: si se pierde tras un crash solo
+-- se reinician los contadores.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS public.rate_limit_buckets (
+    key text PRIMARY KEY,
+    tokens double precision NOT NULL,
+    updated_at timestamp with time zone NOT NULL DEFAULT clock_timestamp()
+);
+
+ALTER TABLE public.rate_limit_buckets ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_updated_at
+    ON public.rate_limit_buckets (updated_at);
+
+-- Consume un token del bucket p_key (capacidad p_capacity, recarga completa en
+-- p_period_seconds). Devuelve 0 si se permite o los segundos hasta el próximo token.
+CREATE OR REPLACE FUNCTION public.rate_limit_take(
+    p_key text,
+    p_capacity integer,
+    p_period_seconds double precision
+)
+RETURNS double precision
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_rate double precision := p_capacity / p_period_seconds;
+    v_tokens double precision;
+BEGIN
+    -- Recarga y consumo en una sola sentencia; la fila queda bloqueada hasta el final
+    INSERT INTO public.rate_limit_buckets AS b (key, tokens, updated_at)
+    VALUES (p_key, p_capacity - 1, clock_timestamp())
+    ON CONFLICT (key) DO UPDATE
+        SET tokens = LEAST(
+                p_capacity,
+                b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * v_rate
+            ) - 1,
+            updated_at = clock_timestamp()
+    RETURNING tokens INTO v_tokens;
+
+    -- Limpieza ocasional de buckets sin uso para acotar el tamaño de la tabla
+    IF random() < 0.001 THEN
+        DELETE FROM public.rate_limit_buckets
+        WHERE updated_at < clock_timestamp() - interval '1 day';
+    END IF;
+
+    IF v_tokens >= 0 THEN
+        RETURN 0;
+    END IF;
+
+    -- Sin tokens: se devuelve el consumido
+    UPDATE public.rate_limit_buckets SET tokens = v_tokens + 1 WHERE key = p_key;
+    RETURN -v_tokens / v_rate;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.rate_limit_take(text, integer, double precision) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.rate_limit_take(text, integer, double precision) TO service_role;
@@ -0,0 +1,109 @@
+-- Recordatorios automáticos a partir de calendar_events.reminder_minutes y tasks.due_date
+-- Los triggers encolan solo las filas que cambian; el materializador (reminders.py)
+-- recalcula los recordatorios de esas fuentes sin recorrer todos los usuarios.
+
+-- Origen de cada notificación generada (NULL para las creadas a mano)
+ALTER TABLE public.notifications
+    ADD COLUMN IF NOT EXISTS source_type text,
+    ADD COLUMN IF NOT EXISTS source_id uuid,
+    ADD COLUMN IF NOT EXISTS occurrence_at timestamp with time zone;
+
+-- Un recordatorio por fuente y hora de envío (las notificaciones manuales tienen
+-- source_id NULL y no chocan entre sí). No es parcial para poder usar ON CONFLICT.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_source_schedule
+    ON public.notifications (source_type, source_id, scheduled_for);
+
+-- Cola de fuentes modificadas pendientes de materializar
+CREATE TABLE IF NOT EXISTS public.reminder_queue (
+    source_type text NOT NULL,
+    source_id uuid NOT NULL,
+    user_id uuid NOT NULL,
+    enqueued_at timestamp with time zone NOT NULL DEFAULT now(),
+    CONSTRAINT reminder_queue_pkey PRIMARY KEY (source_type, source_id)
+);
+
+ALTER TABLE public.reminder_queue ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION public.enqueue_reminder_source()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO public.reminder_queue (source_type, source_id, user_id)
+        VALUES (TG_ARGV[0], OLD.id, OLD.user_id)
+        ON CONFLICT (source_type, source_id) DO UPDATE SET enqueued_at = now();
+    ELSE
+        INSERT INTO public.reminder_queue (source_type, source_id, user_id)
+        VALUES (TG_ARGV[0], NEW.id, NEW.user_id)
+        ON CONFLICT (source_type, source_id) DO UPDATE SET enqueued_at = now();
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- Solo las columnas que afectan a los recordatorios disparan el trigger
+DROP TRIGGER IF EXISTS trg_calendar_events_reminders ON public.calendar_events;
+CREATE TRIGGER trg_calendar_events_reminders
+    AFTER INSERT OR DELETE OR UPDATE OF title, start_datetime, end_datetime, location,
+        is_recurring, recurrence_pattern, reminder_minutes
+    ON public.calendar_events
+    FOR EACH ROW EXECUTE FUNCTION public.enqueue_reminder_source('event');
+
+DROP TRIGGER IF EXISTS trg_tasks_reminders ON public.tasks;
+CREATE TRIGGER trg_tasks_reminders
+    AFTER INSERT OR DELETE OR UPDATE OF title, due_date, status, completed_at
+    ON public.tasks
+    FOR EACH ROW EXECUTE FUNCTION public.enqueue_reminder_source('task');
+
+-- Toma un lote de la cola (varios workers pueden llamarla a la vez)
+CREATE OR REPLACE FUNCTION public.claim_reminder_changes(p_limit integer DEFAULT 500)
+RETURNS SETOF public.reminder_queue
+LANGUAGE sql
+AS $$
+    DELETE FROM public.reminder_queue q
+     WHERE (q.source_type, q.source_id) IN (
+         SELECT source_type, source_id
+           FROM public.reminder_queue
+          ORDER BY enqueued_at
+          LIMIT p_limit
+          FOR UPDATE SKIP LOCKED
+     )
+    RETURNING q.*;
+$$;
+
+-- Los eventos recurrentes se vuelven a encolar periódicamente para extender el horizonte
+CREATE OR REPLACE FUNCTION public.enqueue_recurring_reminders()
+RETURNS integer
+LANGUAGE sql
+AS $$
+    WITH queued AS (
+        INSERT INTO public.reminder_queue (source_type, source_id, user_id)
+        SELECT 'event', id, user_id
+          FROM public.calendar_events
+         WHERE is_recurring AND reminder_minutes IS NOT NULL
+        ON CONFLICT (source_type, source_id) DO NOTHING
+        RETURNING 1
+    )
+    SELECT count(*)::integer FROM queued;
+$$;
+
+-- Carga inicial: eventos y tareas futuros existentes
+INSERT INTO public.reminder_queue (source_type, source_id, user_id)
+SELECT 'event', id, user_id
+  FROM public.calendar_events
+ WHERE reminder_minutes IS NOT NULL AND (is_recurring OR start_datetime > now())
+ON CONFLICT DO NOTHING;
+
+INSERT INTO public.reminder_queue (source_type, source_id, user_id)
+SELECT 'task', id, user_id
+  FROM public.tasks
+ WHERE due_date > now() AND COALESCE(status, '') <> 'completed'
+ON CONFLICT DO NOTHING;
+
+REVOKE EXECUTE ON FUNCTION public.claim_reminder_changes(integer) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.enqueue_recurring_reminders() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.claim_reminder_changes(integer) TO service_role;
+GRANT EXECUTE ON FUNCTION public.enqueue_recurring_reminders() TO service_role;
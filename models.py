@@ -1,10 +1,12 @@
 # models.py
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime, date
 from uuid import UUID
 
+from batch import BATCH_MAX_ITEMS
+
 # --------- User Models ---------
 
 class UserProfile(BaseModel):
@@ -138,6 +140,70 @@ class CalendarEvent(CalendarEventBase):
         from_attributes = True
 
 
+class CalendarConflict(BaseModel):
+    first: CalendarEvent
+    second: CalendarEvent
+    overlap_start: datetime
+    overlap_end: datetime
+
+
+class TimeInterval(BaseModel):
+    start: datetime
+    end: datetime
+
+
+class FreeBusyResponse(BaseModel):
+    window_start: datetime
+    window_end: datetime
+    busy: List[TimeInterval] = []
+    free: List[TimeInterval] = []
+
+
+class StudySlot(BaseModel):
+    task_id: UUID
+    title: Optional[str] = None
+    due_date: Optional[datetime] = None
+    priority: Optional[int] = None
+    start: datetime
+    end: datetime
+
+
+class UnscheduledTask(BaseModel):
+    task_id: UUID
+    title: Optional[str] = None
+    due_date: Optional[datetime] = None
+    remaining_minutes: int
+
+
+class StudySlotsResponse(BaseModel):
+    window_start: datetime
+    window_end: datetime
+    slots: List[StudySlot] = []
+    unscheduled: List[UnscheduledTask] = []
+
+
+class CalendarFeedToken(BaseModel):
+    token: str
+    url: str
+
+
+class CalendarImportRow(BaseModel):
+    row: int
+    status: str
+    uid: Optional[str] = None
+    event_id: Optional[UUID] = None
+    error: Optional[str] = None
+
+
+class CalendarImportReport(BaseModel):
+    created: int = 0
+    duplicate: int = 0
+    invalid: int = 0
+    failed: int = 0
+    skipped: int = 0
+    rows: List[CalendarImportRow] = []
+
+
 # --------- Note Models ---------
 
 class NoteBase(BaseModel):
@@ -184,6 +250,10 @@ class SyncRequest(BaseModel):
     device_id: str
     last_sync: Optional[datetime] = None
     tables: List[str] = []
+    # Resume from the cursors stored server-side for this device (ignored when last_sync is sent)
+    resume: bool = False
+    # `cursors` of the last pull response the device has applied; stored before resuming
+    ack: Dict[str, datetime] = {}
 
 
 class SyncResponse(BaseModel):
@@ -191,6 +261,13 @@ class SyncResponse(BaseModel):
     last_sync: datetime
     data: Dict[str, List[Dict[str, Any]]]
     conflicts: List[Dict[str, Any]] = []
+    cursors: Dict[str, datetime] = {}
+
+
+class SyncCursor(BaseModel):
+    table_name: str
+    cursor: datetime
+    updated_at: datetime
 
 
 # --------- CategoryGrade Models ---------
@@ -311,12 +388,27 @@ class Notification(NotificationBase):
     user_id: UUID
     is_read: bool = False
     sent_at: Optional[datetime] = None
+    source_type: Optional[str] = None  # "event" / "task" for generated reminders
+    source_id: Optional[UUID] = None
+    occurrence_at: Optional[datetime] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+class NotificationMarkRead(BaseModel):
+    ids: List[UUID] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+
+class NotificationBulkResult(BaseModel):
+    updated: int
+
+
+class NotificationUnreadCount(BaseModel):
+    unread: int
+
+
 # --------- User Device Models ---------
 
 class UserDeviceBase(BaseModel):
@@ -430,3 +522,79 @@ class CalendarGradesLinked(BaseModel):
     graded_at: Optional[datetime]
     category_id: Optional[UUID]
     grade_value: Optional[float]
+
+
+# --------- Batch Models ---------
+
+class BatchRequestBase(BaseModel):
+    atomic: bool = False
+
+    @model_validator(mode="after")
+    def check_batch_size(self):
+        items = sum(len(getattr(self, name)) for name in ("creates", "updates", "deletes"))
+        if items == 0:
+            raise ValueError("Batch must contain at least one operation")
+        if items > BATCH_MAX_ITEMS:
+            raise ValueError(f"Batch cannot contain more than {BATCH_MAX_ITEMS} operations")
+        ids = [str(patch.id) for patch in self.updates] + [str(row_id) for row_id in self.deletes]
+        if len(ids) != len(set(ids)):
+            raise ValueError("Each id can only appear once per batch")
+        return self
+
+
+class ClassBatchUpdate(ClassUpdate):
+    id: UUID
+
+
+class ClassBatchRequest(BatchRequestBase):
+    creates: List[ClassCreate] = []
+    updates: List[ClassBatchUpdate] = []
+    deletes: List[UUID] = []
+
+
+class CalendarEventBatchUpdate(CalendarEventUpdate):
+    id: UUID
+
+
+class CalendarEventBatchRequest(BatchRequestBase):
+    creates: List[CalendarEventCreate] = []
+    updates: List[CalendarEventBatchUpdate] = []
+    deletes: List[UUID] = []
+
+
+class CategoryGradeBatchUpdate(CategoryGradeUpdate):
+    id: UUID
+
+
+class CategoryGradeBatchRequest(BatchRequestBase):
+    creates: List[CategoryGradeCreate] = []
+    updates: List[CategoryGradeBatchUpdate] = []
+    deletes: List[UUID] = []
+
+
+class GradeBatchUpdate(GradeUpdate):
+    id: UUID
+
+
+class GradeBatchRequest(BatchRequestBase):
+    creates: List[GradeCreate] = []
+    updates: List[GradeBatchUpdate] = []
+    deletes: List[UUID] = []
+
+
+class BatchItemResult(BaseModel):
+    op: str
+    index: int
+    id: Optional[UUID] = None
+    status: str
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    atomic: bool
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    failed: int = 0
+    results: List[BatchItemResult] = []
@@ -0,0 +1,432 @@
+# notification_dispatcher.py
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import socket
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from calendar_utils import parse_datetime
+from database import get_supabase_service
+from events import bus
+
+logger = logging.getLogger(__name__)
+
+
+# --------- Channels ---------
+
+class NotificationChannel:
+    """Delivery channel. `send` raises to signal that the notification should be retried."""
+
+    name = "base"
+
+    async def send(self, notification: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+
+class LogChannel(NotificationChannel):
+    """Writes deliveries to the application log (default channel)"""
+
+    name = "log"
+
+    async def send(self, notification: Dict[str, Any]) -> None:
+        logger.info("Notification %s delivered to user %s: %s", notification["id"], notification["user_id"], notification["title"])
+
+
+class FakeChannel(NotificationChannel):
+    """Keeps the last deliveries in memory; meant for local development and tests"""
+
+    name = "fake"
+
+    def __init__(self, maxlen: int = 10000, fail_ids: Optional[set] = None):
+        self.sent: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+        self.fail_ids = fail_ids or set()
+
+    async def send(self, notification: Dict[str, Any]) -> None:
+        if notification["id"] in self.fail_ids:
+            raise RuntimeError("fake channel failure")
+        self.sent.append(notification)
+
+
+class RealtimeChannel(NotificationChannel):
+    """Pushes the notification to the user's open SSE/WebSocket connections"""
+
+    name = "realtime"
+
+    async def send(self, notification: Dict[str, Any]) -> None:
+        bus.publish(notification["user_id"], {"type": "notification", "notification": notification})
+
+
+CHANNELS = {
+    LogChannel.name: LogChannel,
+    FakeChannel.name: FakeChannel,
+    RealtimeChannel.name: RealtimeChannel,
+}
+
+
+def register_channel(channel_class) -> None:
+    """Make a channel available through NOTIFICATION_CHANNELS"""
+    CHANNELS[channel_class.name] = channel_class
+
+
+# --------- Digests ---------
+
+def group_for_digest(notifications: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Group generated reminders (those with a `source_type`) that one user has
+    due in the same minute; every other notification is sent on its own.
+    """
+    groups: Dict[Tuple[str, datetime], List[Dict[str, Any]]] = {}
+    singles = []
+    for notification in notifications:
+        if notification.get("source_type"):
+            minute = parse_datetime(notification["scheduled_for"]).replace(second=0, microsecond=0)
+            groups.setdefault((notification["user_id"], minute), []).append(notification)
+        else:
+            singles.append([notification])
+    return singles + list(groups.values())
+
+
+def build_digest(group: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Single message summarising several reminders for one user"""
+    first = group[0]
+    return {
+        "id": first["id"],
+        "user_id": first["user_id"],
+        "title": f"{len(group)} reminders",
+        "message": "\n".join(notification["message"] for notification in group),
+        "type": "digest",
+        "scheduled_for": first["scheduled_for"],
+        "digest_ids": [notification["id"] for notification in group],
+    }
+
+
+# --------- Dispatcher ---------
+
+class NotificationDispatcher:
+    """
+    In-process dispatcher for `notifications.scheduled_for`.
+
+    A loader claims due (or soon due) notifications in batches through the
+    `claim_due_notifications` RPC, which leases rows with FOR UPDATE SKIP
+    LOCKED so several workers can share the load. Claimed rows wait in a
+    bounded min-heap keyed by `scheduled_for`; a timer pops them when due,
+    sends them through every configured channel with bounded concurrency and
+    stamps `sent_at` in bulk. Leases are renewed while rows wait in the heap.
+    Reminders one user has due in the same minute go out as a single digest.
+    Failed sends record the channels that did deliver, release their lease
+    and are retried on the remaining channels by a later claim until
+    `max_attempts` is reached.
+    """
+
+    def __init__(
+        self,
+        channels: List[NotificationChannel],
+        supabase_factory=get_supabase_service,
+        batch_size: int = 500,
+        max_pending: int = 5000,
+        lookahead_seconds: float = 60,
+        lease_seconds: int = 300,
+        poll_interval: float = 5,
+        max_attempts: int = 5,
+        send_concurrency: int = 50,
+        flush_size: int = 200,
+        flush_interval: float = 1,
+    ):
+        self.channels = channels
+        self.supabase_factory = supabase_factory
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.lookahead = timedelta(seconds=lookahead_seconds)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._heap: List[Tuple[datetime, int, Dict[str, Any]]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._send_slots = asyncio.Semaphore(send_concurrency)
+        self._sent_ids: List[str] = []
+        self._in_flight: set = set()
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+        self.stats = {"claimed": 0, "sent": 0, "failed": 0, "digests": 0, "lost_leases": 0}
+
+    @property
+    def pending(self) -> int:
+        return len(self._heap)
+
+    # --- database calls (sync client, run in the threadpool) ---
+
+    def _claim(self, limit: int) -> List[Dict[str, Any]]:
+        horizon = datetime.now(timezone.utc) + self.lookahead
+        response = self.supabase_factory().rpc("claim_due_notifications", {
+            "p_worker": self.worker_id,
+            "p_horizon": horizon.isoformat(),
+            "p_limit": limit,
+            "p_lease_seconds": self.lease_seconds,
+            "p_max_attempts": self.max_attempts,
+        }).execute()
+        return response.data or []
+
+    def _mark_sent(self, ids: List[str]) -> int:
+        """Returns how many rows were still leased by this worker"""
+        response = self.supabase_factory().table("notifications").update({
+            "sent_at": datetime.now(timezone.utc).isoformat(),
+            "claimed_by": None,
+            "claimed_until": None,
+            "last_error": None,
+        }).in_("id", ids).eq("claimed_by", self.worker_id).execute()
+        return len(response.data or [])
+
+    def _renew(self) -> int:
+        until = datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+        response = self.supabase_factory().table("notifications").update({
+            "claimed_until": until.isoformat(),
+        }).eq("claimed_by", self.worker_id).is_("sent_at", "null").execute()
+        return len(response.data or [])
+
+    def _release(self, notification: Dict[str, Any], error: str, delivered: List[str]) -> None:
+        # Keep the lease for a growing back-off so the retry is not immediate
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=30 * max(1, notification.get("attempts") or 1))
+        self.supabase_factory().table("notifications").update({
+            "claimed_by": None,
+            "claimed_until": retry_at.isoformat(),
+            "last_error": error[:500],
+            "delivered_channels": delivered,
+        }).eq("id", notification["id"]).eq("claimed_by", self.worker_id).execute()
+
+    def _unclaim(self, ids: List[str]) -> None:
+        # Not sent yet: the claim's attempt is given back and there is no back-off
+        self.supabase_factory().rpc("release_notifications", {
+            "p_worker": self.worker_id,
+            "p_ids": ids,
+        }).execute()
+
+    # --- scheduling ---
+
+    def schedule(self, notification: Dict[str, Any]) -> bool:
+        """Queue a claimed notification; returns False when the heap is full"""
+        if len(self._heap) >= self.max_pending:
+            return False
+        due = parse_datetime(notification["scheduled_for"])
+        heapq.heappush(self._heap, (due, next(self._counter), notification))
+        self._wakeup.set()
+        return True
+
+    async def load_once(self) -> int:
+        """Claim one batch of due notifications into the heap"""
+        room = min(self.batch_size, self.max_pending - len(self._heap))
+        if room <= 0:
+            return 0
+        claimed = await run_in_threadpool(self._claim, room)
+        for notification in claimed:
+            self.schedule(notification)
+        self.stats["claimed"] += len(claimed)
+        return len(claimed)
+
+    async def _loader(self) -> None:
+        while self._running:
+            try:
+                claimed = await self.load_once()
+            except Exception as exc:
+                logger.error("Notification claim failed: %s", exc)
+                claimed = 0
+            # A full batch means there is a backlog: keep claiming right away
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def _timer(self) -> None:
+        while self._running:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = (self._heap[0][0] - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.dispatch_due()
+
+    async def dispatch_due(self) -> int:
+        """Send every queued notification whose time has come"""
+        now = datetime.now(timezone.utc)
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        if due:
+            await asyncio.gather(*(self._deliver(group) for group in group_for_digest(due)))
+        return len(due)
+
+    async def _deliver(self, group: List[Dict[str, Any]]) -> None:
+        ids = [notification["id"] for notification in group]
+        delivered = {notification["id"]: set(notification.get("delivered_channels") or []) for notification in group}
+        errors = []
+        async with self._send_slots:
+            self._in_flight.update(ids)
+            try:
+                for channel in self.channels:
+                    # A retry skips the channels that already delivered
+                    todo = [notification for notification in group if channel.name not in delivered[notification["id"]]]
+                    if not todo:
+                        continue
+                    try:
+                        await channel.send(todo[0] if len(todo) == 1 else build_digest(todo))
+                    except Exception as exc:
+                        errors.append(f"{channel.name}: {exc}")
+                        continue
+                    for notification in todo:
+                        delivered[notification["id"]].add(channel.name)
+
+                names = {channel.name for channel in self.channels}
+                failed = [notification for notification in group if not names <= delivered[notification["id"]]]
+                sent = [notification["id"] for notification in group if names <= delivered[notification["id"]]]
+                self._sent_ids.extend(sent)
+                self.stats["sent"] += len(sent)
+                if len(group) > 1 and not failed:
+                    self.stats["digests"] += 1
+                if failed:
+                    error = "; ".join(errors)
+                    self.stats["failed"] += len(failed)
+                    logger.warning("Notification %s failed: %s", failed[0]["id"], error)
+                for notification in failed:
+                    try:
+                        await run_in_threadpool(self._release, notification, error, sorted(delivered[notification["id"]]))
+                    except Exception as release_error:
+                        logger.error("Could not release notification %s: %s", notification["id"], release_error)
+            finally:
+                self._in_flight.difference_update(ids)
+        if len(self._sent_ids) >= self.flush_size:
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Stamp `sent_at` for delivered notifications in bulk"""
+        flushed = 0
+        while self._sent_ids:
+            ids, self._sent_ids = self._sent_ids[:self.flush_size], self._sent_ids[self.flush_size:]
+            try:
+                stamped = await run_in_threadpool(self._mark_sent, ids)
+                flushed += len(ids)
+            except Exception as exc:
+                # Leases expire, so at worst these are delivered again later
+                logger.error("Could not stamp sent_at for %d notifications: %s", len(ids), exc)
+                continue
+            if stamped < len(ids):
+                self.stats["lost_leases"] += len(ids) - stamped
+                logger.warning("%d delivered notifications were no longer leased by %s and may be sent again", len(ids) - stamped, self.worker_id)
+        return flushed
+
+    async def _flusher(self) -> None:
+        while self._running:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _renewer(self) -> None:
+        # Rows can wait in the heap, or for their sent_at stamp, longer than one lease
+        while self._running:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await run_in_threadpool(self._renew)
+            except Exception as exc:
+                logger.error("Could not renew notification leases: %s", exc)
+
+    # --- lifecycle ---
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._tasks = [
+            asyncio.create_task(self._loader()),
+            asyncio.create_task(self._timer()),
+            asyncio.create_task(self._flusher()),
+            asyncio.create_task(self._renewer()),
+        ]
+        logger.info("Notification dispatcher %s started", self.worker_id)
+
+    async def stop(self) -> int:
+        """
+        Stop claiming, let deliveries in flight finish, flush pending `sent_at`
+        stamps and hand queued notifications back for other workers to claim.
+        Returns how many could not be drained; their leases expire, so they are
+        retried later.
+        """
+        self._running = False
+        self._wakeup.set()
+        if self._tasks:
+            loader, timer, flusher, renewer = self._tasks
+            loader.cancel()
+            flusher.cancel()
+            renewer.cancel()
+            # The timer leaves its loop once the deliveries in flight are done
+            await asyncio.gather(loader, timer, flusher, renewer, return_exceptions=True)
+            self._tasks = []
+
+        stamps = len(self._sent_ids)
+        undrained = stamps - await self.flush()
+        ids = [entry[2]["id"] for entry in self._heap]
+        self._heap.clear()
+        for start in range(0, len(ids), self.flush_size):
+            chunk = ids[start:start + self.flush_size]
+            try:
+                await run_in_threadpool(self._unclaim, chunk)
+            except Exception as exc:
+                undrained += len(chunk)
+                logger.error("Could not release %d queued notifications: %s", len(chunk), exc)
+        logger.info("Notification dispatcher %s stopped (%d queued released)", self.worker_id, len(ids))
+        return undrained
+
+
+def build_channels(names: str) -> List[NotificationChannel]:
+    channels = []
+    for name in filter(None, (part.strip() for part in names.split(","))):
+        if name not in CHANNELS:
+            logger.warning("Unknown notification channel: %s", name)
+            continue
+        channels.append(CHANNELS[name]())
+    return channels
+
+
+dispatcher: Optional[NotificationDispatcher] = None
+
+
+def get_dispatcher() -> Optional[NotificationDispatcher]:
+    return dispatcher
+
+
+async def start_dispatcher() -> Optional[NotificationDispatcher]:
+    """Start the process-wide dispatcher unless NOTIFICATION_DISPATCHER_ENABLED=false"""
+    global dispatcher
+    if os.getenv("NOTIFICATION_DISPATCHER_ENABLED", "true").lower() != "true":
+        return None
+    dispatcher = NotificationDispatcher(
+        channels=build_channels(os.getenv("NOTIFICATION_CHANNELS", "log,realtime")),
+        batch_size=int(os.getenv("NOTIFICATION_DISPATCH_BATCH", "500")),
+        max_pending=int(os.getenv("NOTIFICATION_DISPATCH_MAX_PENDING", "5000")),
+        poll_interval=float(os.getenv("NOTIFICATION_DISPATCH_POLL_SECONDS", "5")),
+    )
+    dispatcher.start()
+    return dispatcher
+
+
+async def stop_dispatcher() -> int:
+    """Stop the process-wide dispatcher; returns the notifications it could not drain"""
+    global dispatcher
+    undrained = 0
+    if dispatcher is not None:
+        undrained = await dispatcher.stop()
+        dispatcher = None
+    return undrained
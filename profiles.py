@@ -0,0 +1,56 @@
+# profiles.py
+import os
+from typing import Any, Dict
+
+from cache import TTLCache
+
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "60"))
+# Same default as the models and migrations/profile_upsert.sql
+DEFAULT_TIMEZONE = "America/Panama"
+
+# Profiles keyed by user id; every write through the API replaces or drops the entry
+_profile_cache = TTLCache(maxsize=int(os.getenv("PROFILE_CACHE_SIZE", "10000")), ttl=PROFILE_CACHE_TTL, name="profiles")
+
+
+def _default_full_name(current_user: Dict[str, Any]) -> str:
+    return current_user.get("user_metadata", {}).get("full_name", "")
+
+
+def get_or_create_profile(supabase, current_user: Dict[str, Any], timezone: str = DEFAULT_TIMEZONE) -> Dict[str, Any]:
+    """Cached profile lookup; a miss costs one `get_or_create_profile` RPC (see migrations/profile_upsert.sql)"""
+    profile = _profile_cache.get(current_user["user_id"])
+    if profile is None:
+        profile = supabase.rpc("get_or_create_profile", {
+            "p_full_name": _default_full_name(current_user),
+            "p_timezone": timezone,
+        }).execute().data
+        if profile:
+            _profile_cache.set(current_user["user_id"], profile)
+    return profile
+
+
+def update_or_create_profile(
+    supabase,
+    current_user: Dict[str, Any],
+    patch: Dict[str, Any],
+    timezone: str = DEFAULT_TIMEZONE
+) -> Dict[str, Any]:
+    """Apply a partial update, creating the profile if needed, in one `upsert_profile` RPC"""
+    profile = supabase.rpc("upsert_profile", {
+        "p_patch": patch,
+        "p_defaults": {"full_name": _default_full_name(current_user), "timezone": timezone},
+    }).execute().data
+    if profile:
+        _profile_cache.replace(current_user["user_id"], profile)
+    else:
+        _profile_cache.pop(current_user["user_id"])
+    return profile
+
+
+def store_profile(user_id: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+    _profile_cache.replace(user_id, profile)
+    return profile
+
+
+def invalidate_profile(user_id: str) -> None:
+    _profile_cache.pop(user_id)
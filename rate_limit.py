@@ -0,0 +1,165 @@
+# rate_limit.py
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+
+from database import get_supabase_service
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# "auto": in memory for a single process, shared through Supabase under several workers
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "auto").lower()
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Worker processes serving the app (set by gunicorn.conf.py)
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# Number of trusted reverse proxies appending to X-Forwarded-For: 1 behind Railway's
+# edge proxy (production), 0 when clients reach uvicorn directly. With too few hops
+# every client shares the proxy's address; with too many the key is client-controlled
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1"))
+
+# "<capacity>/<period seconds>": bursts of `capacity`, refilled evenly over the period
+DEFAULT_RULES = {
+    "signin:ip": "20/60",
+    "signin:email": "5/60",
+    "signup:ip": "10/3600",
+    "signup:email": "3/3600",
+    "reset-password:ip": "10/3600",
+    "reset-password:email": "3/3600",
+    "resend-confirmation:ip": "10/3600",
+    "resend-confirmation:email": "3/3600",
+}
+
+
+def parse_rule(value: str) -> Tuple[int, float]:
+    capacity, period = value.split("/")
+    return int(capacity), float(period)
+
+
+def load_rules() -> Dict[str, Tuple[int, float]]:
+    """DEFAULT_RULES, each overridable with RATE_LIMIT_<ACTION>_<IP|EMAIL>=capacity/period"""
+    rules = {}
+    for name, default in DEFAULT_RULES.items():
+        env_name = "RATE_LIMIT_" + name.replace("-", "_").replace(":", "_").upper()
+        rules[name] = parse_rule(os.getenv(env_name, default))
+    return rules
+
+
+class MemoryBackend:
+    """
+    In-process token buckets.
+
+    Each key stores only (tokens, last update); a take is one dict lookup
+    and one insert. At most `maxsize` keys are kept, least recently used
+    first out, so a flood of distinct IPs or emails cannot grow memory.
+    An evicted key simply starts again with a full bucket.
+    """
+
+    def __init__(self, maxsize: int = RATE_LIMIT_MAX_KEYS):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, period: float) -> float:
+        """Consume one token; return 0 when allowed, else seconds until the next token"""
+        rate = capacity / period
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SupabaseBackend:
+    """Token buckets shared by all workers through the `rate_limit_take` RPC"""
+
+    def __init__(self, supabase_factory=get_supabase_service):
+        self.supabase_factory = supabase_factory
+
+    def take(self, key: str, capacity: int, period: float) -> float:
+        response = self.supabase_factory().rpc("rate_limit_take", {
+            "p_key": key,
+            "p_capacity": capacity,
+            "p_period_seconds": period,
+        }).execute()
+        return float(response.data or 0)
+
+
+class RateLimiter:
+    """
+    Per-action limits keyed by client IP and by email.
+
+    The local buckets are always checked first, so a burst hitting one
+    worker is rejected without any outbound call; with a shared backend the
+    request must then also pass the cluster-wide bucket. If the shared
+    backend fails, the local decision stands.
+    """
+
+    def __init__(self, rules: Optional[Dict[str, Tuple[int, float]]] = None, shared=None):
+        self.rules = rules if rules is not None else load_rules()
+        self.local = MemoryBackend()
+        self.shared = shared
+
+    async def _take(self, rule: str, value: str) -> float:
+        capacity, period = self.rules[rule]
+        key = f"{rule}:{value}"
+        retry_after = self.local.take(key, capacity, period)
+        if retry_after or self.shared is None:
+            return retry_after
+        try:
+            return await run_in_threadpool(self.shared.take, key, capacity, period)
+        except Exception as exc:
+            logger.warning("Shared rate limit backend failed, using local limits: %s", exc)
+            return 0.0
+
+    async def check(self, request: Request, action: str, email: Optional[str] = None) -> None:
+        """Raise 429 (with Retry-After) when the client IP or the email is over the `action` limit"""
+        if not RATE_LIMIT_ENABLED:
+            return
+        retry_after = await self._take(f"{action}:ip", client_ip(request))
+        if not retry_after and email:
+            retry_after = await self._take(f"{action}:email", email.strip().lower())
+        if retry_after:
+            seconds = max(1, int(retry_after + 0.999))
+            logger.warning("Rate limited %s from %s", action, client_ip(request))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Demasiados intentos. Intenta de nuevo en {seconds} segundos.",
+                headers={"Retry-After": str(seconds)},
+            )
+
+
+def client_ip(request: Request, proxy_hops: Optional[int] = None) -> str:
+    """Address of the client as seen by the first of our `proxy_hops` proxies"""
+    proxy_hops = RATE_LIMIT_PROXY_HOPS if proxy_hops is None else proxy_hops
+    if proxy_hops > 0:
+        forwarded = [part.strip() for part in request.headers.get("x-forwarded-for", "").split(",") if part.strip()]
+        if forwarded:
+            # Entries left of the ones added by our own proxies are client-controlled
+            return forwarded[-min(proxy_hops, len(forwarded))]
+    return request.client.host if request.client else "unknown"
+
+
+def shared_backend() -> bool:
+    """Per-process buckets would let each worker grant the full quota"""
+    return RATE_LIMIT_BACKEND == "supabase" or (RATE_LIMIT_BACKEND == "auto" and WEB_CONCURRENCY > 1)
+
+
+limiter = RateLimiter(shared=SupabaseBackend() if shared_backend() else None)
@@ -0,0 +1,297 @@
+# reminders.py
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from calendar_utils import expand_occurrences, parse_datetime
+from database import get_supabase_service
+
+logger = logging.getLogger(__name__)
+
+EVENT_COLUMNS = "id,user_id,title,start_datetime,end_datetime,location,is_recurring,recurrence_pattern,reminder_minutes"
+TASK_COLUMNS = "id,user_id,title,due_date,status,completed_at"
+# Query strings stay short enough for PostgREST when filtering by many ids
+ID_CHUNK_SIZE = 200
+
+# (source_type, source_id, scheduled_for) identifies one reminder
+ReminderKey = Tuple[str, str, datetime]
+
+
+def _minute(value: datetime) -> datetime:
+    # Reminders fire on minute boundaries so that the dispatcher can coalesce
+    # everything one user has due in the same minute into a digest
+    return value.replace(second=0, microsecond=0)
+
+
+def _humanize_minutes(minutes: int) -> str:
+    if minutes <= 0:
+        return "now"
+    if minutes % 1440 == 0:
+        days = minutes // 1440
+        return f"in {days} day{'s' if days != 1 else ''}"
+    if minutes % 60 == 0:
+        hours = minutes // 60
+        return f"in {hours} hour{'s' if hours != 1 else ''}"
+    return f"in {minutes} minute{'s' if minutes != 1 else ''}"
+
+
+def event_reminders(event: Dict[str, Any], window_start: datetime, window_end: datetime) -> List[Dict[str, Any]]:
+    """Reminder notifications for every occurrence of an event firing inside the window"""
+    minutes = event.get("reminder_minutes")
+    if minutes is None or minutes < 0:
+        return []
+    offset = timedelta(minutes=minutes)
+    where = f" at {event['location']}" if event.get("location") else ""
+
+    reminders = []
+    for start, _ in expand_occurrences(event, window_start + offset, window_end + offset):
+        fire_at = _minute(start - offset)
+        if not window_start <= fire_at < window_end:
+            continue
+        reminders.append({
+            "user_id": event["user_id"],
+            "title": f"Reminder: {event['title']}",
+            "message": f"{event['title']} starts {_humanize_minutes(minutes)}{where}",
+            "type": "reminder",
+            "scheduled_for": fire_at.isoformat(),
+            "source_type": "event",
+            "source_id": event["id"],
+            "occurrence_at": start.isoformat(),
+        })
+    return reminders
+
+
+def task_reminders(
+    task: Dict[str, Any],
+    window_start: datetime,
+    window_end: datetime,
+    offsets: Iterable[int]
+) -> List[Dict[str, Any]]:
+    """Reminder notifications before a pending task's due date"""
+    if not task.get("due_date") or task.get("completed_at") or task.get("status") == "completed":
+        return []
+    due = parse_datetime(task["due_date"])
+
+    reminders = []
+    for minutes in offsets:
+        fire_at = _minute(due - timedelta(minutes=minutes))
+        if not window_start <= fire_at < window_end:
+            continue
+        reminders.append({
+            "user_id": task["user_id"],
+            "title": f"Task due: {task['title']}",
+            "message": f"{task['title']} is due {_humanize_minutes(minutes)}",
+            "type": "task_due",
+            "scheduled_for": fire_at.isoformat(),
+            "source_type": "task",
+            "source_id": task["id"],
+            "occurrence_at": due.isoformat(),
+        })
+    return reminders
+
+
+def _key(row: Dict[str, Any]) -> ReminderKey:
+    return row["source_type"], str(row["source_id"]), parse_datetime(row["scheduled_for"])
+
+
+def _chunks(values: List[str], size: int = ID_CHUNK_SIZE):
+    for index in range(0, len(values), size):
+        yield values[index:index + size]
+
+
+class ReminderMaterializer:
+    """
+    Derives reminder notifications from calendar events and task due dates.
+
+    Database triggers push every changed event/task into `reminder_queue`
+    (see migrations/reminders.sql). The materializer drains the queue in
+    batches and, for those sources only, diffs the desired reminders inside
+    the horizon against the unsent ones already stored: stale future rows
+    not claimed by the dispatcher are deleted and missing ones inserted. Recurring events are re-queued every
+    `refresh_interval` seconds so their horizon keeps rolling forward.
+    """
+
+    def __init__(
+        self,
+        supabase_factory=get_supabase_service,
+        batch_size: int = 500,
+        horizon_days: int = 14,
+        grace_minutes: int = 60,
+        poll_interval: float = 5,
+        refresh_interval: float = 6 * 3600,
+        task_offsets: Iterable[int] = (1440,),
+    ):
+        self.supabase_factory = supabase_factory
+        self.batch_size = batch_size
+        self.horizon = timedelta(days=horizon_days)
+        self.grace = timedelta(minutes=grace_minutes)
+        self.poll_interval = poll_interval
+        self.refresh_interval = refresh_interval
+        self.task_offsets = tuple(task_offsets)
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self._last_refresh = 0.0
+        self.stats = {"sources": 0, "created": 0, "deleted": 0}
+
+    # --- database calls (sync client, run in the threadpool) ---
+
+    def _claim(self) -> List[Dict[str, Any]]:
+        response = self.supabase_factory().rpc("claim_reminder_changes", {"p_limit": self.batch_size}).execute()
+        return response.data or []
+
+    def _fetch(self, table: str, columns: str, ids: List[str]) -> List[Dict[str, Any]]:
+        rows = []
+        for chunk in _chunks(ids):
+            rows += self.supabase_factory().table(table).select(columns).in_("id", chunk).execute().data or []
+        return rows
+
+    def _fetch_pending(self, source_type: str, ids: List[str]) -> List[Dict[str, Any]]:
+        rows = []
+        for chunk in _chunks(ids):
+            rows += (
+                self.supabase_factory().table("notifications")
+                .select("id,source_type,source_id,scheduled_for,title,message")
+                .eq("source_type", source_type)
+                .in_("source_id", chunk)
+                .is_("sent_at", "null")
+                .execute()
+                .data or []
+            )
+        return rows
+
+    def materialize(self, changes: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Recompute the reminders of the given (source_type, source_id) changes"""
+        now = datetime.now(timezone.utc)
+        window_start, window_end = now - self.grace, now + self.horizon
+        event_ids = sorted({str(c["source_id"]) for c in changes if c["source_type"] == "event"})
+        task_ids = sorted({str(c["source_id"]) for c in changes if c["source_type"] == "task"})
+
+        desired: Dict[ReminderKey, Dict[str, Any]] = {}
+        for event in self._fetch("calendar_events", EVENT_COLUMNS, event_ids) if event_ids else []:
+            for row in event_reminders(event, window_start, window_end):
+                desired[_key(row)] = row
+        for task in self._fetch("tasks", TASK_COLUMNS, task_ids) if task_ids else []:
+            for row in task_reminders(task, window_start, window_end, self.task_offsets):
+                desired[_key(row)] = row
+
+        # Deleted or disabled sources simply have no desired rows left
+        pending = self._fetch_pending("event", event_ids) + self._fetch_pending("task", task_ids)
+        stale = []
+        for row in pending:
+            key = _key(row)
+            if key[2] <= now:
+                # Already due: the dispatcher may be delivering or retrying it
+                desired.pop(key, None)
+                continue
+            wanted = desired.get(key)
+            if wanted and wanted["title"] == row["title"] and wanted["message"] == row["message"]:
+                del desired[key]
+            else:
+                stale.append(row["id"])
+
+        service = self.supabase_factory()
+        deleted = 0
+        for chunk in _chunks(stale):
+            # Rows that became due or were claimed since they were read stay
+            response = (
+                service.table("notifications").delete()
+                .in_("id", chunk)
+                .gt("scheduled_for", datetime.now(timezone.utc).isoformat())
+                .is_("sent_at", "null")
+                .is_("claimed_by", "null")
+                .execute()
+            )
+            deleted += len(response.data or [])
+        rows = list(desired.values())
+        for index in range(0, len(rows), self.batch_size):
+            # Reminders that were already sent conflict on the unique index and are skipped
+            service.table("notifications").upsert(
+                rows[index:index + self.batch_size],
+                on_conflict="source_type,source_id,scheduled_for",
+                ignore_duplicates=True,
+            ).execute()
+
+        result = {"sources": len(event_ids) + len(task_ids), "created": len(rows), "deleted": deleted}
+        for name, value in result.items():
+            self.stats[name] += value
+        return result
+
+    def _requeue(self, changes: List[Dict[str, Any]]) -> None:
+        rows = [{key: c[key] for key in ("source_type", "source_id", "user_id")} for c in changes]
+        self.supabase_factory().table("reminder_queue").upsert(
+            rows, on_conflict="source_type,source_id", ignore_duplicates=True
+        ).execute()
+
+    def _refresh_recurring(self) -> int:
+        return self.supabase_factory().rpc("enqueue_recurring_reminders", {}).execute().data or 0
+
+    # --- loop ---
+
+    async def process_once(self) -> int:
+        """Drain one batch of queued changes; returns the number of sources processed"""
+        changes = await run_in_threadpool(self._claim)
+        if changes:
+            try:
+                await run_in_threadpool(self.materialize, changes)
+            except Exception:
+                # Claiming removed them from the queue: put them back for the next pass
+                await run_in_threadpool(self._requeue, changes)
+                raise
+        return len(changes)
+
+    async def _loop(self) -> None:
+        while self._running:
+            processed = 0
+            try:
+                if time.monotonic() - self._last_refresh >= self.refresh_interval:
+                    queued = await run_in_threadpool(self._refresh_recurring)
+                    self._last_refresh = time.monotonic()
+                    logger.info("Re-queued %s recurring events for reminders", queued)
+                processed = await self.process_once()
+            except Exception as exc:
+                logger.error("Reminder materialization failed: %s", exc)
+            if processed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+materializer: Optional[ReminderMaterializer] = None
+
+
+async def start_materializer() -> Optional[ReminderMaterializer]:
+    """Start the process-wide materializer unless REMINDERS_ENABLED=false"""
+    global materializer
+    if os.getenv("REMINDERS_ENABLED", "true").lower() != "true":
+        return None
+    offsets = [int(part) for part in os.getenv("TASK_REMINDER_MINUTES", "1440").split(",") if part.strip()]
+    materializer = ReminderMaterializer(
+        horizon_days=int(os.getenv("REMINDER_HORIZON_DAYS", "14")),
+        poll_interval=float(os.getenv("REMINDER_POLL_SECONDS", "5")),
+        task_offsets=offsets,
+    )
+    materializer.start()
+    return materializer
+
+
+async def stop_materializer() -> None:
+    global materializer
+    if materializer is not None:
+        await materializer.stop()
+        materializer = None
@@ -0,0 +1,134 @@
+# retention.py
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from database import get_supabase_service
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationRetentionJob:
+    """
+    Periodically compacts the notifications table.
+
+    Each run calls the `archive_read_notifications` RPC batch by batch: read
+    notifications older than `max_age_days` are rolled up into per-user
+    monthly summaries, copied to `notifications_archive` (unless `archive`
+    is False) and deleted. Between batches the job sleeps long enough to keep
+    its share of database time under `duty_cycle`, so it backs off on its
+    own when batches get slow because the database is busy.
+    """
+
+    def __init__(
+        self,
+        supabase_factory=get_supabase_service,
+        max_age_days: int = 90,
+        batch_size: int = 1000,
+        archive: bool = True,
+        duty_cycle: float = 0.2,
+        max_batches: int = 500,
+        interval_seconds: float = 6 * 3600,
+        initial_delay_seconds: float = 300,
+    ):
+        self.supabase_factory = supabase_factory
+        self.max_age = timedelta(days=max_age_days)
+        self.batch_size = batch_size
+        self.archive = archive
+        self.duty_cycle = min(max(duty_cycle, 0.01), 1.0)
+        self.max_batches = max_batches
+        self.interval_seconds = interval_seconds
+        self.initial_delay_seconds = initial_delay_seconds
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+    def _archive_batch(self, cutoff: datetime) -> Dict[str, int]:
+        response = self.supabase_factory().rpc("archive_read_notifications", {
+            "p_older_than": cutoff.isoformat(),
+            "p_limit": self.batch_size,
+            "p_archive": self.archive,
+        }).execute()
+        data = response.data or {}
+        return {"rows": int(data.get("rows", 0)), "bytes": int(data.get("bytes", 0))}
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Compact until no candidates are left (or `max_batches` is reached) and report what was reclaimed"""
+        cutoff = datetime.now(timezone.utc) - self.max_age
+        report = {"rows": 0, "bytes": 0, "batches": 0, "seconds": 0.0, "cutoff": cutoff.isoformat()}
+        started = time.monotonic()
+
+        while report["batches"] < self.max_batches:
+            batch_started = time.monotonic()
+            result = await run_in_threadpool(self._archive_batch, cutoff)
+            elapsed = time.monotonic() - batch_started
+            report["batches"] += 1
+            report["rows"] += result["rows"]
+            report["bytes"] += result["bytes"]
+            if result["rows"] < self.batch_size:
+                break
+            # Busy for `elapsed`, idle for the rest of the duty cycle
+            await asyncio.sleep(elapsed * (1 / self.duty_cycle - 1))
+
+        report["seconds"] = round(time.monotonic() - started, 3)
+        self.last_report = report
+        logger.info(
+            "Notification retention: %d rows / %d bytes reclaimed in %d batches (%.1fs)",
+            report["rows"], report["bytes"], report["batches"], report["seconds"],
+        )
+        return report
+
+    async def _loop(self) -> None:
+        # Keep the first pass away from startup traffic; workers start at different times anyway
+        await asyncio.sleep(self.initial_delay_seconds * random.random())
+        while self._running:
+            try:
+                await self.run_once()
+            except Exception as exc:
+                logger.error("Notification retention failed: %s", exc)
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+retention_job: Optional[NotificationRetentionJob] = None
+
+
+async def start_retention() -> Optional[NotificationRetentionJob]:
+    """Start the process-wide retention job unless NOTIFICATION_RETENTION_ENABLED=false"""
+    global retention_job
+    if os.getenv("NOTIFICATION_RETENTION_ENABLED", "true").lower() != "true":
+        return None
+    retention_job = NotificationRetentionJob(
+        max_age_days=int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90")),
+        batch_size=int(os.getenv("NOTIFICATION_RETENTION_BATCH", "1000")),
+        archive=os.getenv("NOTIFICATION_RETENTION_MODE", "archive").lower() == "archive",
+        duty_cycle=float(os.getenv("NOTIFICATION_RETENTION_DUTY_CYCLE", "0.2")),
+        interval_seconds=float(os.getenv("NOTIFICATION_RETENTION_INTERVAL_SECONDS", str(6 * 3600))),
+    )
+    retention_job.start()
+    return retention_job
+
+
+async def stop_retention() -> None:
+    global retention_job
+    if retention_job is not None:
+        await retention_job.stop()
+        retention_job = None
@@ -1,15 +1,16 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from database import get_supabase_anon, get_user_supabase, get_supabase_service
+from fastapi import APIRouter, HTTPException, Request, status, Depends
+from fastapi.concurrency import run_in_threadpool
+from database import get_user_supabase, get_supabase_service
 from models import UserProfile, UserProfileCreate, UserProfileUpdate
 from auth_middleware import get_current_user, get_optional_current_user
+from profiles import get_or_create_profile, store_profile
+from auth_client import get_auth_client, split_session, AuthUnavailableError
+from rate_limit import limiter
 from typing import Dict, Any, Optional
 from pydantic import BaseModel, EmailStr
-import requests
 import os
 import logging
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -41,6 +42,8 @@ class AuthResponse(BaseModel):
     session: Optional[Dict[str, Any]] = None
     email_confirmation_required: Optional[bool] = None
 
+AUTH_UNAVAILABLE_DETAIL = "El servicio de autenticación no está disponible en este momento. Intenta de nuevo en unos segundos."
+
 def validate_password(password: str) -> bool:
     """Validate password strength"""
     if len(password) < 8:
@@ -53,11 +56,12 @@ def validate_password(password: str) -> bool:
     return has_upper and has_lower and has_digit
 
 @router.post("/signup", response_model=AuthResponse)
-async def signup(request: SignUpRequest):
+async def signup(request: SignUpRequest, http_request: Request):
     """
     Registrar nuevo usuario con confirmación de email
     El usuario recibirá un email con enlace de confirmación
     """
+    await limiter.check(http_request, "signup", request.email)
     try:
         # Validar fortaleza de contraseña
         if not validate_password(request.password):
@@ -66,31 +70,28 @@ async def signup(request: SignUpRequest):
                 detail="La contraseña debe tener al menos 8 caracteres, incluir mayúsculas, minúsculas y números"
             )
 
-        supabase = get_supabase_anon()
-        
         # Configurar metadata del usuario
         user_metadata = {}
         if request.name:
             user_metadata["full_name"] = request.name
 
-        response = supabase.auth.sign_up({
-            "email": request.email,
-            "password": request.password,
-            "options": {
-                "emailRedirectTo": "studyvault://confirm-email",
-                "data": user_metadata
-            }
-        })
+        data = await get_auth_client().sign_up(
+            request.email,
+            request.password,
+            user_metadata,
+            redirect_to="studyvault://confirm-email"
+        )
+        user, session = split_session(data)
         
-        if response.user:
-            logger.info(f"✅ User signed up: {response.user.id} - {request.email}")
+        if user:
+            logger.info("✅ User signed up: %s - %s", user['id'], request.email)
             
             # Crear perfil de usuario usando service client
             try:
                 service_supabase = get_supabase_service()
                 
                 profile_data = {
-                    "id": response.user.id,
+                    "id": user["id"],
                     "email": request.email,
                     "full_name": request.name or "",
                     "timezone": "America/Panama",
@@ -101,17 +102,17 @@ async def signup(request: SignUpRequest):
                     "updated_at": "now()"
                 }
                 
-                profile_response = service_supabase.table("user_profiles").insert(profile_data).execute()
-                logger.info(f"✅ Profile created: {profile_response.data}")
+                await run_in_threadpool(service_supabase.table("user_profiles").insert(profile_data).execute)
+                logger.debug("✅ Profile created: %s", user["id"])
                 
             except Exception as profile_error:
-                logger.error(f"❌ Failed to create profile: {profile_error}")
+                logger.error("❌ Failed to create profile: %s", profile_error)
                 # No fallar el registro si la creación del perfil falla
             
             return AuthResponse(
                 message="Usuario registrado exitosamente. Revisa tu email para confirmar tu cuenta antes de poder iniciar sesión.",
-                user=response.user.model_dump() if hasattr(response.user, 'model_dump') else dict(response.user),
-                session=response.session.model_dump() if response.session and hasattr(response.session, 'model_dump') else dict(response.session) if response.session else None,
+                user=user,
+                session=session,
                 email_confirmation_required=True
             )
         else:
@@ -120,8 +121,16 @@ async def signup(request: SignUpRequest):
                 detail="No se pudo crear el usuario. Verifica que el email no esté ya registrado."
             )
             
+    except HTTPException:
+        raise
+    except AuthUnavailableError as e:
+        logger.error("❌ Signup error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=AUTH_UNAVAILABLE_DETAIL
+        )
     except Exception as e:
-        logger.error(f"❌ Signup error: {e}")
+        logger.error("❌ Signup error: %s", e)
         error_message = str(e)
         
         # Personalizar mensajes de error comunes
@@ -138,18 +147,16 @@ async def signup(request: SignUpRequest):
         )
 
 @router.post("/signin", response_model=AuthResponse)
-async def signin(request: SignInRequest):
+async def signin(request: SignInRequest, http_request: Request):
     """Iniciar sesión"""
+    await limiter.check(http_request, "signin", request.email)
     try:
-        supabase = get_supabase_anon()
-        response = supabase.auth.sign_in_with_password({
-            "email": request.email,
-            "password": request.password
-        })
+        data = await get_auth_client().sign_in_with_password(request.email, request.password)
+        user, session = split_session(data)
         
-        if response.user and response.session:
+        if user and session:
             # Verificar si el email está confirmado
-            if not response.user.email_confirmed_at:
+            if not user.get("email_confirmed_at"):
                 return AuthResponse(
                     message="Debes confirmar tu email antes de poder iniciar sesión. Revisa tu bandeja de entrada.",
                     user=None,
@@ -157,12 +164,12 @@ async def signin(request: SignInRequest):
                     email_confirmation_required=True
                 )
             
-            logger.info(f"✅ User signed in: {response.user.id} - {request.email}")
+            logger.info("✅ User signed in: %s - %s", user['id'], request.email)
             
             return AuthResponse(
                 message="Sesión iniciada exitosamente",
-                user=response.user.model_dump() if hasattr(response.user, 'model_dump') else dict(response.user),
-                session=response.session.model_dump() if hasattr(response.session, 'model_dump') else dict(response.session)
+                user=user,
+                session=session
             )
         else:
             raise HTTPException(
@@ -170,8 +177,16 @@ async def signin(request: SignInRequest):
                 detail="Credenciales inválidas"
             )
             
+    except HTTPException:
+        raise
+    except AuthUnavailableError as e:
+        logger.error("❌ Signin error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=AUTH_UNAVAILABLE_DETAIL
+        )
     except Exception as e:
-        logger.error(f"❌ Signin error: {e}")
+        logger.error("❌ Signin error: %s", e)
         error_message = str(e)
         
         # Personalizar mensajes de error
@@ -189,63 +204,30 @@ async def signin(request: SignInRequest):
 async def signout(current_user: Dict[str, Any] = Depends(get_current_user)):
     """Cerrar sesión"""
     try:
-        supabase = get_user_supabase(current_user["token"])
-        supabase.auth.sign_out()
+        await get_auth_client().sign_out(current_user["token"])
         
-        logger.info(f"✅ User signed out: {current_user['user_id']}")
+        logger.info("✅ User signed out: %s", current_user['user_id'])
         return {"message": "Sesión cerrada exitosamente"}
         
     except Exception as e:
-        logger.error(f"❌ Signout error: {e}")
+        logger.error("❌ Signout error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Error al cerrar sesión"
         )
 
 @router.post("/reset-password")
-async def reset_password(request: ResetPasswordRequest):
+async def reset_password(request: ResetPasswordRequest, http_request: Request):
     """
     Enviar email de restablecimiento de contraseña
     Siempre retorna éxito por seguridad (no revelar si email existe)
     """
+    await limiter.check(http_request, "reset-password", request.email)
     try:
-        logger.info(f"🔑 Password reset requested for: {request.email}")
+        logger.info("🔑 Password reset requested for: %s", request.email)
         
-        # Método 1: Usar Supabase client (recomendado)
-        try:
-            supabase = get_supabase_anon()
-            response = supabase.auth.reset_password_email(
-                request.email,
-                options={
-                    "redirectTo": "studyvault://reset-password"
-                }
-            )
-            logger.info(f"✅ Password reset email sent via client")
-            
-        except Exception as client_error:
-            logger.warning(f"⚠️ Client method failed, trying REST API: {client_error}")
-            
-            # Método 2: Fallback usando REST API directa
-            url = f"{SUPABASE_URL}/auth/v1/recover"
-            headers = {
-                "apikey": SUPABASE_ANON_KEY,
-                "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
-                "Content-Type": "application/json",
-            }
-            
-            payload = {
-                "email": request.email,
-                "options": {
-                    "redirectTo": "studyvault://reset-password"
-                }
-            }
-            
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
-            
-            if response.status_code in [200, 201]:
-                logger.info(f"✅ Password reset email sent via REST API")
-            else:
-                logger.error(f"❌ REST API error: {response.status_code} - {response.text}")
+        await get_auth_client().recover(request.email, redirect_to="studyvault://reset-password")
+        logger.info("✅ Password reset email sent")
         
         # Siempre retornar éxito por seguridad
         return {
@@ -254,7 +236,7 @@ async def reset_password(request: ResetPasswordRequest):
         }
         
     except Exception as e:
-        logger.error(f"❌ Reset password error: {e}")
+        logger.error("❌ Reset password error: %s", e)
         # Por seguridad, no revelar detalles del error
         return {
             "message": "Si el email está registrado en nuestro sistema, recibirás un enlace para restablecer tu contraseña en los próximos minutos.",
@@ -280,21 +262,16 @@ async def update_password(
 
         # Si tenemos un token de recuperación, usarlo
         if request.recovery_token:
-            logger.info(f"🔄 Updating password using recovery token")
+            logger.info("🔄 Updating password using recovery token")
             
             try:
                 # Usar el token de recuperación para actualizar la contraseña
-                supabase = get_supabase_anon()
-                response = supabase.auth.update_user({
+                user = await get_auth_client().update_user(request.recovery_token, {
                     "password": request.password
-                }, {
-                    "headers": {
-                        "Authorization": f"Bearer {request.recovery_token}"
-                    }
                 })
                 
-                if response.user:
-                    logger.info(f"✅ Password updated using recovery token for user: {response.user.id}")
+                if user.get("id"):
+                    logger.info("✅ Password updated using recovery token for user: %s", user['id'])
                     return {
                         "message": "Contraseña actualizada exitosamente",
                         "success": True
@@ -305,8 +282,15 @@ async def update_password(
                         detail="No se pudo actualizar la contraseña con el token de recuperación"
                     )
                     
+            except HTTPException:
+                raise
+            except AuthUnavailableError:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=AUTH_UNAVAILABLE_DETAIL
+                )
             except Exception as recovery_error:
-                logger.error(f"❌ Recovery token error: {recovery_error}")
+                logger.error("❌ Recovery token error: %s", recovery_error)
                 error_message = str(recovery_error)
                 
                 if "invalid_token" in error_message.lower() or "expired" in error_message.lower():
@@ -327,15 +311,14 @@ async def update_password(
         
         # Si no hay token de recuperación, usar autenticación normal
         elif current_user:
-            logger.info(f"🔄 Updating password using normal authentication for user: {current_user['user_id']}")
+            logger.info("🔄 Updating password using normal authentication for user: %s", current_user['user_id'])
             
-            supabase = get_user_supabase(current_user["token"])
-            response = supabase.auth.update_user({
+            user = await get_auth_client().update_user(current_user["token"], {
                 "password": request.password
             })
             
-            if response.user:
-                logger.info(f"✅ Password updated for user: {response.user.id}")
+            if user.get("id"):
+                logger.info("✅ Password updated for user: %s", user['id'])
                 return {
                     "message": "Contraseña actualizada exitosamente",
                     "success": True
@@ -354,8 +337,14 @@ async def update_password(
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
+    except AuthUnavailableError as e:
+        logger.error("❌ Update password error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=AUTH_UNAVAILABLE_DETAIL
+        )
     except Exception as e:
-        logger.error(f"❌ Update password error: {e}")
+        logger.error("❌ Update password error: %s", e)
         error_message = str(e)
         
         if "weak_password" in error_message.lower():
@@ -371,24 +360,22 @@ async def update_password(
         )
 
 @router.post("/resend-confirmation")
-async def resend_confirmation_email(request: ResetPasswordRequest):
+async def resend_confirmation_email(request: ResetPasswordRequest, http_request: Request):
     """
     Reenviar email de confirmación
     Para usuarios que no han confirmado su email
     """
+    await limiter.check(http_request, "resend-confirmation", request.email)
     try:
-        logger.info(f"📧 Resend confirmation requested for: {request.email}")
+        logger.info("📧 Resend confirmation requested for: %s", request.email)
         
-        supabase = get_supabase_anon()
-        response = supabase.auth.resend(
+        await get_auth_client().resend(
             request.email,
             type='signup',
-            options={
-                "emailRedirectTo": "studyvault://confirm-email"
-            }
+            redirect_to="studyvault://confirm-email"
         )
         
-        logger.info(f"✅ Confirmation email resent")
+        logger.info("✅ Confirmation email resent")
         
         return {
             "message": "Si tu email está registrado y pendiente de confirmación, recibirás un nuevo enlace de confirmación.",
@@ -396,7 +383,7 @@ async def resend_confirmation_email(request: ResetPasswordRequest):
         }
         
     except Exception as e:
-        logger.error(f"❌ Resend confirmation error: {e}")
+        logger.error("❌ Resend confirmation error: %s", e)
         # Por seguridad, no revelar si el email existe
         return {
             "message": "Si tu email está registrado y pendiente de confirmación, recibirás un nuevo enlace de confirmación.",
@@ -417,48 +404,21 @@ async def confirm_email():
 
 @router.get("/profile", response_model=UserProfile)
 async def get_profile(current_user: Dict[str, Any] = Depends(get_current_user)):
-    """Obtener perfil del usuario"""
+    """Obtener perfil del usuario (se crea con valores por defecto si no existe)"""
     try:
         supabase = get_user_supabase(current_user["token"])
-        response = supabase.table("user_profiles").select("*").eq("id", current_user["user_id"]).execute()
+        profile = get_or_create_profile(supabase, current_user)
 
-        if response.data:
-            logger.info(f"📋 Retrieved profile for user: {current_user['user_id']}")
-            return response.data[0]
+        if profile:
+            return profile
         else:
-            # Verificar si existe perfil con el mismo email
-            email_check_response = supabase.table("user_profiles").select("*").eq("email", current_user["email"]).execute()
-
-            if email_check_response.data:
-                logger.info(f"⚠️ Found profile by email: {current_user['email']}")
-                return email_check_response.data[0]
-
-            # Crear perfil por defecto si no existe
-            default_profile = {
-                "id": current_user["user_id"],
-                "email": current_user["email"],
-                "full_name": current_user.get("user_metadata", {}).get("full_name", ""),
-                "timezone": "America/Panama",
-                "avatar_url": None,
-                "bio": None,
-                "preferences": {},
-                "created_at": "now()",
-                "updated_at": "now()"
-            }
-
-            create_response = supabase.table("user_profiles").insert(default_profile).execute()
-
-            if create_response.data:
-                logger.info(f"✅ Default profile created for: {current_user['user_id']}")
-                return create_response.data[0]
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="No se pudo crear el perfil de usuario"
-                )
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="No se pudo crear el perfil de usuario"
+            )
 
     except Exception as e:
-        logger.error(f"❌ Error with profile: {e}")
+        logger.error("❌ Error with profile: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
@@ -480,8 +440,8 @@ async def update_profile(
         response = supabase.table("user_profiles").update(update_data).eq("id", current_user["user_id"]).execute()
         
         if response.data:
-            logger.info(f"✅ Profile updated for: {current_user['user_id']}")
-            return response.data[0]
+            logger.info("✅ Profile updated for: %s", current_user['user_id'])
+            return store_profile(current_user["user_id"], response.data[0])
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -489,7 +449,7 @@ async def update_profile(
             )
             
     except Exception as e:
-        logger.error(f"❌ Error updating profile: {e}")
+        logger.error("❌ Error updating profile: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
@@ -1,13 +1,36 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
-from database import get_user_supabase
-from models import CalendarEvent, CalendarEventCreate, CalendarEventUpdate
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from database import get_user_supabase, get_supabase_service
+from models import (
+    CalendarEvent, CalendarEventCreate, CalendarEventUpdate, CalendarConflict,
+    FreeBusyResponse, StudySlotsResponse, CalendarFeedToken, CalendarImportReport,
+    CalendarEventBatchRequest, BatchResponse,
+)
 from auth_middleware import get_current_user
+from batch import run_batch
+from cache import TTLCache
+from calendar_ics import calendar_header, calendar_footer, render_rows
+from calendar_import import IMPORT_MAX_BYTES, ImportTooLarge, iter_ics_entries, iter_csv_entries, import_events, open_text_stream
+from calendar_utils import (
+    MAX_CONFLICT_EVENTS, MAX_OCCURRENCES, MAX_WINDOW_DAYS, day_window, apply_overlap_filter, find_conflicts, expand_occurrences,
+    merge_intervals, free_intervals, clip_to_daily_hours, suggest_study_slots,
+)
 from typing import List, Dict, Any, Optional
 from uuid import UUID
 from datetime import datetime, date
+import hashlib
+import os
+import secrets
 
 router = APIRouter()
 
+ICS_MEDIA_TYPE = "text/calendar; charset=utf-8"
+FEED_PAGE_SIZE = 500
+
+# Rendered feeds keyed by ETag; an entry is only valid for one calendar_version
+_feed_cache = TTLCache(maxsize=int(os.getenv("ICS_FEED_CACHE_SIZE", "256")), ttl=3600)
+
 @router.get("/", response_model=List[CalendarEvent])
 async def get_events(
     current_user: Dict[str, Any] = Depends(get_current_user),
@@ -16,15 +39,14 @@ async def get_events(
     class_id: Optional[UUID] = Query(None),
     event_type: Optional[str] = Query(None)
 ):
-    """Get calendar events for the current user"""
+    """Get calendar events for the current user that overlap the requested dates"""
     try:
         supabase = get_user_supabase(current_user["token"])
         query = supabase.table("calendar_events").select("*").eq("user_id", current_user["user_id"])
         
-        if start_date:
-            query = query.gte("start_datetime", start_date.isoformat())
-        if end_date:
-            query = query.lte("end_datetime", end_date.isoformat())
+        # Events crossing the window boundaries are included (end_date is inclusive)
+        window_start, window_end = day_window(start_date, end_date)
+        query = apply_overlap_filter(query, window_start, window_end)
         if class_id:
             query = query.eq("class_id", str(class_id))
         if event_type:
@@ -41,6 +63,336 @@ async def get_events(
             detail=str(e)
         )
 
+@router.get("/conflicts", response_model=List[CalendarConflict])
+async def get_conflicts(
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    across_classes: bool = Query(True, description="Ignore overlaps between events of the same class")
+):
+    """Find overlapping calendar events for the current user"""
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        query = supabase.table("calendar_events").select("*").eq("user_id", current_user["user_id"])
+        
+        window_start, window_end = day_window(start_date, end_date)
+        query = apply_overlap_filter(query, window_start, window_end)
+        response = query.order("start_datetime", desc=False).limit(MAX_CONFLICT_EVENTS + 1).execute()
+        events = response.data or []
+        if len(events) > MAX_CONFLICT_EVENTS:
+            raise ValueError(f"More than {MAX_CONFLICT_EVENTS} events to compare; pass start_date and end_date to narrow the range")
+        
+        return await run_in_threadpool(find_conflicts, events, across_classes)
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+def _bounded_window(start_date: date, end_date: date):
+    """Validate a free/busy window and return it as [start, end) datetimes"""
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must be on or after start_date"
+        )
+    if (end_date - start_date).days + 1 > MAX_WINDOW_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Window cannot exceed {MAX_WINDOW_DAYS} days"
+        )
+    return day_window(start_date, end_date)
+
+def _load_busy_intervals(supabase, user_id: str, window_start: datetime, window_end: datetime):
+    """
+    Merged busy intervals from one-off events and recurring occurrences in the window.
+
+    At most MAX_OCCURRENCES intervals are expanded in total; a window with
+    more is rejected rather than reported partly free.
+    """
+    one_off = (
+        supabase.table("calendar_events")
+        .select("start_datetime,end_datetime")
+        .eq("user_id", user_id)
+        .not_.is_("is_recurring", "true")
+    )
+    one_off = apply_overlap_filter(one_off, window_start, window_end).limit(MAX_OCCURRENCES + 1).execute()
+
+    # Recurring series can start long before the window, so only bound them by its end
+    recurring = (
+        supabase.table("calendar_events")
+        .select("start_datetime,end_datetime,is_recurring,recurrence_pattern")
+        .eq("user_id", user_id)
+        .eq("is_recurring", True)
+        .lt("start_datetime", window_end.isoformat())
+        .limit(MAX_OCCURRENCES + 1)
+        .execute()
+    )
+
+    if len(recurring.data or []) > MAX_OCCURRENCES:
+        raise ValueError(f"More than {MAX_OCCURRENCES} recurring events overlap this window")
+
+    intervals = []
+    for event in (one_off.data or []) + (recurring.data or []):
+        budget = MAX_OCCURRENCES - len(intervals)
+        occurrences = expand_occurrences(event, window_start, window_end, limit=budget + 1)
+        if len(occurrences) > budget:
+            raise ValueError(f"More than {MAX_OCCURRENCES} busy intervals in this window; use a shorter date range")
+        for start, end in occurrences:
+            intervals.append((max(start, window_start), min(end, window_end)))
+    return merge_intervals(intervals)
+
+@router.get("/freebusy", response_model=FreeBusyResponse)
+async def get_freebusy(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get merged busy intervals (including recurring occurrences) and free gaps"""
+    window_start, window_end = _bounded_window(start_date, end_date)
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        # Expanding recurring series is CPU work: keep it off the event loop
+        busy = await run_in_threadpool(_load_busy_intervals, supabase, current_user["user_id"], window_start, window_end)
+        free = free_intervals(busy, window_start, window_end)
+        
+        return {
+            "window_start": window_start,
+            "window_end": window_end,
+            "busy": [{"start": start, "end": end} for start, end in busy],
+            "free": [{"start": start, "end": end} for start, end in free],
+        }
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.get("/study-slots", response_model=StudySlotsResponse)
+async def get_study_slots(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    day_start_hour: int = Query(8, ge=0, le=23),
+    day_end_hour: int = Query(22, ge=1, le=24),
+    tz: str = Query("UTC", description="IANA timezone used for the daily study hours"),
+    min_slot_minutes: int = Query(30, ge=5, le=240),
+    max_session_minutes: int = Query(120, ge=15, le=480)
+):
+    """Suggest study sessions for pending tasks in the free time of the window"""
+    window_start, window_end = _bounded_window(start_date, end_date)
+    if day_end_hour <= day_start_hour:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="day_end_hour must be after day_start_hour"
+        )
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        # Expanding recurring series is CPU work: keep it off the event loop
+        busy = await run_in_threadpool(_load_busy_intervals, supabase, current_user["user_id"], window_start, window_end)
+        free = clip_to_daily_hours(free_intervals(busy, window_start, window_end), day_start_hour, day_end_hour, tz)
+        
+        tasks_response = (
+            supabase.table("tasks")
+            .select("id,title,due_date,priority,estimated_duration,completion_percentage")
+            .eq("user_id", current_user["user_id"])
+            .neq("status", "completed")
+            .or_(f"due_date.is.null,due_date.gte.{window_start.isoformat()}")
+            .order("due_date", desc=False)
+            .limit(200)
+            .execute()
+        )
+        suggestions = suggest_study_slots(
+            tasks_response.data or [],
+            free,
+            min_slot_minutes=min_slot_minutes,
+            max_session_minutes=max_session_minutes
+        )
+        
+        return {"window_start": window_start, "window_end": window_end, **suggestions}
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def _feed_rows(supabase, user_id: str):
+    """Page through the user's events (with linked grades) ordered by event id, then grade id"""
+    offset = 0
+    while True:
+        page = (
+            supabase.table("vw_calendar_with_grades")
+            .select("*")
+            .eq("user_id", user_id)
+            .order("id", desc=False)
+            # An event with several grades spans several rows: without a unique
+            # order, offset paging may repeat or skip some of them
+            .order("grade_id", desc=False)
+            .range(offset, offset + FEED_PAGE_SIZE - 1)
+            .execute()
+        )
+        rows = page.data or []
+        yield from rows
+        if len(rows) < FEED_PAGE_SIZE:
+            break
+        offset += FEED_PAGE_SIZE
+
+def _generate_feed(supabase, user_id: str, etag: str):
+    """Stream the ICS document and cache it once it has been fully generated"""
+    chunks = [calendar_header()]
+    yield chunks[0]
+    for chunk in render_rows(_feed_rows(supabase, user_id)):
+        chunks.append(chunk)
+        yield chunk
+    chunks.append(calendar_footer())
+    yield chunks[-1]
+    _feed_cache.set(etag, "".join(chunks))
+
+@router.post("/feed/token", response_model=CalendarFeedToken)
+async def create_feed_token(
+    request: Request,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Create or rotate the private ICS subscription URL (previous URL stops working)"""
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        token = secrets.token_urlsafe(32)
+        
+        supabase.table("calendar_feed_tokens").upsert({
+            "user_id": current_user["user_id"],
+            "token_hash": _hash_token(token),
+            "created_at": "now()"
+        }, on_conflict="user_id").execute()
+        
+        return {"token": token, "url": str(request.url_for("get_calendar_feed", token=token))}
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.delete("/feed/token")
+async def revoke_feed_token(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Revoke the ICS subscription URL"""
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        supabase.table("calendar_feed_tokens").delete().eq("user_id", current_user["user_id"]).execute()
+        
+        return {"message": "Calendar feed revoked"}
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.get("/feed/{token}.ics", name="get_calendar_feed")
+async def get_calendar_feed(token: str, request: Request):
+    """
+    ICS subscription feed for calendar apps (authenticated by the URL token).
+
+    Polls cost a single indexed lookup: the ETag is derived from
+    `calendar_version`, which triggers bump on every event or grade change.
+    """
+    try:
+        supabase = get_supabase_service()
+        lookup = (
+            supabase.table("calendar_feed_tokens")
+            .select("user_id,calendar_version")
+            .eq("token_hash", _hash_token(token))
+            .limit(1)
+            .execute()
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    if not lookup.data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Calendar feed not found"
+        )
+    
+    user_id = lookup.data[0]["user_id"]
+    version = lookup.data[0]["calendar_version"]
+    etag = '"' + hashlib.sha256(f"{user_id}:{version}".encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=300"}
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [value.strip() for value in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    cached = _feed_cache.get(etag)
+    if cached is not None:
+        return Response(content=cached, media_type=ICS_MEDIA_TYPE, headers=headers)
+    
+    return StreamingResponse(_generate_feed(supabase, user_id, etag), media_type=ICS_MEDIA_TYPE, headers=headers)
+
+@router.post("/import", response_model=CalendarImportReport)
+async def import_calendar(
+    file: UploadFile = File(...),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    format: Optional[str] = Query(None, pattern="^(ics|csv)$", description="Defaults to the file extension"),
+    class_id: Optional[UUID] = Query(None, description="Class assigned to rows without one")
+):
+    """
+    Bulk import events from an ICS or CSV file.
+
+    The file is parsed as a stream, rows are de-duplicated by UID or
+    title + start time, and inserted in batched multi-row statements.
+    Returns a per-row report.
+    """
+    size = file.size
+    if size is None:
+        # Chunked uploads carry no size; the spooled file can still be measured
+        size = file.file.seek(0, os.SEEK_END)
+        file.file.seek(0)
+    if size > IMPORT_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds {IMPORT_MAX_BYTES} bytes"
+        )
+    
+    filename = (file.filename or "").lower()
+    source = format or ("csv" if filename.endswith(".csv") or file.content_type == "text/csv" else "ics")
+    
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        stream = open_text_stream(file.file)
+        entries = iter_csv_entries(stream) if source == "csv" else iter_ics_entries(stream)
+        
+        # Parsing and the (blocking) Supabase calls run off the event loop
+        return await run_in_threadpool(
+            import_events,
+            supabase,
+            current_user["user_id"],
+            entries,
+            source,
+            str(class_id) if class_id else None
+        )
+        
+    except ImportTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
 @router.post("/", response_model=CalendarEvent)
 async def create_event(
     event_data: CalendarEventCreate,
@@ -70,6 +422,32 @@ async def create_event(
             detail=str(e)
         )
 
+@router.post("/batch", response_model=BatchResponse)
+async def batch_events(
+    payload: CalendarEventBatchRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Create, update and delete several calendar events in one request"""
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        
+        return await run_in_threadpool(
+            run_batch,
+            supabase,
+            "calendar_events",
+            current_user["user_id"],
+            [item.model_dump(mode='json') for item in payload.creates],
+            [item.model_dump(exclude_unset=True, mode='json') for item in payload.updates],
+            [str(item) for item in payload.deletes],
+            payload.atomic
+        )
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
 @router.get("/{event_id}", response_model=CalendarEvent)
 async def get_event(
     event_id: UUID,
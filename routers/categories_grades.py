@@ -1,15 +1,19 @@
 # routers/categories_grades.py
 
 from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
 from uuid import UUID
 
 from database import get_user_supabase
 from auth_middleware import get_current_user
+from batch import run_batch
 from models import (
     CategoryGrade    as Category,
     CategoryGradeCreate as CategoryCreate,
     CategoryGradeUpdate as CategoryUpdate,
+    CategoryGradeBatchRequest as CategoryBatchRequest,
+    BatchResponse,
 )
 
 router = APIRouter(tags=["categories"])
@@ -56,6 +60,34 @@ async def create_category(
     except Exception as exc:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=f"Error creating category: {exc}")
 
+@router.post(
+    "/batch",
+    response_model=BatchResponse,
+    summary="Create, update and delete categories in one request",
+)
+async def batch_categories(
+    payload: CategoryBatchRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """
+    Apply several category creates, updates and deletes, one statement per operation type.
+    With `atomic` the whole batch succeeds or fails together.
+    """
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        return await run_in_threadpool(
+            run_batch,
+            supabase,
+            "categories_grades",
+            current_user["user_id"],
+            [item.model_dump(mode="json") for item in payload.creates],
+            [item.model_dump(exclude_unset=True, mode="json") for item in payload.updates],
+            [str(item) for item in payload.deletes],
+            payload.atomic,
+        )
+    except Exception as exc:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=f"Error in category batch: {exc}")
+
 @router.get(
     "/{category_id}",
     response_model=Category,
@@ -1,9 +1,14 @@
 from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.concurrency import run_in_threadpool
 from database import get_user_supabase
-from models import Class, ClassCreate, ClassUpdate
+from models import Class, ClassCreate, ClassUpdate, ClassBatchRequest, BatchResponse
 from auth_middleware import get_current_user
+from batch import run_batch
 from typing import List, Dict, Any
 from uuid import UUID
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -29,9 +34,6 @@ async def create_class(
 ):
     """Create a new class"""
     try:
-        print(f"🎓 Creating class for user: {current_user['user_id']}")
-        print(f"📋 Class data: {class_data.dict()}")
-        
         # Use service client for database operations since user is already authenticated
         from database import get_supabase_service
         supabase = get_supabase_service()
@@ -40,24 +42,46 @@ async def create_class(
         insert_data = class_data.model_dump(mode='json')
         insert_data["user_id"] = current_user["user_id"]
         
-        print(f"💾 Inserting data: {insert_data}")
-        
         response = supabase.table("classes").insert(insert_data).execute()
         
-        print(f"📊 Supabase response: {response}")
-        
         if response.data:
-            print(f"✅ Class created successfully: {response.data[0]}")
+            logger.debug("Class %s created for user %s", response.data[0].get("id"), current_user["user_id"])
             return response.data[0]
         else:
-            print("❌ No data returned from Supabase")
+            logger.warning("No data returned from Supabase creating a class")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Failed to create class"
             )
             
     except Exception as e:
-        print(f"❌ Error creating class: {e}")
+        logger.error("Error creating class: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.post("/batch", response_model=BatchResponse)
+async def batch_classes(
+    payload: ClassBatchRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Create, update and delete several classes in one request"""
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        
+        return await run_in_threadpool(
+            run_batch,
+            supabase,
+            "classes",
+            current_user["user_id"],
+            [item.model_dump(mode='json') for item in payload.creates],
+            [item.model_dump(exclude_unset=True, mode='json') for item in payload.updates],
+            [str(item) for item in payload.deletes],
+            payload.atomic
+        )
+        
+    except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
@@ -4,13 +4,17 @@ from typing import List, Dict, Any, Optional
 from uuid import UUID
 
 from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 
 from database import get_user_supabase
 from auth_middleware import get_current_user
+from batch import run_batch
 from models import (
     Grade       as GradeModel,
     GradeCreate as GradeCreateModel,
     GradeUpdate as GradeUpdateModel,
+    GradeBatchRequest as GradeBatchRequestModel,
+    BatchResponse,
 )
 
 router = APIRouter(tags=["Grades"])
@@ -67,6 +71,31 @@ async def create_grade(
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=f"Error creating grade: {exc}")
 
 
+@router.post("/batch", response_model=BatchResponse)
+async def batch_grades(
+    payload: GradeBatchRequestModel,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """
+    Create, update and delete several grades in one request.
+    With `atomic` the whole batch succeeds or fails together.
+    """
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        return await run_in_threadpool(
+            run_batch,
+            supabase,
+            "grades",
+            current_user["user_id"],
+            [item.model_dump(mode="json", exclude_none=True) for item in payload.creates],
+            [item.model_dump(exclude_unset=True, mode="json") for item in payload.updates],
+            [str(item) for item in payload.deletes],
+            payload.atomic,
+        )
+    except Exception as exc:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=f"Error in grade batch: {exc}")
+
+
 @router.get("/{grade_id}", response_model=GradeModel)
 async def get_grade(
     grade_id: UUID,
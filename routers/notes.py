@@ -3,11 +3,11 @@ from fastapi import APIRouter, HTTPException, status, Depends, Query
 from database import get_user_supabase
 from models import Note, NoteCreate, NoteUpdate
 from auth_middleware import get_current_user
+from tracing import span, KIND_CLIENT
 from typing import List, Dict, Any, Optional
 from uuid import UUID
 from datetime import date, datetime
 import os
-import httpx
 
 router = APIRouter()
 
@@ -287,13 +287,16 @@ async def generate_ai_summary(
         # Preparar el contenido para la IA
         content_to_summarize = f"{note['title']}\n\n{note['content']}"
 
-        # Llamar al servicio externo de IA
-        async with httpx.AsyncClient(timeout=60) as client:
-            ai_response = await client.post(
-                ai_url,
-                json={"notes": content_to_summarize},
-                headers={"Content-Type": "application/json"}
-            )
+        # Llamar al servicio externo de IA (httpx se importa solo cuando se usa)
+        import httpx
+
+        with span("ai.summary", "upstream", KIND_CLIENT, **{"server.address": httpx.URL(ai_url).host}):
+            async with httpx.AsyncClient(timeout=60) as client:
+                ai_response = await client.post(
+                    ai_url,
+                    json={"notes": content_to_summarize},
+                    headers={"Content-Type": "application/json"}
+                )
         if ai_response.status_code != 200:
             raise HTTPException(status_code=502, detail="Error al consultar el servicio de IA")
         ai_data = ai_response.json()
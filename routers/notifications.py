@@ -1,13 +1,33 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
 from database import get_user_supabase
-from models import Notification, NotificationCreate, NotificationUpdate
+from models import (
+    Notification, NotificationCreate, NotificationUpdate,
+    NotificationMarkRead, NotificationBulkResult, NotificationUnreadCount,
+)
 from auth_middleware import get_current_user
+from cache import TTLCache
 from typing import List, Dict, Any, Optional
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timezone
+import hashlib
+import os
 
 router = APIRouter()
 
+UNREAD_COUNT_TTL = int(os.getenv("UNREAD_COUNT_TTL", "15"))
+
+# Per-user unread counters; writes through this API invalidate them right away
+# (in every worker), other writers (dispatcher, reminders, direct Supabase) within UNREAD_COUNT_TTL
+_unread_cache = TTLCache(maxsize=int(os.getenv("UNREAD_COUNT_CACHE_SIZE", "10000")), ttl=UNREAD_COUNT_TTL, name="unread")
+
+def _invalidate_unread(user_id: str) -> None:
+    _unread_cache.pop(user_id)
+
+def _visible_unread(query):
+    """Unread notifications that are already due (future reminders are not counted)"""
+    now = datetime.now(timezone.utc).isoformat()
+    return query.eq("is_read", False).or_(f"scheduled_for.is.null,scheduled_for.lte.{now}")
+
 @router.get("/", response_model=List[Notification])
 async def get_notifications(
     current_user: Dict[str, Any] = Depends(get_current_user),
@@ -47,6 +67,7 @@ async def create_notification(
         insert_data["user_id"] = current_user["user_id"]
         
         response = supabase.table("notifications").insert(insert_data).execute()
+        _invalidate_unread(current_user["user_id"])
         
         if response.data:
             return response.data[0]
@@ -62,6 +83,84 @@ async def create_notification(
             detail=str(e)
         )
 
+@router.get("/unread-count", response_model=NotificationUnreadCount)
+async def get_unread_count(
+    request: Request,
+    response: Response,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Unread badge counter.
+
+    The count is a head-only COUNT served by the partial index on unread
+    notifications and cached per user for UNREAD_COUNT_TTL seconds. Clients
+    polling with If-None-Match get a 304 while the count is unchanged.
+    """
+    try:
+        user_id = current_user["user_id"]
+        unread = _unread_cache.get(user_id)
+        if unread is None:
+            supabase = get_user_supabase(current_user["token"])
+            query = supabase.table("notifications").select("id", count="exact", head=True).eq("user_id", user_id)
+            unread = _visible_unread(query).execute().count or 0
+            _unread_cache.set(user_id, unread)
+
+        etag = '"' + hashlib.sha256(f"{user_id}:{unread}".encode("utf-8")).hexdigest()[:16] + '"'
+        headers = {"ETag": etag, "Cache-Control": f"private, max-age={UNREAD_COUNT_TTL}"}
+        if etag in [value.strip() for value in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+        return {"unread": unread}
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.post("/mark-all-read", response_model=NotificationBulkResult)
+async def mark_all_notifications_read(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Mark every due unread notification as read in a single UPDATE"""
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        query = supabase.table("notifications").update({"is_read": True}, count="exact", returning="minimal").eq("user_id", current_user["user_id"])
+        result = _visible_unread(query).execute()
+        _invalidate_unread(current_user["user_id"])
+        return {"updated": result.count or 0}
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.post("/mark-read", response_model=NotificationBulkResult)
+async def mark_notifications_read(
+    payload: NotificationMarkRead,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Mark a list of notifications as read in a single UPDATE"""
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        result = (
+            supabase.table("notifications")
+            .update({"is_read": True}, count="exact", returning="minimal")
+            .eq("user_id", current_user["user_id"])
+            .eq("is_read", False)
+            .in_("id", [str(notification_id) for notification_id in payload.ids])
+            .execute()
+        )
+        _invalidate_unread(current_user["user_id"])
+        return {"updated": result.count or 0}
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
 @router.get("/{notification_id}", response_model=Notification)
 async def get_notification(
     notification_id: UUID,
@@ -100,6 +199,7 @@ async def update_notification(
         update_data = notification_update.model_dump(exclude_unset=True, mode='json')
         
         response = supabase.table("notifications").update(update_data).eq("id", str(notification_id)).eq("user_id", current_user["user_id"]).execute()
+        _invalidate_unread(current_user["user_id"])
         
         if response.data:
             return response.data[0]
@@ -134,6 +234,7 @@ async def patch_notification(
             )
         
         response = supabase.table("notifications").update(update_data).eq("id", str(notification_id)).eq("user_id", current_user["user_id"]).execute()
+        _invalidate_unread(current_user["user_id"])
         
         if response.data:
             return response.data[0]
@@ -163,6 +264,7 @@ async def mark_notification_read(
         }
         
         response = supabase.table("notifications").update(update_data).eq("id", str(notification_id)).eq("user_id", current_user["user_id"]).execute()
+        _invalidate_unread(current_user["user_id"])
         
         if response.data:
             return {"message": "Notification marked as read"}
@@ -187,6 +289,7 @@ async def delete_notification(
     try:
         supabase = get_user_supabase(current_user["token"])
         response = supabase.table("notifications").delete().eq("id", str(notification_id)).eq("user_id", current_user["user_id"]).execute()
+        _invalidate_unread(current_user["user_id"])
         
         if response.data:
             return {"message": "Notification deleted successfully"}
@@ -0,0 +1,115 @@
+from fastapi import APIRouter, HTTPException, status, Request, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from auth_middleware import authenticate_token
+from events import bus, TooManyConnections
+from typing import Optional
+import asyncio
+import json
+import os
+
+router = APIRouter()
+
+HEARTBEAT_SECONDS = float(os.getenv("REALTIME_HEARTBEAT_SECONDS", "25"))
+
+def _bearer_token(authorization: Optional[str], token: Optional[str]) -> Optional[str]:
+    # EventSource and browser WebSockets cannot set headers, so ?token= is accepted too
+    if authorization and authorization.startswith("Bearer "):
+        return authorization.split(" ", 1)[1]
+    return token
+
+def _require_bus() -> None:
+    if not bus.available:
+        # Several workers and no relay: a stream would silently miss other workers' events
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Realtime is unavailable: several workers need REALTIME_DATABASE_URL to relay events"
+        )
+
+def _format_sse(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    token: Optional[str] = Query(None)
+):
+    """
+    Server-Sent Events stream of the current user's notifications and data changes.
+
+    Idle connections only cost a parked coroutine and a comment line every
+    REALTIME_HEARTBEAT_SECONDS to keep proxies from closing them.
+    """
+    access_token = _bearer_token(request.headers.get("Authorization"), token)
+    if not access_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing authentication token"
+        )
+    auth_data = await authenticate_token(access_token)
+    _require_bus()
+    try:
+        subscription = bus.subscribe(str(auth_data["user_id"]))
+    except TooManyConnections as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e)
+        )
+
+    async def generate():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield _format_sse(event)
+        finally:
+            bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/ws")
+async def websocket_events(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """WebSocket variant of /realtime/events (server -> client JSON messages)"""
+    access_token = _bearer_token(websocket.headers.get("Authorization"), token)
+    try:
+        if not access_token:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing authentication token")
+        auth_data = await authenticate_token(access_token)
+        _require_bus()
+        subscription = bus.subscribe(str(auth_data["user_id"]))
+    except (HTTPException, TooManyConnections) as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(getattr(e, "detail", e)))
+        return
+
+    await websocket.accept()
+
+    async def sender():
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                event = {"type": "ping"}
+            await websocket.send_text(json.dumps(event, default=str))
+
+    async def receiver():
+        # Client messages are ignored; this only notices the disconnect
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.create_task(sender()), asyncio.create_task(receiver())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        bus.unsubscribe(subscription)
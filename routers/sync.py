@@ -1,12 +1,33 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from database import get_user_supabase
-from models import SyncRequest, SyncResponse
+from models import SyncRequest, SyncResponse, SyncCursor
 from auth_middleware import get_current_user
-from typing import Dict, Any, List
-from datetime import datetime
+from device_registry import registry
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timezone
 
 router = APIRouter()
 
+def _load_cursors(supabase, user_id: str, device_id: str) -> Dict[str, str]:
+    response = (
+        supabase.table("device_sync_cursors")
+        .select("table_name,cursor")
+        .eq("user_id", user_id)
+        .eq("device_id", device_id)
+        .execute()
+    )
+    return {row["table_name"]: row["cursor"] for row in response.data or []}
+
+def _save_cursors(supabase, user_id: str, device_id: str, cursors: Dict[str, datetime]) -> None:
+    if not cursors:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [
+        {"user_id": user_id, "device_id": device_id, "table_name": table, "cursor": cursor.isoformat(), "updated_at": now}
+        for table, cursor in cursors.items()
+    ]
+    supabase.table("device_sync_cursors").upsert(rows, on_conflict="user_id,device_id,table_name").execute()
+
 @router.post("/pull", response_model=SyncResponse)
 async def pull_data(
     sync_request: SyncRequest,
@@ -16,28 +37,37 @@ async def pull_data(
     try:
         supabase = get_user_supabase(current_user["token"])
         
-        # Register or update device
-        device_data = {
-            "user_id": current_user["user_id"],
-            "device_id": sync_request.device_id,
-            "last_sync": datetime.utcnow().isoformat(),
-            "is_active": True
-        }
-        
-        supabase.table("user_devices").upsert(device_data, on_conflict="user_id,device_id").execute()
+        # Register or heartbeat the device (known devices are flushed in bulk later)
+        registry.touch(supabase, current_user["user_id"], sync_request.device_id)
         
         sync_data = {}
         tables_to_sync = sync_request.tables or ["classes", "tasks", "calendar_events", "habits", "habit_logs"]
         
+        # Taken before reading so rows written during the pull are fetched again next time
+        pulled_at = datetime.now(timezone.utc)
+
+        # Cursors only move when the device acknowledges a page it applied: a response
+        # lost on the way (timeout, app killed) is pulled again instead of skipped
+        if sync_request.ack:
+            acked = {table: min(cursor, pulled_at) for table, cursor in sync_request.ack.items()}
+            _save_cursors(supabase, current_user["user_id"], sync_request.device_id, acked)
+
+        stored_cursors = {}
+        if sync_request.resume and not sync_request.last_sync:
+            stored_cursors = _load_cursors(supabase, current_user["user_id"], sync_request.device_id)
         for table in tables_to_sync:
             query = supabase.table(table).select("*").eq("user_id", current_user["user_id"])
             
-            if sync_request.last_sync:
-                query = query.gte("updated_at", sync_request.last_sync.isoformat())
+            since = sync_request.last_sync.isoformat() if sync_request.last_sync else stored_cursors.get(table)
+            if since:
+                query = query.gte("updated_at", since)
                 
             response = query.execute()
             sync_data[table] = response.data
         
+        # Returned for the device to echo back as `ack` once applied; not stored yet
+        cursors = {table: pulled_at for table in tables_to_sync}
+        
         # Log sync operation
         log_data = {
             "user_id": current_user["user_id"],
@@ -51,8 +81,9 @@ async def pull_data(
         
         return SyncResponse(
             success=True,
-            last_sync=datetime.utcnow(),
-            data=sync_data
+            last_sync=pulled_at,
+            data=sync_data,
+            cursors=cursors
         )
         
     except Exception as e:
@@ -97,6 +128,8 @@ async def push_data(
         
         # Add user_id to all records
         for record in records:
+            # Generated columns (e.g. calendar_events.time_range) can't be written
+            record.pop("time_range", None)
             record["user_id"] = current_user["user_id"]
             record["updated_at"] = datetime.utcnow().isoformat()
         
@@ -150,16 +183,16 @@ async def get_sync_status(
     try:
         supabase = get_user_supabase(current_user["token"])
         
-        # Get device info
-        device_response = supabase.table("user_devices").select("*").eq("user_id", current_user["user_id"]).eq("device_id", device_id).execute()
+        # Device info comes from the per-user device cache
+        device = registry.get_device(supabase, current_user["user_id"], device_id)
         
         # Get recent sync logs
         logs_response = supabase.table("sync_logs").select("*").eq("user_id", current_user["user_id"]).eq("device_id", device_id).order("created_at", desc=True).limit(10).execute()
         
         return {
-            "device": device_response.data[0] if device_response.data else None,
+            "device": device,
             "recent_syncs": logs_response.data,
-            "last_sync": device_response.data[0]["last_sync"] if device_response.data else None
+            "last_sync": device["last_sync"] if device else None
         }
         
     except Exception as e:
@@ -167,3 +200,49 @@ async def get_sync_status(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+
+@router.get("/cursors", response_model=List[SyncCursor])
+async def get_sync_cursors(
+    device_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get the per-table sync cursors stored for a device"""
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        response = (
+            supabase.table("device_sync_cursors")
+            .select("table_name,cursor,updated_at")
+            .eq("user_id", current_user["user_id"])
+            .eq("device_id", device_id)
+            .order("table_name")
+            .execute()
+        )
+        return response.data or []
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.delete("/cursors")
+async def reset_sync_cursors(
+    device_id: str,
+    table_name: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Reset a device's sync cursors (all tables or one) to force a full pull"""
+    try:
+        supabase = get_user_supabase(current_user["token"])
+        query = supabase.table("device_sync_cursors").delete().eq("user_id", current_user["user_id"]).eq("device_id", device_id)
+        if table_name:
+            query = query.eq("table_name", table_name)
+        response = query.execute()
+        
+        return {"message": "Sync cursors reset", "reset": len(response.data or [])}
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
@@ -2,8 +2,8 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from database import get_user_supabase
 from models import UserDevice, UserDeviceCreate, UserDeviceUpdate
 from auth_middleware import get_current_user
+from device_registry import registry
 from typing import List, Dict, Any
-from datetime import datetime
 
 router = APIRouter()
 
@@ -14,9 +14,7 @@ async def get_user_devices(
     """Get all devices for the current user"""
     try:
         supabase = get_user_supabase(current_user["token"])
-        response = supabase.table("user_devices").select("*").eq("user_id", current_user["user_id"]).order("last_sync", desc=True).execute()
-        
-        return response.data
+        return registry.list_devices(supabase, current_user["user_id"])
         
     except Exception as e:
         raise HTTPException(
@@ -33,32 +31,15 @@ async def register_device(
     try:
         supabase = get_user_supabase(current_user["token"])
 
-        # Check if device already exists
-        existing_response = supabase.table("user_devices").select("*").eq("user_id", current_user["user_id"]).eq("device_id", device_data.device_id).execute()
-
-        if existing_response.data:
-            print(f"⚠️ Device already exists: {existing_response.data[0]}")
-            # Update existing device, serialize fields properly
-            update_data = device_data.model_dump(mode='json')
-            update_data["last_sync"] = datetime.utcnow().isoformat()
-            update_data["is_active"] = True
-
-            response = supabase.table("user_devices").update(update_data).eq("user_id", current_user["user_id"]).eq("device_id", device_data.device_id).execute()
-            return response.data[0]
+        # Idempotent: re-registering refreshes the device in the same statement
+        device = registry.register(supabase, current_user["user_id"], device_data.model_dump(mode='json'))
+        if device:
+            return device
         else:
-            # Create new device, serialize fields properly
-            insert_data = device_data.model_dump(mode='json')
-            insert_data["user_id"] = current_user["user_id"]
-
-            response = supabase.table("user_devices").insert(insert_data).execute()
-
-            if response.data:
-                return response.data[0]
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Failed to register device"
-                )
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Failed to register device"
+            )
 
     except Exception as e:
         raise HTTPException(
@@ -74,10 +55,10 @@ async def get_device(
     """Get a specific device"""
     try:
         supabase = get_user_supabase(current_user["token"])
-        response = supabase.table("user_devices").select("*").eq("user_id", current_user["user_id"]).eq("device_id", device_id).execute()
+        device = registry.get_device(supabase, current_user["user_id"], device_id)
         
-        if response.data:
-            return response.data[0]
+        if device:
+            return device
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -102,12 +83,16 @@ async def update_device(
         
         # Serialize fields properly
         update_data = device_update.model_dump(exclude_unset=True, mode='json')
-        update_data["last_sync"] = datetime.utcnow().isoformat()
+        if not update_data:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No fields provided for update"
+            )
         
         response = supabase.table("user_devices").update(update_data).eq("user_id", current_user["user_id"]).eq("device_id", device_id).execute()
         
         if response.data:
-            return response.data[0]
+            return registry.store(current_user["user_id"], response.data[0])
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -137,13 +122,11 @@ async def patch_device(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="No fields provided for update"
             )
-            
-        update_data["last_sync"] = datetime.utcnow().isoformat()
         
         response = supabase.table("user_devices").update(update_data).eq("user_id", current_user["user_id"]).eq("device_id", device_id).execute()
         
         if response.data:
-            return response.data[0]
+            return registry.store(current_user["user_id"], response.data[0])
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -165,15 +148,10 @@ async def sync_device(
     try:
         supabase = get_user_supabase(current_user["token"])
         
-        update_data = {
-            "last_sync": datetime.utcnow().isoformat(),
-            "is_active": True
-        }
-        
-        response = supabase.table("user_devices").update(update_data).eq("user_id", current_user["user_id"]).eq("device_id", device_id).execute()
-        
-        if response.data:
-            return {"message": "Device sync updated", "last_sync": update_data["last_sync"]}
+        # Heartbeats are coalesced in memory and flushed in bulk
+        if registry.get_device(supabase, current_user["user_id"], device_id):
+            last_sync = registry.touch(supabase, current_user["user_id"], device_id)
+            return {"message": "Device sync updated", "last_sync": last_sync}
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -199,9 +177,12 @@ async def deactivate_device(
             "is_active": False
         }
         
+        # A heartbeat buffered before this request must not reactivate the device
+        registry.forget(current_user["user_id"], device_id)
         response = supabase.table("user_devices").update(update_data).eq("user_id", current_user["user_id"]).eq("device_id", device_id).execute()
         
         if response.data:
+            registry.store(current_user["user_id"], response.data[0])
             return {"message": "Device deactivated successfully"}
         else:
             raise HTTPException(
@@ -0,0 +1,38 @@
+import jwt
+
+from admission import AdmissionController, identity_of
+
+
+def make_scope(path="/classes/", token=None):
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return {"type": "http", "path": path, "headers": headers, "client": ("203.0.113.7", 1234)}
+
+
+def test_unverified_tokens_are_keyed_by_ip(monkeypatch):
+    forged = jwt.encode({"sub": "someone-else", "aud": "authenticated"}, "guess", algorithm="HS256")
+    monkeypatch.delenv("SUPABASE_JWT_SECRET", raising=False)
+    assert identity_of(make_scope(token=forged)) == "ip:203.0.113.7"
+
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", "secret")
+    assert identity_of(make_scope(token=forged)) == "ip:203.0.113.7"
+    valid = jwt.encode({"sub": "user-1", "aud": "authenticated"}, "secret", algorithm="HS256")
+    assert identity_of(make_scope(token=valid)) == "user:user-1"
+
+
+def test_feeds_are_keyed_by_feed_token():
+    first = identity_of(make_scope("/calendar/feed/abc.ics"))
+    second = identity_of(make_scope("/calendar/feed/xyz.ics"))
+    assert first.startswith("feed:") and first != second
+    assert identity_of(make_scope("/calendar/feed/token")) == "ip:203.0.113.7"
+
+
+def test_ip_identities_get_the_ip_quota():
+    controller = AdmissionController(user_max_concurrent=1, user_max_heavy=1, ip_max_concurrent=3, ip_max_heavy=2)
+    assert controller.admit("normal", "user:1") is None
+    assert controller.admit("normal", "user:1")[2] == "user_concurrency"
+
+    assert controller.admit("heavy", "ip:203.0.113.7") is None
+    assert controller.admit("heavy", "ip:203.0.113.7") is None
+    assert controller.admit("heavy", "ip:203.0.113.7")[2] == "user_heavy"
+    assert controller.admit("normal", "ip:203.0.113.7") is None
+    assert controller.admit("normal", "ip:203.0.113.7")[2] == "user_concurrency"
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from auth_client import AuthUnavailableError, CircuitBreaker, GoTrueClient
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    return breaker
+
+
+class HangingHTTP:
+    async def request(self, *args, **kwargs):
+        await asyncio.sleep(3600)
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = open_breaker()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_cancelled_trial_is_released():
+    breaker = open_breaker()
+    client = GoTrueClient(url="http://gotrue.invalid", api_key="key", timeout=60, breaker=breaker)
+    client._http = lambda: HangingHTTP()
+
+    async def probe():
+        # Shorter than the client's own deadline, like health.py's probe timeout
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.health(), timeout=0.05)
+
+    asyncio.run(probe())
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.opened_at = 0.0  # reset_timeout long past
+    client = GoTrueClient(url="http://gotrue.invalid", api_key="key", timeout=0.05, breaker=breaker)
+    client._http = lambda: HangingHTTP()
+
+    with pytest.raises(AuthUnavailableError):
+        asyncio.run(client.health())
+    assert breaker.state == "open"
+    assert not breaker.allow()
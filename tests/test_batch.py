@@ -0,0 +1,44 @@
+from batch import run_batch
+
+
+class FakeDelete:
+    def __init__(self, table):
+        self.table = table
+        self.ids = []
+
+    def eq(self, column, value):
+        if column == "id":
+            self.ids = [value]
+        return self
+
+    def in_(self, column, values):
+        self.ids = list(values)
+        return self
+
+    def execute(self):
+        if any(row_id in self.table.referenced for row_id in self.ids):
+            raise RuntimeError("violates foreign key constraint")
+        deleted = [{"id": row_id} for row_id in self.ids if row_id in self.table.rows]
+        self.table.rows -= set(self.ids)
+        return type("Response", (), {"data": deleted})
+
+
+class FakeTable:
+    def __init__(self, rows, referenced):
+        self.rows = set(rows)
+        self.referenced = set(referenced)
+
+    def table(self, name):
+        return self
+
+    def delete(self):
+        return FakeDelete(self)
+
+
+def test_a_blocked_delete_fails_alone():
+    supabase = FakeTable({"a", "b", "c"}, referenced={"b"})
+    report = run_batch(supabase, "calendar_events", "user-1", [], [], ["a", "b", "c", "missing"])
+
+    assert [result["status"] for result in report["results"]] == ["deleted", "failed", "deleted", "not_found"]
+    assert (report["deleted"], report["failed"]) == (2, 2)
+    assert supabase.rows == {"b"}
@@ -0,0 +1,101 @@
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from calendar_import import (
+    ImportSizeLimitMiddleware, ImportTooLarge, iter_ics_entries, open_text_stream, parse_ics_duration, to_event_create
+)
+
+ICS = """BEGIN:VCALENDAR\r
+BEGIN:VTIMEZONE\r
+TZID:America/Panama\r
+END:VTIMEZONE\r
+BEGIN:VEVENT\r
+UID:exam-1\r
+SUMMARY:Final exam\\, room 2\r
+DESCRIPTION:Bring a calculator and a very long description that was folded\r
+  by the exporter\r
+DTSTART;TZID=America/Panama:20260302T090000\r
+DURATION:PT1H30M\r
+RRULE:FREQ=WEEKLY;COUNT=3\r
+BEGIN:VALARM\r
+TRIGGER:-PT15M\r
+END:VALARM\r
+BEGIN:VALARM\r
+TRIGGER:-P1D\r
+END:VALARM\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+SUMMARY:Holiday\r
+DTSTART;VALUE=DATE:20260305\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+SUMMARY:Broken\r
+DTSTART:2026-03-05\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+
+def test_ics_events_are_unfolded_and_parsed():
+    entries = list(iter_ics_entries(ICS.splitlines(keepends=True)))
+    assert [(row, uid) for row, uid, _ in entries] == [(1, "exam-1"), (2, None), (3, None)]
+
+    exam = to_event_create(entries[0][2])
+    assert exam.title == "Final exam, room 2"
+    assert exam.description == "Bring a calculator and a very long description that was folded by the exporter"
+    assert exam.start_datetime == datetime(2026, 3, 2, 14, tzinfo=timezone.utc)
+    assert exam.end_datetime - exam.start_datetime == timedelta(hours=1, minutes=30)
+    assert exam.reminder_minutes == 15
+    assert exam.is_recurring and exam.recurrence_pattern == {"rrule": "FREQ=WEEKLY;COUNT=3"}
+
+    holiday = to_event_create(entries[1][2])
+    assert holiday.end_datetime - holiday.start_datetime == timedelta(days=1)
+
+    assert entries[2][2]["_errors"]
+
+
+def test_parse_ics_duration():
+    assert parse_ics_duration("P1W2DT3H") == timedelta(weeks=1, days=2, hours=3)
+    assert parse_ics_duration("-PT15M") == -timedelta(minutes=15)
+    assert parse_ics_duration("1 hour") is None
+
+
+def test_open_text_stream_stops_past_the_limit():
+    assert open_text_stream(io.BytesIO(b"a\nb\n"), limit=4).read() == "a\nb\n"
+    with pytest.raises(ImportTooLarge):
+        open_text_stream(io.BytesIO(b"x" * 100), limit=10).read()
+
+
+def test_oversized_imports_are_rejected_before_the_handler():
+    app = FastAPI()
+    app.add_middleware(ImportSizeLimitMiddleware, max_bytes=1024)
+    handled = []
+
+    @app.post("/calendar/import")
+    async def upload(file: UploadFile = File(...)):
+        handled.append(file.filename)
+        return {"ok": True}
+
+    client = TestClient(app)
+    assert client.post("/calendar/import", files={"file": ("a.ics", b"x" * 100)}).status_code == 200
+
+    # Declared Content-Length
+    response = client.post("/calendar/import", files={"file": ("b.ics", b"x" * 4096)})
+    assert response.status_code == 413
+
+    # Chunked body without a Content-Length
+    def chunks():
+        yield b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"c.ics\"\r\n\r\n"
+        for _ in range(8):
+            yield b"x" * 512
+        yield b"\r\n--b--\r\n"
+
+    response = client.post(
+        "/calendar/import", content=chunks(), headers={"content-type": "multipart/form-data; boundary=b"}
+    )
+    assert response.status_code == 413
+    assert handled == ["a.ics"]
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+
+from calendar_utils import build_rrule, clip_to_daily_hours, expand_occurrences, find_conflicts, suggest_study_slots
+
+
+def at(day, hour, minute=0):
+    return datetime(2026, 3, day, hour, minute, tzinfo=timezone.utc)
+
+
+def event(id, start, end, class_id=None):
+    return {"id": id, "start_datetime": start.isoformat(), "end_datetime": end.isoformat(), "class_id": class_id}
+
+
+def pairs(conflicts):
+    return sorted((c["first"]["id"], c["second"]["id"]) for c in conflicts)
+
+
+def test_find_conflicts_reports_overlaps_and_skips_same_class():
+    events = [
+        event("a", at(2, 9), at(2, 10), "x"),
+        event("b", at(2, 9, 30), at(2, 10, 30), "x"),
+        event("c", at(2, 9, 45), at(2, 11), "y"),
+        # Touching is not overlapping
+        event("d", at(2, 11), at(2, 12), "z"),
+    ]
+    assert pairs(find_conflicts(events)) == [("a", "c"), ("b", "c")]
+    assert pairs(find_conflicts(events, across_classes=False)) == [("a", "b"), ("a", "c"), ("b", "c")]
+
+    # One busy class: every pair is same-class, none is visited
+    crowded = [event(str(i), at(3, 9), at(3, 12), "x") for i in range(300)]
+    assert find_conflicts(crowded) == []
+    assert len(find_conflicts(crowded, across_classes=False)) == 300 * 299 // 2
+
+    overlap = next(c for c in find_conflicts(events) if c["first"]["id"] == "a")
+    assert (overlap["overlap_start"], overlap["overlap_end"]) == (at(2, 9, 45), at(2, 10))
+
+
+def test_build_rrule_reads_a_floating_until_as_utc():
+    start = at(2, 9)
+    for text in ("FREQ=WEEKLY;UNTIL=20260323T090000", "RRULE:FREQ=WEEKLY;UNTIL=20260323", "FREQ=WEEKLY;UNTIL=20260323T090000Z"):
+        assert list(build_rrule(start, {"rrule": text}))[-1] == at(23, 9)
+
+    recurring = {**event("r", start, start + timedelta(hours=1)), "is_recurring": True,
+                 "recurrence_pattern": {"rrule": "FREQ=DAILY;UNTIL=20260304T090000"}}
+    assert len(expand_occurrences(recurring, at(1, 0), at(10, 0))) == 3
+
+
+def test_old_series_expand_from_the_window_and_sub_daily_is_rejected():
+    assert build_rrule(at(2, 9), {"rrule": "FREQ=MINUTELY"}) is None
+    assert build_rrule(at(2, 9), {"frequency": "hourly"}) is None
+
+    start = datetime(1990, 1, 31, 9, tzinfo=timezone.utc)
+    for pattern in ({"rrule": "FREQ=DAILY;INTERVAL=3"}, {"rrule": "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH"},
+                    {"rrule": "FREQ=MONTHLY"}, {"rrule": "FREQ=YEARLY;BYMONTH=3;BYDAY=1MO"}):
+        series = {**event("old", start, start + timedelta(hours=1)), "is_recurring": True, "recurrence_pattern": pattern}
+        expected = list(build_rrule(start, pattern).between(at(1, 0) - timedelta(hours=1), at(31, 0)))
+        assert [occurrence for occurrence, _ in expand_occurrences(series, at(1, 0), at(31, 0))] == expected
+
+
+def test_clip_to_daily_hours_uses_local_days():
+    assert clip_to_daily_hours([(at(2, 6), at(3, 23))], 8, 20) == [(at(2, 8), at(2, 20)), (at(3, 8), at(3, 20))]
+    # 08:00-20:00 in Panama (UTC-5) is 13:00-01:00 UTC
+    assert clip_to_daily_hours([(at(2, 0), at(2, 23))], 8, 20, "America/Panama") == [
+        (at(2, 0), at(2, 1)),
+        (at(2, 13), at(2, 23)),
+    ]
+
+
+def test_suggest_study_slots_earliest_deadline_first():
+    tasks = [
+        {"id": "later", "estimated_duration": 60},
+        {"id": "soon", "due_date": at(2, 11).isoformat(), "estimated_duration": 120, "completion_percentage": 25},
+        {"id": "overdue", "due_date": at(2, 9).isoformat(), "estimated_duration": 30},
+    ]
+    result = suggest_study_slots(tasks, [(at(2, 9), at(2, 12))], max_session_minutes=60)
+
+    assert [(s["task_id"], s["start"], s["end"]) for s in result["slots"]] == [
+        ("soon", at(2, 9), at(2, 10)),
+        ("soon", at(2, 10), at(2, 10, 30)),
+        ("later", at(2, 10, 30), at(2, 11, 30)),
+    ]
+    assert [(u["task_id"], u["remaining_minutes"]) for u in result["unscheduled"]] == [("overdue", 30)]
@@ -0,0 +1,64 @@
+from device_registry import DeviceRegistry
+
+
+class FakeQuery:
+    def __init__(self, table, action, payload=None):
+        self.table = table
+        self.action = action
+        self.payload = payload
+
+    def eq(self, column, value):
+        return self
+
+    def execute(self):
+        if self.action == "upsert":
+            rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            self.table.upserts.append(rows)
+            written = []
+            for row in rows:
+                stored = self.table.rows.setdefault(row["device_id"], {"is_active": True})
+                stored.update(row)
+                written.append(dict(stored))
+            return type("Response", (), {"data": written})
+        return type("Response", (), {"data": [dict(row) for row in self.table.rows.values()]})
+
+
+class FakeTable:
+    def __init__(self, rows):
+        self.rows = rows
+        self.upserts = []
+
+    def select(self, *columns):
+        return FakeQuery(self, "select")
+
+    def upsert(self, payload, on_conflict=None):
+        return FakeQuery(self, "upsert", payload)
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.devices = FakeTable(rows)
+
+    def table(self, name):
+        return self.devices
+
+
+def test_flush_moves_last_sync_without_reactivating():
+    supabase = FakeSupabase({"phone": {"user_id": "user-1", "device_id": "phone", "is_active": True}})
+    registry = DeviceRegistry(supabase_factory=lambda: supabase)
+
+    registry.touch(supabase, "user-1", "phone")
+    assert supabase.devices.upserts == []
+    # Deactivated meanwhile (DELETE /user-devices/{id}): the buffered heartbeat is dropped
+    supabase.devices.rows["phone"]["is_active"] = False
+    registry.forget("user-1", "phone")
+    assert registry._write_pending() == 0
+
+    registry.invalidate("user-1")
+    registry.touch(supabase, "user-1", "phone")
+    # An inactive device is reactivated by its next heartbeat, written right away
+    assert supabase.devices.upserts[-1][0]["is_active"] is True
+
+    registry.touch(supabase, "user-1", "phone")
+    assert registry._write_pending() == 1
+    assert "is_active" not in supabase.devices.upserts[-1][0]
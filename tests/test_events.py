@@ -0,0 +1,92 @@
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from events import ChangePublisherMiddleware, EventBus, PostgresFanout, bus
+
+
+def make_app():
+    app = FastAPI()
+
+    def authenticated(request: Request):
+        request.state.user_id = "user-1"
+        return {}
+
+    @app.post("/sync/pull")
+    def pull(request: Request):
+        return authenticated(request)
+
+    @app.post("/calendar/feed/token")
+    def feed_token(request: Request):
+        return authenticated(request)
+
+    @app.patch("/classes/{class_id}")
+    def update_class(class_id: str, request: Request):
+        return authenticated(request)
+
+    app.add_middleware(ChangePublisherMiddleware)
+    return app
+
+
+def test_only_write_routes_publish_changes():
+    client = TestClient(make_app())
+    subscription = bus.subscribe("user-1")
+    try:
+        client.post("/sync/pull")
+        client.post("/calendar/feed/token")
+        assert subscription.queue.empty()
+
+        client.patch("/classes/42")
+        event = subscription.queue.get_nowait()
+        assert (event["resource"], event["action"], event["path"]) == ("classes", "update", "/classes/42")
+    finally:
+        bus.unsubscribe(subscription)
+
+
+class FakeConnection:
+    """One LISTEN/NOTIFY channel shared by every fake connection"""
+
+    listeners = []
+
+    def __init__(self):
+        self.closed = False
+
+    async def add_listener(self, channel, callback):
+        self.listeners.append(callback)
+
+    async def execute(self, query, channel, payload):
+        for callback in list(self.listeners):
+            callback(self, 0, channel, payload)
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+def test_fanout_relays_events_between_workers():
+    async def connect():
+        return FakeConnection()
+
+    async def run():
+        first, second = EventBus(), EventBus()
+        first.fanout = PostgresFanout(first, "postgres://", connect=connect)
+        second.fanout = PostgresFanout(second, "postgres://", connect=connect)
+        first.fanout.start()
+        second.fanout.start()
+        here, there = first.subscribe("user-1"), second.subscribe("user-1")
+
+        first.publish("user-1", {"type": "change", "resource": "notes"})
+        first.publish("user-1", {"type": "notification", "notification": {"message": "x" * 10000}})
+        assert await first.fanout.stop() == 0
+        await second.fanout.stop()
+
+        # Delivered once locally (the echo is skipped) and relayed to the other worker
+        assert [here.queue.get_nowait()["type"] for _ in range(here.queue.qsize())] == ["change", "notification"]
+        # Too large for NOTIFY: the other worker is told to refetch
+        assert [there.queue.get_nowait()["type"] for _ in range(there.queue.qsize())] == ["change", "resync"]
+
+    FakeConnection.listeners = []
+    asyncio.run(run())
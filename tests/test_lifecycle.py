@@ -0,0 +1,61 @@
+import asyncio
+
+from lifecycle import Lifecycle, SingletonJobs
+
+
+def make_jobs(events, name):
+    jobs = Lifecycle(timeout=1)
+
+    async def start():
+        events.append(f"{name} start")
+
+    async def stop():
+        events.append(f"{name} stop")
+        return 2
+
+    jobs.register("job", start=start, stop=stop)
+    return jobs
+
+
+def test_shutdown_reports_undrained_and_timeouts():
+    lifecycle = Lifecycle(timeout=0.05, grace=0.05)
+
+    async def hang():
+        await asyncio.sleep(3600)
+
+    lifecycle.register("closes", stop=lambda: None)
+    lifecycle.register("hangs", stop=hang)
+    lifecycle.register("leaves", stop=lambda: 3)
+
+    async def run():
+        await lifecycle.startup()
+        return await lifecycle.shutdown()
+
+    report = asyncio.run(run())
+    assert list(report) == ["leaves", "hangs", "closes"]
+    assert report["leaves"]["status"] == "undrained" and report["leaves"]["undrained"] == 3
+    assert report["hangs"]["status"] == "timeout"
+    # Reached after the deadline, but still given the grace period
+    assert report["closes"]["status"] == "stopped"
+
+
+def test_one_worker_runs_the_singleton_jobs(tmp_path):
+    events = []
+    path = str(tmp_path / "jobs.lock")
+    first = SingletonJobs(make_jobs(events, "a"), path=path, retry_seconds=0.01)
+    second = SingletonJobs(make_jobs(events, "b"), path=path, retry_seconds=0.01)
+
+    async def run():
+        first.start()
+        await asyncio.sleep(0.05)
+        second.start()
+        await asyncio.sleep(0.05)
+        assert (first.leader, second.leader) == (True, False)
+        assert await first.stop() == 2
+        # The other worker takes over once the holder is gone
+        await asyncio.sleep(0.05)
+        assert second.leader
+        await second.stop()
+
+    asyncio.run(run())
+    assert events == ["a start", "a stop", "b start", "b stop"]
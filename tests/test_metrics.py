@@ -0,0 +1,42 @@
+from metrics import Counter, Gauge, Histogram, Registry
+
+
+def make_registry(directory):
+    registry = Registry(str(directory))
+    requests = registry.register(Counter("requests_total", "Requests", ("route",)))
+    in_flight = registry.register(Gauge("in_flight", "In flight"))
+    latency = registry.register(Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)))
+    return registry, requests, in_flight, latency
+
+
+def test_workers_are_summed_and_exited_workers_archived(tmp_path):
+    other, requests, in_flight, latency = make_registry(tmp_path)
+    requests.inc("/a", amount=3)
+    in_flight.inc()
+    latency.observe(0.5)
+    # Another worker's snapshot, as its periodic writer leaves it
+    other._write("worker-999.json", other.snapshot())
+
+    registry, requests, in_flight, latency = make_registry(tmp_path)
+    requests.inc("/a")
+    in_flight.inc()
+    latency.observe(2.0)
+    text = registry.render()
+    assert 'requests_total{route="/a"} 4' in text
+    assert "in_flight 2" in text
+    assert 'latency_seconds_bucket{le="1.0"} 1' in text
+    assert "latency_seconds_count 2" in text
+
+    registry.archive(999)
+    assert not (tmp_path / "worker-999.json").exists()
+    text = registry.render()
+    # Counters and histograms of the exited worker stay; its gauges go
+    assert 'requests_total{route="/a"} 4' in text
+    assert "latency_seconds_count 2" in text
+    assert "in_flight 1" in text
+
+
+def test_without_a_directory_only_this_process_is_rendered():
+    registry, requests, _, _ = make_registry("")
+    requests.inc("/a")
+    assert 'requests_total{route="/a"} 1' in registry.render()
@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from notification_dispatcher import FakeChannel, NotificationDispatcher
+
+
+class FakeUpdate:
+    def __init__(self, rows, values):
+        self.rows = rows
+        self.values = values
+        self.filters = []
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def is_(self, column, value):
+        self.filters.append(lambda row: row.get(column) is None)
+        return self
+
+    def execute(self):
+        matched = [row for row in self.rows if all(check(row) for check in self.filters)]
+        for row in matched:
+            row.update(self.values)
+        return type("Response", (), {"data": [dict(row) for row in matched]})
+
+
+class FakeSupabase:
+    """`notifications` with the claim semantics of claim_due_notifications"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        return self
+
+    def update(self, values):
+        return FakeUpdate(self.rows, values)
+
+    def rpc(self, name, args):
+        if name == "release_notifications":
+            for row in self.rows:
+                if row["id"] in args["p_ids"] and row.get("claimed_by") == args["p_worker"]:
+                    row.update(claimed_by=None, claimed_until=None, attempts=max(row["attempts"] - 1, 0))
+            return type("Query", (), {"execute": lambda self: type("Response", (), {"data": None})})()
+        now = datetime.now(timezone.utc)
+        claimed = []
+        for row in self.rows:
+            lease = row.get("claimed_until")
+            if row.get("sent_at") is None and row["attempts"] < args["p_max_attempts"] and (lease is None or lease < now.isoformat()):
+                row.update(claimed_by=args["p_worker"], attempts=row["attempts"] + 1,
+                           claimed_until=(now + timedelta(seconds=args["p_lease_seconds"])).isoformat())
+                claimed.append(dict(row))
+        return type("Query", (), {"execute": lambda self: type("Response", (), {"data": claimed})})()
+
+
+class SecondChannel(FakeChannel):
+    name = "second"
+
+
+def notification(id):
+    return {"id": id, "user_id": "user-1", "title": id, "message": id, "attempts": 0,
+            "scheduled_for": datetime.now(timezone.utc).isoformat(), "sent_at": None}
+
+
+def test_retry_backs_off_and_skips_channels_that_delivered():
+    async def run():
+        rows = [notification("ok"), notification("flaky")]
+        supabase = FakeSupabase(rows)
+        first, second = FakeChannel(), SecondChannel(fail_ids={"flaky"})
+        dispatcher = NotificationDispatcher([first, second], supabase_factory=lambda: supabase)
+
+        assert await dispatcher.load_once() == 2
+        await dispatcher.dispatch_due()
+        assert await dispatcher.flush() == 1
+        assert rows[0]["sent_at"] is not None
+        flaky = rows[1]
+        assert flaky["sent_at"] is None and flaky["delivered_channels"] == ["fake"]
+        assert flaky["claimed_by"] is None and flaky["claimed_until"] > datetime.now(timezone.utc).isoformat()
+        # Backing off: not claimable until the lease it kept expires
+        assert await dispatcher.load_once() == 0
+
+        flaky["claimed_until"] = None
+        second.fail_ids.clear()
+        assert await dispatcher.load_once() == 1
+        await dispatcher.dispatch_due()
+        await dispatcher.flush()
+        # The first channel delivered on the first attempt and is not used again
+        assert sum(sent["id"] == "flaky" for sent in first.sent) == 1
+        assert sum(sent["id"] == "flaky" for sent in second.sent) == 1
+        assert flaky["sent_at"] is not None and flaky["attempts"] == 2
+
+    asyncio.run(run())
+
+
+def test_leases_are_renewed_and_lost_leases_counted():
+    async def run():
+        rows = [notification("a")]
+        supabase = FakeSupabase(rows)
+        dispatcher = NotificationDispatcher([FakeChannel()], supabase_factory=lambda: supabase, lease_seconds=60)
+
+        await dispatcher.load_once()
+        before = rows[0]["claimed_until"]
+        await asyncio.sleep(0.01)
+        assert dispatcher._renew() == 1
+        assert rows[0]["claimed_until"] > before
+
+        # Lease taken over by another worker before the sent_at stamp
+        rows[0]["claimed_by"] = "other"
+        await dispatcher.dispatch_due()
+        await dispatcher.flush()
+        assert dispatcher.stats["lost_leases"] == 1
+        assert rows[0]["sent_at"] is None
+
+    asyncio.run(run())
+
+
+def test_stop_hands_back_queued_notifications_without_using_an_attempt():
+    async def run():
+        rows = [{**notification("later"), "scheduled_for": (datetime.now(timezone.utc) + timedelta(seconds=30)).isoformat()}]
+        supabase = FakeSupabase(rows)
+        dispatcher = NotificationDispatcher([FakeChannel()], supabase_factory=lambda: supabase)
+
+        await dispatcher.load_once()
+        assert rows[0]["attempts"] == 1
+        assert await dispatcher.stop() == 0
+        assert rows[0]["attempts"] == 0 and rows[0]["claimed_by"] is None and rows[0]["claimed_until"] is None
+
+    asyncio.run(run())
@@ -0,0 +1,28 @@
+from starlette.requests import Request
+
+from rate_limit import client_ip
+
+
+def make_request(forwarded=None, peer="10.0.0.1"):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded is not None else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+
+def test_without_proxies_the_peer_is_the_client():
+    assert client_ip(make_request("6.6.6.6"), proxy_hops=0) == "10.0.0.1"
+
+
+def test_one_proxy_uses_the_entry_it_appended():
+    # The client may send its own X-Forwarded-For; only the last entry comes from our proxy
+    assert client_ip(make_request("6.6.6.6, 203.0.113.7"), proxy_hops=1) == "203.0.113.7"
+    assert client_ip(make_request("203.0.113.7"), proxy_hops=1) == "203.0.113.7"
+
+
+def test_two_proxies_skip_the_inner_one():
+    assert client_ip(make_request("6.6.6.6, 203.0.113.7, 10.1.1.1"), proxy_hops=2) == "203.0.113.7"
+
+
+def test_fewer_entries_than_hops_and_missing_header():
+    assert client_ip(make_request("203.0.113.7"), proxy_hops=2) == "203.0.113.7"
+    assert client_ip(make_request(" , "), proxy_hops=1) == "10.0.0.1"
+    assert client_ip(make_request(), proxy_hops=1) == "10.0.0.1"
@@ -0,0 +1,352 @@
+# tracing.py
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+from metrics import table_of
+
+logger = logging.getLogger(__name__)
+
+# Server-Timing header on every response (cheap: only aggregates durations)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+# OTLP/JSON lines, one trace per line (format read by the OTel collector's otlpjson file receiver)
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+SERVICE_NAME = os.getenv("SERVICE_NAME", "studyvault-api")
+
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+
+
+class Trace:
+    """Spans finished while serving one request; shared by the threads working for it"""
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+        self.handler_end_ns: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def add(self, span: "Span") -> None:
+        with self._lock:
+            self.spans.append(span)
+
+
+class Span:
+    __slots__ = ("trace", "name", "category", "kind", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: Trace, name: str, category: str, kind: int, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.category = category
+        self.kind = kind
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if error is not None:
+                self.error = f"{type(error).__name__}: {error}"
+            self.trace.add(self)
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def start_span(name: str, category: str = "app", kind: int = KIND_INTERNAL, **attributes) -> Optional[Span]:
+    """Start a child of the current span; returns None (and costs nothing) outside a traced request"""
+    parent = _current.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, category, kind, parent.span_id, attributes)
+
+
+@contextmanager
+def span(name: str, category: str = "app", kind: int = KIND_INTERNAL, **attributes):
+    """Time a block as a child span; nested spans and threadpool work become its children"""
+    current = start_span(name, category, kind, **attributes)
+    if current is None:
+        yield None
+        return
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.end(exc)
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+def traceparent() -> Optional[str]:
+    """W3C traceparent for outbound calls made under the current span"""
+    current = _current.get()
+    if current is None:
+        return None
+    return f"00-{current.trace.trace_id}-{current.span_id}-{'01' if current.trace.sampled else '00'}"
+
+
+# --- export ---
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace: Trace) -> Dict[str, Any]:
+    spans = []
+    for item in trace.spans:
+        entry = {
+            "traceId": trace.trace_id,
+            "spanId": item.span_id,
+            "name": item.name,
+            "kind": item.kind,
+            "startTimeUnixNano": str(item.start_ns),
+            "endTimeUnixNano": str(item.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in item.attributes.items()],
+            "status": {"code": 2, "message": item.error} if item.error else {},
+        }
+        if item.parent_id:
+            entry["parentSpanId"] = item.parent_id
+        spans.append(entry)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "studyvault.tracing"}, "spans": spans}],
+    }]}
+
+
+class FileSpanExporter:
+    """
+    Appends finished traces as OTLP/JSON lines from a background thread.
+
+    Each line is a single unbuffered append, so several worker processes can
+    share the file; forked workers restart the thread (see `_start`).
+    """
+
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        self.max_queue = max_queue
+        self._start()
+        atexit.register(self.shutdown)
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self) -> None:
+        self._queue: queue.Queue = queue.Queue(maxsize=self.max_queue)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace) -> None:
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            pass  # dropping traces beats slowing requests down
+
+    def _run(self) -> None:
+        with open(self.path, "ab", buffering=0) as output:
+            while True:
+                trace = self._queue.get()
+                if trace is None:
+                    return
+                try:
+                    output.write((json.dumps(to_otlp(trace), default=str) + "\n").encode("utf-8"))
+                except Exception as exc:
+                    logger.warning("Trace export failed: %s", exc)
+
+    def shutdown(self, timeout: float = 5) -> int:
+        """Write the queued traces; returns how many were left behind"""
+        if not self._thread.is_alive():
+            return 0
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return self._queue.qsize()
+        self._thread.join(timeout=timeout)
+        # The end-of-queue marker is still there if the thread did not finish
+        return max(0, self._queue.qsize() - 1) if self._thread.is_alive() else 0
+
+
+exporter: Optional[FileSpanExporter] = FileSpanExporter(TRACE_EXPORT_FILE) if TRACE_EXPORT_FILE else None
+
+
+def server_timing(trace: Trace, total_ms: float) -> str:
+    """Server-Timing value with the summed duration and count of finished spans per category"""
+    totals: Dict[str, List[float]] = {}
+    for item in list(trace.spans):
+        if item.kind == KIND_SERVER:
+            continue
+        entry = totals.setdefault(item.category, [0.0, 0])
+        entry[0] += item.duration_ms
+        entry[1] += 1
+    parts = [f'{category};dur={duration:.1f};desc="{count}x"' for category, (duration, count) in totals.items()]
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+def _parse_traceparent(value: str):
+    parts = value.split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2], parts[3] == "01"
+    return None
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a server span per request.
+
+    Continues an incoming W3C `traceparent`, adds a `Server-Timing` header
+    (SERVER_TIMING=true) and hands sampled traces to the file exporter.
+    Without either feature enabled it is a pass-through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (SERVER_TIMING or exporter):
+            await self.app(scope, receive, send)
+            return
+
+        parent_id = None
+        incoming = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                incoming = _parse_traceparent(value.decode("latin-1"))
+                break
+        if incoming:
+            trace_id, parent_id, sampled = incoming
+            sampled = sampled or random.random() < TRACE_SAMPLE_RATE
+        else:
+            trace_id, sampled = f"{random.getrandbits(128):032x}", random.random() < TRACE_SAMPLE_RATE
+
+        trace = Trace(trace_id, sampled and exporter is not None)
+        root = Span(trace, f"{scope['method']} {scope['path']}", "total", KIND_SERVER, parent_id, {
+            "http.request.method": scope["method"],
+            "url.path": scope["path"],
+        })
+        token = _current.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.response.status_code"] = message["status"]
+                _close_handler_span()
+                if SERVER_TIMING:
+                    headers = list(message.get("headers", ()))
+                    headers.append((b"server-timing", server_timing(trace, root.duration_ms).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                root.name = f"{scope['method']} {route}"
+                root.attributes["http.route"] = route
+            root.end(error)
+            if trace.sampled:
+                exporter.export(trace)
+
+
+# --- PostgREST ---
+
+def _on_request(request) -> None:
+    current = start_span(
+        f"postgrest {request.method} {table_of(request.url.path)}", "db", KIND_CLIENT,
+        **{"http.request.method": request.method, "db.table": table_of(request.url.path)},
+    )
+    if current is not None:
+        request.extensions["trace_span"] = current
+
+
+def _on_response(response) -> None:
+    current = response.request.extensions.get("trace_span")
+    if current is not None:
+        response.read()
+        current.attributes["http.response.status_code"] = response.status_code
+        current.end()
+
+
+def trace_supabase(client):
+    """Add a `db` span around every PostgREST call made through a supabase client"""
+    if SERVER_TIMING or exporter:
+        hooks = client.postgrest.session.event_hooks
+        hooks["request"].append(_on_request)
+        hooks["response"].append(_on_response)
+    return client
+
+
+# --- endpoint / serialization spans ---
+
+def _close_handler_span() -> None:
+    """FastAPI validates and serializes between the endpoint returning and the response starting"""
+    current = _current.get()
+    if current is not None and current.trace.handler_end_ns:
+        serialize = Span(current.trace, "serialize", "serialize", KIND_INTERNAL, current.span_id, {})
+        serialize.start_ns = current.trace.handler_end_ns
+        serialize.end()
+
+
+def _traced_endpoint(call, name: str):
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def wrapped(*args, **kwargs):
+            with span(name, "handler") as current:
+                result = await call(*args, **kwargs)
+            if current is not None:
+                current.trace.handler_end_ns = time.time_ns()
+            return result
+    else:
+        @functools.wraps(call)
+        def wrapped(*args, **kwargs):
+            with span(name, "handler") as current:
+                result = call(*args, **kwargs)
+            if current is not None:
+                current.trace.handler_end_ns = time.time_ns()
+            return result
+    return wrapped
+
+
+def trace_endpoints(app) -> None:
+    """
+    Wrap every route's endpoint in a `handler` span and note when it returned,
+    so response validation and serialization show up as a separate
+    `serialize` span. Call once all routers are included.
+    """
+    if not (SERVER_TIMING or exporter):
+        return
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            # The request handler reads `dependant.call` on every request
+            route.dependant.call = _traced_endpoint(route.dependant.call, f"handler {route.name}")